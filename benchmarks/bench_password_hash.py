@@ -0,0 +1,42 @@
+# Password hashing cost: time per PBKDF2 derivation at several iteration
+# counts, to pick PASSWORD_ITERATIONS for the slowest till, and the cost of a
+# cashier switch that hits the session cache instead.
+#
+#   python benchmarks/bench_password_hash.py
+#   python benchmarks/bench_password_hash.py --iterations 100000 600000
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import poslite  # noqa: E402
+
+
+def timed(fn, repeat=5):
+    best = None
+    for _ in range(repeat):
+        began = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Password hashing benchmark")
+    parser.add_argument("--iterations", type=int, nargs="+", default=[100000, 200000, 400000, 600000])
+    args = parser.parse_args()
+    for iterations in args.iterations:
+        stored = poslite.hash_password("correct horse", iterations)
+        elapsed = timed(lambda: poslite.verify_password("correct horse", stored))
+        marker = "  <- PASSWORD_ITERATIONS" if iterations == poslite.PASSWORD_ITERATIONS else ""
+        print(f"{iterations:>8,} iterations: {elapsed * 1000:7.1f} ms per login{marker}")
+    with tempfile.TemporaryDirectory() as workdir:
+        poslite.open_store(os.path.join(workdir, "bench.db"))
+        poslite.initialize_db()
+        poslite.users.auth.login("cashier", "1234")
+        cached = timed(lambda: poslite.users.auth.login("cashier", "1234"), repeat=100)
+        print(f"cashier switch with a live session: {cached * 1000:.3f} ms")
+        poslite.store.db_pool.close_all()
@@ -0,0 +1,112 @@
+# Report latency benchmark: the old DATE(sale_date) BETWEEN scan against the
+# indexed half-open range used by db_fetch_sales_report.
+#
+#   python benchmarks/bench_sales_report.py                  # 1M and 10M rows
+#   python benchmarks/bench_sales_report.py --rows 100000    # quick run
+#
+# Best of 3 on one core (Python 3.11, SQLite 3.40), sales spread over two
+# years, so a 1-day report returns ten times the rows at 10M as at 1M:
+#
+#   rows   report    rows returned   DATE() scan   indexed range
+#   1M     1 day             1,370       2535 ms          5.3 ms
+#   1M     7 days            9,590       2541 ms         37.7 ms
+#   1M     31 days          42,466       2443 ms          157 ms
+#   10M    1 day            13,699      26260 ms         56.3 ms
+#   10M    7 days           95,891      26310 ms          359 ms
+#   10M    31 days         424,658      27070 ms         1697 ms
+#
+# The scan grows with the table; the indexed range only with the rows it
+# returns. The dashboard's day total (now read from daily_totals) stays
+# under 0.1 ms at both sizes, against 220 ms and 2902 ms for DATE()=?.
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import poslite  # noqa: E402
+
+LEGACY_REPORT = """
+    SELECT s.id, i.product_name, s.quantity, s.total, s.sale_date, s.payment_method
+    FROM sales s JOIN inventory i ON s.product_id = i.id
+    WHERE DATE(s.sale_date) BETWEEN ? AND ?
+"""
+PAYMENT_METHODS = ["Cash", "Mobile Money", "Other"]
+PRODUCTS = 1000
+DAYS = 730
+
+
+def populate(path, rows):
+    poslite.open_store(path)
+    poslite.initialize_db()
+    rng = random.Random(42)
+    with poslite.store.db_pool.transaction() as cursor:
+        cursor.executemany("INSERT INTO inventory (product_name, quantity, price, threshold) VALUES (?, ?, ?, ?)",
+                           [(f"Product {i}", 1000, round(rng.uniform(0.5, 50), 2), 10)
+                            for i in range(PRODUCTS)])
+    start = datetime(2024, 1, 1)
+    batch = 100000
+    for offset in range(0, rows, batch):
+        count = min(batch, rows - offset)
+        # Spread sales evenly over the period so sale ids stay in date order
+        data = []
+        for n in range(offset, offset + count):
+            when = start + timedelta(seconds=n * DAYS * 86400 // rows)
+            quantity = rng.randint(1, 5)
+            data.append((rng.randint(1, PRODUCTS), quantity, quantity * 2.5,
+                         when.strftime("%Y-%m-%d %H:%M:%S"), rng.choice(PAYMENT_METHODS)))
+        with poslite.store.db_pool.transaction() as cursor:
+            cursor.executemany("INSERT INTO sales (product_id, quantity, total, sale_date, payment_method) "
+                               "VALUES (?, ?, ?, ?, ?)", data)
+    poslite.store.db_pool.execute("ANALYZE")
+    return start
+
+
+def timed(fn, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        began = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(rows, workdir):
+    path = os.path.join(workdir, f"bench_{rows}.db")
+    print(f"populating {rows:,} sales rows ...", flush=True)
+    began = time.perf_counter()
+    start = populate(path, rows)
+    print(f"  populated in {time.perf_counter() - began:.1f}s")
+    legacy = sqlite3.connect(path)
+    middle = start + timedelta(days=DAYS // 2)
+    for days in (1, 7, 31):
+        first = middle.strftime("%Y-%m-%d")
+        last = (middle + timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        old_time, old_rows = timed(lambda: legacy.execute(LEGACY_REPORT, (first, last)).fetchall())
+        new_time, new_rows = timed(lambda: poslite.db_fetch_sales_report(first, last))
+        assert len(old_rows) == len(new_rows)
+        print(f"  {days:>2}-day report ({len(new_rows):>7,} rows): DATE() scan {old_time * 1000:9.1f} ms | "
+              f"indexed range {new_time * 1000:8.1f} ms | x{old_time / max(new_time, 1e-9):.0f}")
+    today = middle.strftime("%Y-%m-%d")
+    old_time, _ = timed(lambda: legacy.execute("SELECT SUM(total) FROM sales WHERE DATE(sale_date)=?",
+                                               (today,)).fetchone())
+    new_time, _ = timed(lambda: poslite.db_fetch_sales_total(today))
+    print(f"  dashboard day total: DATE() scan {old_time * 1000:9.1f} ms | daily_totals {new_time * 1000:8.1f} ms")
+    legacy.close()
+    poslite.store.db_pool.close_all()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sales report latency benchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000, 10000000])
+    parser.add_argument("--workdir", default=None, help="directory for the generated databases")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(dir=args.workdir) as workdir:
+        for rows in args.rows:
+            run(rows, workdir)
@@ -0,0 +1,61 @@
+# Startup benchmark: wall time from process spawn to the login window and to
+# a ready POSApp window, for the source tree and optionally a PyInstaller
+# build (pyinstaller main.spec). Needs a display.
+#
+#   python benchmarks/bench_startup.py                      # from source
+#   python benchmarks/bench_startup.py --exe dist/main      # onefile build too
+#   python benchmarks/bench_startup.py --db pos_lite.db     # against a copy of a real database
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def measure(command, workdir, db=None):
+    # Each run gets a scratch directory, so DB_PATH resolves to a fresh (or
+    # freshly copied) database and the run is independent of the previous one.
+    rundir = tempfile.mkdtemp(dir=workdir)
+    if db:
+        shutil.copy(db, os.path.join(rundir, "pos_lite.db"))
+    timing = os.path.join(rundir, "timing.txt")
+    began = time.time()
+    subprocess.run(command + ["--startup-timing", timing], cwd=rundir, check=True, timeout=120,
+                   stdout=subprocess.DEVNULL)
+    with open(timing) as f:
+        marks = dict((event, float(stamp)) for event, stamp in (line.split() for line in f))
+    shutil.rmtree(rundir, ignore_errors=True)
+    return marks["login_window"] - began, marks["app_ready"] - began
+
+
+def import_time():
+    # Module import cost alone, without Tk windows or the database
+    output = subprocess.run([sys.executable, "-c", "import time; t = time.perf_counter(); import main; "
+                             "print(time.perf_counter() - t)"], cwd=ROOT, check=True, capture_output=True, text=True)
+    return float(output.stdout)
+
+
+def report(label, command, runs, workdir, db):
+    samples = [measure(command, workdir, db) for _ in range(runs)]
+    login = [sample[0] for sample in samples]
+    app = [sample[1] for sample in samples]
+    print(f"{label}: login window {statistics.median(login) * 1000:7.0f} ms (min {min(login) * 1000:.0f}) | "
+          f"POSApp ready {statistics.median(app) * 1000:7.0f} ms (min {min(app) * 1000:.0f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="POS Lite startup benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--exe", help="PyInstaller build to time as well, e.g. dist/main")
+    parser.add_argument("--db", help="database to copy into each run instead of starting empty")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"import main: {import_time() * 1000:.0f} ms")
+        report("source", [sys.executable, os.path.join(ROOT, "main.py")], args.runs, workdir, args.db)
+        if args.exe:
+            report("onefile", [os.path.abspath(args.exe)], args.runs, workdir, args.db)
@@ -0,0 +1,234 @@
+# Benchmark suite for the db_* layer, run headless against synthetic stores
+# (benchmarks/synthetic.py). Writes one JSON document per run so two runs, or
+# two versions, can be compared with --compare.
+#
+#   python benchmarks/bench_suite.py --preset small --output results.json
+#   python benchmarks/bench_suite.py --preset medium --compare results.json
+#   python benchmarks/bench_suite.py --products 5000 --sales 2000000 --cache-dir ~/.cache/poslite-bench
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import poslite  # noqa: E402
+import synthetic  # noqa: E402
+
+PRESETS = {
+    "small": (1000, 100000),
+    "medium": (10000, 1000000),
+    "large": (100000, 10000000),
+    "xl": (1000000, 50000000),
+}
+
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        began = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - began)
+    return samples, result
+
+
+def row_count(result):
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict) and "rows" in result:
+        return result["rows"]
+    return None
+
+
+def cases(store, workdir, journal):
+    # (name, fn, repeat). Writes run against the same store; they are small
+    # next to its size, so later cases are not skewed by them.
+    last = date.fromisoformat(store["last_day"])
+    middle = date.fromisoformat(store["first_day"]) + (last - date.fromisoformat(store["first_day"])) / 2
+
+    def span(days):
+        return middle.isoformat(), (middle + timedelta(days=days - 1)).isoformat()
+
+    products = store["products"]
+    state = {"product": 0}
+
+    def next_product():
+        # Cycle through products so repeated sales do not run one out of stock
+        state["product"] = state["product"] % products + 1
+        return state["product"]
+
+    def dashboard_uncached():
+        poslite.store._dashboard_cache.__dict__.clear()
+        return poslite.db_fetch_dashboard_stats(last.isoformat())
+
+    def sync_branch():
+        # The bench store as a branch of a consolidation database; the
+        # warm-up call merges it whole, the timed ones a few new sales each
+        if "consolidation" not in state:
+            state["consolidation"] = poslite.Consolidation(os.path.join(workdir, "consolidated.db"))
+            state["consolidation"].add_branch("bench", poslite.store.db_pool.path)
+        poslite.db_checkout([(next_product(), 1) for _ in range(5)], "Cash")
+        return state["consolidation"].sync_branch("bench")
+
+    def analyze_sales(days):
+        # NumPy is only needed by this case, so it is imported on first use
+        from poslite import analytics
+        return analytics.analyze_sales(*span(days))
+
+    with poslite.store.db_pool.transaction() as cursor:
+        cursor.execute("UPDATE inventory SET quantity = quantity + 100000")
+    receipt_id = poslite.db_checkout([(product_id, 1) for product_id in range(1, 6)], "Cash")[0]
+    receipt = poslite.db_fetch_receipt(receipt_id)
+    return [
+        ("db_save_sale", lambda: poslite.db_save_sale(next_product(), 1, 2.5, "Cash"), 200),
+        ("db_sell", lambda: poslite.db_sell(next_product(), 1, "Cash"), 200),
+        ("db_checkout_5_lines", lambda: poslite.db_checkout([(next_product(), 1) for _ in range(5)], "Cash"), 100),
+        ("db_fetch_product", lambda: poslite.db_fetch_product(next_product()), 1000),
+        # The same product again, as when one item is scanned repeatedly: served by the product cache
+        ("db_fetch_product_cached", lambda: poslite.db_fetch_product(1), 1000),
+        ("db_fetch_product_by_name", lambda: poslite.db_fetch_product_by_name("Product 0"), 1000),
+        # A scanner reading a different barcode each time
+        ("db_fetch_product_by_code", lambda: poslite.db_fetch_product_by_code(synthetic.barcode(next_product() - 1)),
+         1000),
+        # Sales tab type-ahead: a short prefix matching every product, and two words
+        ("db_search_products_prefix", lambda: poslite.db_search_products("Pro", 8), 200),
+        ("db_search_products_words", lambda: poslite.db_search_products(f"product {products // 3}", 8), 200),
+        # What the Sell button does now: look the product up, journal the sale
+        ("sell_product_journal", lambda: journal.record([(poslite.db_fetch_product(next_product()).id, 1)], "Cash"),
+         200),
+        ("db_fetch_sales_report_1d", lambda: poslite.db_fetch_sales_report(*span(1)), 5),
+        ("db_fetch_sales_report_7d", lambda: poslite.db_fetch_sales_report(*span(7)), 5),
+        ("db_fetch_sales_report_31d", lambda: poslite.db_fetch_sales_report(*span(31)), 3),
+        ("db_fetch_sales_report_page_31d", lambda: poslite.db_fetch_sales_report_page(*span(31)), 20),
+        ("db_fetch_sales_summary_365d", lambda: poslite.db_fetch_sales_summary(*span(365)), 20),
+        ("db_fetch_sales_by_period_365d", lambda: poslite.db_fetch_sales_by_period(*span(365)), 20),
+        # Warm: the months are held as columns after the warm-up call
+        ("analyze_sales_365d", lambda: analyze_sales(365), 5),
+        ("db_fetch_recent_sales", lambda: poslite.db_fetch_recent_sales(10), 100),
+        ("db_fetch_receipt", lambda: poslite.db_fetch_receipt(receipt_id), 1000),
+        # Compiled template and cached header, as for every receipt after the first
+        ("render_receipt_escpos", lambda: poslite.render_receipt(receipt, "escpos"), 1000),
+        ("db_fetch_inventory_page", lambda: poslite.db_fetch_inventory_page(products // 2, 100), 100),
+        ("db_fetch_inventory_levels", lambda: poslite.db_fetch_inventory_levels(), 5),
+        # One probe of the product's newest stock movement
+        ("db_reconcile_stock", lambda: poslite.db_reconcile_stock(next_product()), 1000),
+        ("db_fetch_reorder_suggestions", lambda: poslite.db_fetch_reorder_suggestions(today=last), 20),
+        ("dashboard_stats_uncached", dashboard_uncached, 100),
+        ("dashboard_stats_cached", lambda: poslite.db_fetch_dashboard_stats(last.isoformat()), 1000),
+        ("export_inventory_to_csv",
+         lambda: poslite.export_inventory_to_csv(os.path.join(workdir, "inventory.csv")), 3),
+        ("export_sales_to_csv_31d",
+         lambda: poslite.export_sales_to_csv(os.path.join(workdir, "sales.csv"), *span(31)), 3),
+        ("sync_branch_5_new_sales", sync_branch, 20),
+        ("backup_db", lambda: poslite.backup_db(os.path.join(workdir, "backups"), keep=1), 1),
+    ]
+
+
+def run(products, sales, workdir, cache_dir, only=None):
+    path = os.path.join(cache_dir or workdir, f"synthetic_{products}_{sales}.db")
+    meta_path = path + ".json"
+    if cache_dir and os.path.exists(path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            store = json.load(f)
+        poslite.open_store(path)
+        poslite.initialize_db()
+    else:
+        print(f"generating {products:,} products / {sales:,} sales ...", file=sys.stderr, flush=True)
+        store = synthetic.generate_store(path, products, sales)
+        with open(meta_path, "w") as f:
+            json.dump(store, f)
+    # Benchmarks mutate the store, so cached stores are benchmarked on a copy
+    if cache_dir:
+        copy = os.path.join(workdir, "store.db")
+        target = sqlite3.connect(copy)
+        poslite.store.db_pool.connection().backup(target)
+        target.close()
+        poslite.open_store(copy)
+    results = []
+    journal = poslite.SaleJournal(os.path.join(workdir, "journal.db"))
+    for name, fn, repeat in cases(store, workdir, journal):
+        if only and name not in only:
+            continue
+        fn()  # warm-up: statement cache, page cache
+        poslite.store.db_pool.reset_stats()
+        samples, result = timed(fn, repeat)
+        samples.sort()
+        results.append({
+            "name": name, "products": products, "sales": sales, "repeat": repeat, "rows": row_count(result),
+            "min_ms": samples[0] * 1000, "median_ms": statistics.median(samples) * 1000,
+            "p95_ms": samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000,
+            "commits": poslite.store.db_pool.commit_count,
+        })
+        print(f"  {name:<32} median {results[-1]['median_ms']:10.3f} ms  (min {results[-1]['min_ms']:.3f})",
+              file=sys.stderr, flush=True)
+    journal.stop()
+    poslite.store.db_pool.close_all()
+    return results
+
+
+def environment():
+    try:
+        revision = subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {"revision": revision, "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "sqlite": sqlite3.sqlite_version, "platform": platform.platform(),
+            "machine": platform.machine()}
+
+
+def compare(previous, results, threshold):
+    # Flags cases whose median got slower than threshold (e.g. 0.2 = +20%)
+    before = {(entry["name"], entry["products"], entry["sales"]): entry for entry in previous["results"]}
+    regressions = 0
+    for entry in results:
+        old = before.get((entry["name"], entry["products"], entry["sales"]))
+        if old is None:
+            continue
+        ratio = entry["median_ms"] / max(old["median_ms"], 1e-9)
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{entry['name']:<32} {old['median_ms']:10.3f} -> {entry['median_ms']:10.3f} ms  x{ratio:5.2f}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="POS Lite db_* benchmark suite")
+    parser.add_argument("--preset", choices=PRESETS, nargs="+", help="store sizes to run")
+    parser.add_argument("--products", type=int, help="custom store size (with --sales)")
+    parser.add_argument("--sales", type=int)
+    parser.add_argument("--only", nargs="+", help="run only these cases")
+    parser.add_argument("--cache-dir", help="keep generated stores here between runs")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown that counts as a regression")
+    args = parser.parse_args()
+    sizes = [PRESETS[preset] for preset in args.preset or ()]
+    if args.products or args.sales:
+        sizes.append((args.products or 1000, args.sales or 100000))
+    sizes = sizes or [PRESETS["small"]]
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for products, sales in sizes:
+            print(f"store: {products:,} products, {sales:,} sales", file=sys.stderr)
+            results.extend(run(products, sales, workdir, args.cache_dir, args.only))
+    document = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+    else:
+        json.dump(document, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        sys.exit(1 if regressions else 0)
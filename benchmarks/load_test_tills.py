@@ -0,0 +1,97 @@
+# Load test: N simulated tills selling against one POS Lite service. Starts an
+# in-process server on a scratch database unless --url points at a running
+# one (python main.py serve).
+#
+#   python benchmarks/load_test_tills.py --tills 8 --sales 500
+#   python benchmarks/load_test_tills.py --tills 8 --max-batch 1       # no group commit
+#   python benchmarks/load_test_tills.py --url http://127.0.0.1:8765 --user cashier --password 1234
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import poslite  # noqa: E402
+
+PAYMENT_METHODS = ["Cash", "Mobile Money", "Other"]
+
+
+def start_server(workdir, products, max_batch):
+    poslite.open_store(os.path.join(workdir, "load.db"))
+    poslite.initialize_db()
+    with poslite.store.db_pool.transaction() as cursor:
+        cursor.executemany("INSERT INTO inventory (product_name, quantity, price, threshold) VALUES (?, ?, ?, ?)",
+                           [(f"Product {i}", 10 ** 9, 2.5, 10) for i in range(products)])
+    server = poslite.make_server(port=0, max_batch=max_batch)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def till(url, user, password, sales, products, seed, latencies, errors, start):
+    store = poslite.RemoteStore(url)
+    store.login(user, password)
+    rng = random.Random(seed)
+    start.wait()
+    for _ in range(sales):
+        began = time.perf_counter()
+        try:
+            if rng.random() < 0.8:
+                store.db_sell(rng.randint(1, products), rng.randint(1, 3), rng.choice(PAYMENT_METHODS))
+            else:
+                lines = [(rng.randint(1, products), rng.randint(1, 3)) for _ in range(rng.randint(2, 6))]
+                store.db_checkout(lines, rng.choice(PAYMENT_METHODS))
+        except Exception as e:
+            errors.append(repr(e))
+        latencies.append(time.perf_counter() - began)
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate several tills against a POS Lite service")
+    parser.add_argument("--tills", type=int, default=8)
+    parser.add_argument("--sales", type=int, default=500, help="sales per till")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--max-batch", type=int, default=64, help="group commit size of the in-process server")
+    parser.add_argument("--url", help="existing server to load instead of starting one")
+    parser.add_argument("--user", default="cashier")
+    parser.add_argument("--password", default="1234")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        server = None
+        url = args.url
+        if url is None:
+            server, url = start_server(workdir, args.products, args.max_batch)
+        latencies, errors = [], []
+        start = threading.Event()
+        threads = [threading.Thread(target=till, args=(url, args.user, args.password, args.sales, args.products, n,
+                                                       latencies, errors, start))
+                   for n in range(args.tills)]
+        for thread in threads:
+            thread.start()
+        began = time.perf_counter()
+        start.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - began
+        latencies.sort()
+        print(f"{args.tills} tills x {args.sales} sales in {elapsed:.2f}s: {len(latencies) / elapsed:,.0f} sales/s, "
+              f"{len(errors)} error(s)")
+        print(f"latency p50 {statistics.median(latencies) * 1000:.1f} ms | p95 {percentile(latencies, 0.95) * 1000:.1f} ms"
+              f" | p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+        for error in sorted(set(errors))[:5]:
+            print(f"  {error}")
+        stats = poslite.RemoteStore(url)
+        stats.login(args.user, args.password)
+        print("server:", stats.request("GET", "/stats"))
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            server.writer.stop()
+            poslite.store.db_pool.close_all()
@@ -0,0 +1,113 @@
+# Synthetic store generator for the benchmarks: products with realistic
+# prices and stock, and sales spread over a period with busier weekends and
+# opening-hours peaks, a Cash / Mobile Money / Other payment mix and 1-5
+# units per line. The same arguments always produce the same store.
+#
+#   python benchmarks/synthetic.py store.db --products 10000 --sales 1000000
+import argparse
+import itertools
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import poslite  # noqa: E402
+
+PAYMENT_METHODS = (("Cash", 0.6), ("Mobile Money", 0.3), ("Other", 0.1))
+# Relative sales by weekday (Monday first) and by hour of day
+WEEKDAY_WEIGHTS = (0.9, 0.85, 0.9, 1.0, 1.2, 1.5, 1.1)
+HOUR_WEIGHTS = (0, 0, 0, 0, 0, 0, 0.1, 0.4, 0.8, 1.0, 1.0, 1.2, 1.5, 1.3, 1.0, 1.0, 1.1, 1.4, 1.6, 1.2, 0.6, 0.2, 0,
+                0)
+START = datetime(2024, 1, 1)
+BATCH = 100000
+
+
+def barcode(i):
+    # 13-digit EAN-style code of the i-th generated product (id i + 1)
+    return f"{600000000000 + i:013d}"
+
+
+def _daily_counts(sales, days):
+    # Sales per day, weighted by weekday with a gentle upward trend; the
+    # rounding remainder goes to the busiest days so the total is exact.
+    weights = [WEEKDAY_WEIGHTS[(START + timedelta(days=day)).weekday()] * (1 + day / days / 2) for day in range(days)]
+    scale = sales / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    for day in sorted(range(days), key=lambda day: -weights[day])[:sales - sum(counts)]:
+        counts[day] += 1
+    return counts
+
+
+def generate_store(path, products=1000, sales=100000, days=730, seed=42, progress=None):
+    # Builds the store at path (replacing it) with the store's own schema. Sales
+    # are bulk loaded without the aggregate triggers and indexes, which
+    # initialize_db then rebuilds in one pass each.
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    rng = random.Random(seed)
+    poslite.open_store(path)
+    poslite.initialize_db()
+    with poslite.store.db_pool.transaction() as cursor:
+        for trigger in ("trg_inventory_insert", "trg_inventory_delete", "trg_inventory_update", "trg_sales_insert",
+                        "trg_catalog_insert", "trg_catalog_delete", "trg_catalog_update", "trg_stock_movements_sale"):
+            cursor.execute(f"DROP TRIGGER {trigger}")
+        cursor.execute("DROP TABLE inventory_stats")
+        cursor.execute("DROP TABLE daily_totals")
+        cursor.execute("DROP TABLE stock_movements")
+        cursor.execute("DROP TABLE product_daily_sales")
+        cursor.execute("DROP INDEX idx_sales_sale_date")
+        cursor.execute("DROP INDEX idx_sales_product_id")
+        prices = [round(rng.lognormvariate(1.5, 0.8), 2) + 0.5 for _ in range(products)]
+        cursor.executemany("INSERT INTO inventory (product_name, quantity, price, threshold, sku, barcode) "
+                           "VALUES (?, ?, ?, ?, ?, ?)",
+                           [(f"Product {i}", rng.randint(0, 500), prices[i], rng.choice((5, 10, 20)), f"SKU{i:07d}",
+                             barcode(i)) for i in range(products)])
+    methods = [method for method, weight in PAYMENT_METHODS]
+    method_weights = [weight for method, weight in PAYMENT_METHODS]
+    # Popular products sell far more often than the long tail
+    product_weights = list(itertools.accumulate(1 / (rank + 1) ** 0.8 for rank in range(products)))
+    rows = []
+    done = 0
+    for day, count in enumerate(_daily_counts(sales, days)):
+        # Opening-hours peaks; sorted so ids follow time as in a real store
+        hours = rng.choices(range(24), weights=HOUR_WEIGHTS, k=count)
+        seconds = sorted(hour * 3600 + rng.randrange(3600) for hour in hours)
+        product_ids = rng.choices(range(1, products + 1), cum_weights=product_weights, k=count)
+        payment_methods = rng.choices(methods, weights=method_weights, k=count)
+        quantities = rng.choices((1, 2, 3, 4, 5), weights=(60, 20, 10, 6, 4), k=count)
+        day_start = START + timedelta(days=day)
+        for second, product_id, payment_method, quantity in zip(seconds, product_ids, payment_methods, quantities):
+            rows.append((product_id, quantity, round(quantity * prices[product_id - 1], 2),
+                         (day_start + timedelta(seconds=second)).strftime("%Y-%m-%d %H:%M:%S"), payment_method))
+        if len(rows) >= BATCH or day == days - 1:
+            with poslite.store.db_pool.transaction() as cursor:
+                cursor.executemany("INSERT INTO sales (product_id, quantity, total, sale_date, payment_method) "
+                                   "VALUES (?, ?, ?, ?, ?)", rows)
+            done += len(rows)
+            rows = []
+            if progress:
+                progress(done, sales)
+    poslite.store.db_pool.execute("PRAGMA user_version = 0")
+    poslite.initialize_db()
+    poslite.store.db_pool.execute("ANALYZE")
+    poslite.store.db_pool.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return {"products": products, "sales": sales, "days": days, "seed": seed,
+            "first_day": START.strftime("%Y-%m-%d"),
+            "last_day": (START + timedelta(days=days - 1)).strftime("%Y-%m-%d")}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic POS Lite store")
+    parser.add_argument("path")
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--sales", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    began = time.perf_counter()
+    generate_store(args.path, args.products, args.sales, args.days, args.seed,
+                   progress=lambda done, total: print(f"\r{done:,}/{total:,} sales", end="", flush=True))
+    print(f"\ngenerated {args.path} in {time.perf_counter() - began:.1f}s")
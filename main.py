@@ -1,306 +1,431 @@
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
-import sqlite3
-from datetime import datetime, date
-import shutil
-import csv
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from tkinter import ttk, messagebox, simpledialog, filedialog
+import argparse
+import threading
+import queue
+from collections import deque
+from datetime import datetime
+import os
+import time
+
+# The store, backups, CSV, users, service and journal live in the poslite
+# package, which does not need Tk. Its functions are called through their
+# modules because --server and --metrics rebind them there.
+from poslite import archive, backup, consolidation, csvio, i18n, journal, metrics, receipts, service, store, users
+from poslite.i18n import t
+from poslite.store import Cart
+from poslite.users import AuthError, LoginThrottled
 
 # ---------------------- Multi-language Support ----------------------
-translations = {
-    "en": {
-        "title": "POS Lite",
-        "inventory_tab": "Inventory",
-        "sales_tab": "Sales",
-        "reports_tab": "Reports",
-        "product_name": "Product Name",
-        "quantity": "Quantity",
-        "price": "Price",
-        "threshold": "Threshold",
-        "save_product": "Save Product",
-        "update_product": "Update Product",
-        "delete_product": "Delete Product",
-        "product_id": "Product ID",
-        "sale_quantity": "Sale Quantity",
-        "payment_method": "Payment Method",
-        "sell": "Sell",
-        "refresh_sales": "Refresh Sales",
-        "start_date": "Start Date (YYYY-MM-DD)",
-        "end_date": "End Date (YYYY-MM-DD)",
-        "generate_report": "Generate Report",
-        "sales_chart": "Show Sales Chart",
-        "inventory_chart": "Show Inventory Chart",
-        "backup": "Backup DB",
-        "restore": "Restore DB",
-        "export_csv": "Export CSV",
-        "dashboard": "Dashboard: Total Products: {total_products} | Low Stock: {low_stock} | Today's Sales: ${today_sales:.2f}",
-        "login_title": "Login",
-        "username": "Username",
-        "password": "Password",
-        "login": "Login",
-        "help": "Help",
-        "help_text": "This POS system supports Inventory, Sales, and Reports. Use the menus to switch languages and view help.",
-        "invalid_credentials": "Invalid username or password.",
-        "select_product": "No product selected!",
-        "not_enough_inventory": "Not enough inventory!",
-        "sale_completed": "Sale completed! Total: ${total}",
-        "backup_success": "Backup successful!",
-        "restore_success": "Restore successful!",
-        "export_success": "Export successful!",
-        "choose_language": "Choose Language"
-    },
-    "sw": {
-        "title": "POS Lite",
-        "inventory_tab": "Bidhaa",
-        "sales_tab": "Uuzaji",
-        "reports_tab": "Ripoti",
-        "product_name": "Jina la Bidhaa",
-        "quantity": "Kiasi",
-        "price": "Bei",
-        "threshold": "Kipimo cha chini",
-        "save_product": "Hifadhi Bidhaa",
-        "update_product": "Sasisha Bidhaa",
-        "delete_product": "Futa Bidhaa",
-        "product_id": "ID ya Bidhaa",
-        "sale_quantity": "Kiasi cha Uuzaji",
-        "payment_method": "Njia ya Malipo",
-        "sell": "Uza",
-        "refresh_sales": "Sasisha Uuzaji",
-        "start_date": "Tarehe ya Mwanzo (YYYY-MM-DD)",
-        "end_date": "Tarehe ya Mwisho (YYYY-MM-DD)",
-        "generate_report": "Tengeneza Ripoti",
-        "sales_chart": "Onyesha Chati ya Uuzaji",
-        "inventory_chart": "Onyesha Chati ya Bidhaa",
-        "backup": "Hifadhi Nakala",
-        "restore": "Rejesha Nakala",
-        "export_csv": "Hamisha CSV",
-        "dashboard": "Dashibodi: Jumla Bidhaa: {total_products} | Bidhaa Zenye kipimo cha chini: {low_stock} | Mauzo ya Leo: ${today_sales:.2f}",
-        "login_title": "Ingia",
-        "username": "Jina la Mtumiaji",
-        "password": "Nywila",
-        "login": "Ingia",
-        "help": "Msaada",
-        "help_text": "Mfumo huu wa POS unaunga mkono Bidhaa, Uuzaji, na Ripoti. Tumia menyu kubadilisha lugha na kuona msaada.",
-        "invalid_credentials": "Jina la mtumiaji au nywila si sahihi.",
-        "select_product": "Hakuna bidhaa imechaguliwa!",
-        "not_enough_inventory": "Hakuna bidhaa za kutosha!",
-        "sale_completed": "Uuzaji umefanikiwa! Jumla: ${total}",
-        "backup_success": "Hifadhi nakala imefanikiwa!",
-        "restore_success": "Rejesha nakala imefanikiwa!",
-        "export_success": "Hamisha imefanikiwa!",
-        "choose_language": "Chagua Lugha"
-    }
-}
-current_lang = "en"
-
-
-def t(key, **kwargs):
-    return translations[current_lang].get(key, key).format(**kwargs)
-
-
-# ---------------------- Database Functions ----------------------
-def initialize_db():
-    connection = sqlite3.connect("pos_lite.db")
-    cursor = connection.cursor()
-    # Inventory table with threshold
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS inventory (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product_name TEXT NOT NULL,
-            quantity INTEGER NOT NULL,
-            price REAL NOT NULL,
-            threshold INTEGER NOT NULL DEFAULT 0
-        )
-    """)
-    # Sales table with payment_method
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS sales (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product_id INTEGER,
-            quantity INTEGER,
-            total REAL,
-            sale_date TEXT,
-            payment_method TEXT,
-            FOREIGN KEY (product_id) REFERENCES inventory (id)
-        )
-    """)
-    connection.commit()
-    connection.close()
-
-
-def db_save_product(name, quantity, price, threshold):
-    connection = sqlite3.connect("pos_lite.db")
-    cursor = connection.cursor()
-    cursor.execute("INSERT INTO inventory (product_name, quantity, price, threshold) VALUES (?, ?, ?, ?)",
-                   (name, quantity, price, threshold))
-    connection.commit()
-    connection.close()
-
-
-def db_fetch_inventory():
-    connection = sqlite3.connect("pos_lite.db")
-    cursor = connection.cursor()
-    cursor.execute("SELECT * FROM inventory")
-    items = cursor.fetchall()
-    connection.close()
-    return items
-
-
-def db_update_product(item_id, name, quantity, price, threshold):
-    connection = sqlite3.connect("pos_lite.db")
-    cursor = connection.cursor()
-    cursor.execute("""
-        UPDATE inventory
-        SET product_name = ?, quantity = ?, price = ?, threshold = ?
-        WHERE id = ?
-    """, (name, quantity, price, threshold, item_id))
-    connection.commit()
-    connection.close()
-
-
-def db_delete_product(item_id):
-    connection = sqlite3.connect("pos_lite.db")
-    cursor = connection.cursor()
-    cursor.execute("DELETE FROM inventory WHERE id = ?", (item_id,))
-    connection.commit()
-    connection.close()
-
-
-def db_save_sale(product_id, quantity, total, payment_method):
-    connection = sqlite3.connect("pos_lite.db")
-    cursor = connection.cursor()
-    cursor.execute("INSERT INTO sales (product_id, quantity, total, sale_date, payment_method) VALUES (?, ?, ?, ?, ?)",
-                   (product_id, quantity, total, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), payment_method))
-    connection.commit()
-    connection.close()
-
-
-def db_fetch_sales_report(start_date, end_date):
-    connection = sqlite3.connect("pos_lite.db")
-    cursor = connection.cursor()
-    cursor.execute("""
-        SELECT 
-            s.id, 
-            i.product_name, 
-            s.quantity, 
-            s.total, 
-            s.sale_date,
-            s.payment_method
-        FROM 
-            sales s
-        JOIN 
-            inventory i 
-        ON 
-            s.product_id = i.id
-        WHERE 
-            DATE(s.sale_date) BETWEEN ? AND ?
-    """, (start_date, end_date))
-    sales = cursor.fetchall()
-    connection.close()
-    return sales
-
-
-def db_fetch_recent_sales(limit=10):
-    connection = sqlite3.connect("pos_lite.db")
-    cursor = connection.cursor()
-    cursor.execute("""
-        SELECT 
-            s.id, 
-            i.product_name, 
-            s.quantity, 
-            s.total, 
-            s.sale_date,
-            s.payment_method
-        FROM 
-            sales s
-        JOIN 
-            inventory i 
-        ON 
-            s.product_id = i.id
-        ORDER BY s.id DESC
-        LIMIT ?
-    """, (limit,))
-    sales = cursor.fetchall()
-    connection.close()
-    return sales
-
-
-def backup_db():
-    try:
-        shutil.copy("pos_lite.db", "pos_lite_backup.db")
-        return True
-    except Exception as e:
-        return False
-
-
-def restore_db():
-    try:
-        shutil.copy("pos_lite_backup.db", "pos_lite.db")
-        return True
-    except Exception as e:
-        return False
-
-
-def export_inventory_to_csv(filename="inventory_export.csv"):
-    items = db_fetch_inventory()
-    with open(filename, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["ID", "Product Name", "Quantity", "Price", "Threshold"])
-        writer.writerows(items)
-    return True
-
+# Texts come from the catalogs in poslite/locales (see poslite.i18n). Every
+# widget showing one is registered here with its key, so switching language
+# relabels the whole UI, open windows included, in one pass. Each entry keeps
+# the text it last set and Tk is only called for the ones that change.
+class Localizer:
+    def __init__(self):
+        self.entries = {}
+
+    def _register(self, widget, slot, setter, key, kwargs):
+        text = t(key, **kwargs)
+        setter(text)
+        self.entries[(str(widget), slot)] = [widget, setter, key, kwargs, text]
+        return widget
+
+    def text(self, widget, key, **kwargs):
+        # Labels and buttons; registering again replaces the key or arguments
+        return self._register(widget, "text", lambda text: widget.configure(text=text), key, kwargs)
+
+    def title(self, window, key, **kwargs):
+        return self._register(window, "title", window.title, key, kwargs)
+
+    def heading(self, tree, column, key):
+        return self._register(tree, "heading " + column, lambda text: tree.heading(column, text=text), key, {})
+
+    def tab(self, notebook, child, key):
+        self._register(notebook, f"tab {child}", lambda text: notebook.tab(child, text=text), key, {})
+        return child
+
+    def menu(self, menu, index, key):
+        return self._register(menu, f"menu {index}", lambda text: menu.entryconfig(index, label=text), key, {})
+
+    def custom(self, widget, slot, setter, key, **kwargs):
+        # Any other text that lives as long as widget, e.g. chart titles or
+        # canvas items; setter(text) applies it
+        return self._register(widget, slot, setter, key, kwargs)
+
+    def relabel(self):
+        for slot, entry in list(self.entries.items()):
+            widget, setter, key, kwargs, current = entry
+            try:
+                alive = widget.winfo_exists()
+            except tk.TclError:
+                alive = False
+            if not alive:
+                # Destroyed since it was registered, e.g. a closed window
+                del self.entries[slot]
+                continue
+            text = t(key, **kwargs)
+            if text != current:
+                setter(text)
+                entry[4] = text
+
+
+localizer = Localizer()
+
+
+# ---------------------- Virtual Treeview ----------------------
+# Shows a large keyset-paginated result in a Treeview without loading it all:
+# pages are fetched as the user scrolls towards either end, and at most
+# max_pages pages stay in the widget, so memory and insert time stay bounded.
+# fetch_page(key, limit, reverse) returns rows after (or, reversed, before)
+# key in display order; key_of(row) gives the pagination key of a row.
+class VirtualTreeview:
+    def __init__(self, tree, scrollbar, fetch_page, key_of, page_size=100, max_pages=5, margin=0.1):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.fetch_page = fetch_page
+        self.key_of = key_of
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.margin = margin
+        self.pages = deque()
+        self.at_start = True
+        self.at_end = True
+        self._pending = False
+        tree.configure(yscrollcommand=self._on_scroll)
+        scrollbar.configure(command=tree.yview)
+
+    def reset(self, fetch_page=None, rows=None):
+        # rows optionally seeds the first page, e.g. when it was fetched by a
+        # background task.
+        if fetch_page is not None:
+            self.fetch_page = fetch_page
+        children = self.tree.get_children()
+        if children:
+            self.tree.delete(*children)
+        self.pages.clear()
+        self.at_start = True
+        self.at_end = False
+        self.load_next(rows)
+
+    def load_next(self, rows=None):
+        if self.at_end:
+            return
+        if rows is None:
+            after = self.pages[-1][-1][0] if self.pages else None
+            rows = self.fetch_page(after, self.page_size, False)
+        self.at_end = len(rows) < self.page_size
+        if not rows:
+            return
+        anchor = self._first_visible()
+        self.pages.append([(self.key_of(row), self._insert(row, tk.END)) for row in rows])
+        if len(self.pages) > self.max_pages:
+            self.tree.delete(*[iid for key, iid in self.pages.popleft()])
+            self.at_start = False
+            self._restore_view(anchor)
+
+    def load_previous(self):
+        if self.at_start or not self.pages:
+            return
+        rows = self.fetch_page(self.pages[0][0][0], self.page_size, True)
+        self.at_start = len(rows) < self.page_size
+        if not rows:
+            return
+        anchor = self._first_visible()
+        self.pages.appendleft([(self.key_of(row), self._insert(row, index)) for index, row in enumerate(rows)])
+        if len(self.pages) > self.max_pages:
+            self.tree.delete(*[iid for key, iid in self.pages.pop()])
+            self.at_end = False
+        self._restore_view(anchor)
+
+    # Diff-based refresh after a single-row edit: touch only that row.
+    def update_row(self, row):
+        iid = str(row[0])
+        if self.tree.exists(iid):
+            self.tree.item(iid, values=row)
+        elif self.at_end and (not self.pages or self.key_of(row) > self.pages[-1][-1][0]):
+            # New rows sort last; show them only if the tail is loaded.
+            if not self.pages:
+                self.pages.append([])
+            self.pages[-1].append((self.key_of(row), self._insert(row, tk.END)))
+
+    def remove_row(self, row_id):
+        iid = str(row_id)
+        if not self.tree.exists(iid):
+            return
+        self.tree.delete(iid)
+        for page in self.pages:
+            page[:] = [(key, item) for key, item in page if item != iid]
+        while self.pages and not self.pages[0]:
+            self.pages.popleft()
+        while self.pages and not self.pages[-1]:
+            self.pages.pop()
+
+    def _insert(self, row, index):
+        iid = str(row[0])
+        if self.tree.exists(iid):
+            self.tree.delete(iid)
+        return self.tree.insert("", index, iid=iid, values=row)
+
+    def _first_visible(self):
+        return self.tree.identify_row(1) or None
+
+    def _restore_view(self, anchor):
+        # Rows added or dropped above the viewport shift it; scroll back so the
+        # row that was on top stays on top.
+        children = len(self.tree.get_children())
+        if anchor and children and self.tree.exists(anchor):
+            self.tree.yview_moveto(self.tree.index(anchor) / children)
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self._pending:
+            return
+        if float(last) >= 1 - self.margin and not self.at_end:
+            self._schedule(self.load_next)
+        elif float(first) <= self.margin and not self.at_start:
+            self._schedule(self.load_previous)
 
-def export_sales_to_csv(filename="sales_export.csv"):
-    connection = sqlite3.connect("pos_lite.db")
-    cursor = connection.cursor()
-    cursor.execute("SELECT * FROM sales")
-    sales = cursor.fetchall()
-    connection.close()
-    with open(filename, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["ID", "Product ID", "Quantity", "Total", "Sale Date", "Payment Method"])
-        writer.writerows(sales)
-    return True
+    def _schedule(self, load):
+        def run():
+            try:
+                load()
+            finally:
+                self._pending = False
+        self._pending = True
+        self.tree.after_idle(run)
+
+
+# ---------------------- Background Tasks ----------------------
+class TaskCancelled(Exception):
+    pass
+
+
+# Handle given to a background function: it reports progress and polls for
+# cancellation at safe points through check().
+class Task:
+    def __init__(self, name, events):
+        self.name = name
+        self.events = events
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.on_done = None
+        self.on_error = None
+        self.on_progress = None
+
+    def cancel(self):
+        self.cancel_event.set()
+        # A task that never started still has to report back, or it would
+        # stay active forever.
+        if self.future is not None and self.future.cancel():
+            self.events.put((self, "error", TaskCancelled(self.name)))
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check(self):
+        if self.cancel_event.is_set():
+            raise TaskCancelled(self.name)
+
+    def progress(self, done, total=None):
+        self.check()
+        self.events.put((self, "progress", (done, total)))
+
+
+# Runs slow work (reports, exports, backups) on worker threads so the Tk main
+# loop stays responsive. Workers use their own pooled SQLite connections, and
+# results are handed back to the Tk thread through a queue polled with after(),
+# since Tk widgets must only be touched from the main thread.
+class TaskRunner:
+    def __init__(self, root, max_workers=2, poll_ms=50):
+        self.root = root
+        # Imported here: concurrent.futures pulls in logging, which the login
+        # window does not need.
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pos-worker")
+        self.events = queue.Queue()
+        self.poll_ms = poll_ms
+        self.active = set()
+        self._poll()
+
+    def submit(self, name, fn, on_done=None, on_error=None, on_progress=None):
+        task = Task(name, self.events)
+        task.on_done, task.on_error, task.on_progress = on_done, on_error, on_progress
+
+        def run():
+            try:
+                task.check()
+                result = fn(task)
+            except Exception as e:
+                self.events.put((task, "error", e))
+            else:
+                self.events.put((task, "done", result))
+
+        self.active.add(task)
+        task.future = self.executor.submit(run)
+        return task
+
+    def cancel_all(self, wait=False):
+        # wait=True also blocks until the running tasks have returned, for
+        # callers about to pull the database out from under them
+        for task in list(self.active):
+            task.cancel()
+        if wait:
+            from concurrent.futures import wait as wait_for
+            wait_for([task.future for task in self.active if task.future is not None])
+
+    def shutdown(self):
+        self.cancel_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self):
+        while True:
+            try:
+                task, kind, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                if task.on_progress and not task.cancelled:
+                    task.on_progress(*payload)
+                continue
+            self.active.discard(task)
+            callback = task.on_done if kind == "done" else task.on_error
+            if callback:
+                try:
+                    callback(payload)
+                except Exception as e:
+                    messagebox.showerror(t("title"), t("error", error=e))
+        self.root.after(self.poll_ms, self._poll)
+
+
+def _chart_classes():
+    # matplotlib is the heaviest import by far and only charts need it, so it
+    # loads on the first chart instead of before the login window. The Figure
+    # class is used directly, which skips pyplot and its backend selection.
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    return Figure, FigureCanvasTkAgg
+
+
+# A chart Toplevel that is created once and then redrawn in place: later
+# updates reuse the figure and, when the bar count is unchanged, only move the
+# existing bars instead of building a new Figure and canvas on every click.
+# Titles and axis labels are catalog keys, relabelled on a language switch.
+class ChartWindow:
+    def __init__(self, master, title_key, xlabel_key, ylabel_key, color):
+        self.master = master
+        self.title_key = title_key
+        self.xlabel_key = xlabel_key
+        self.ylabel_key = ylabel_key
+        self.color = color
+        self.window = None
+        self.bars = None
+
+    def show(self, labels, values, title_key=None):
+        if self.window is None or not self.window.winfo_exists():
+            self._create()
+        if self.bars is not None and len(self.bars) == len(values):
+            for bar, value in zip(self.bars, values):
+                bar.set_height(value)
+        else:
+            if self.bars is not None:
+                self.bars.remove()
+            self.bars = self.ax.bar(range(len(values)), values, color=self.color)
+        self.ax.set_xticks(range(len(labels)))
+        self.ax.set_xticklabels(labels, rotation=45, ha="right")
+        localizer.custom(self.window, "chart title", lambda text: self._relabel(self.ax.set_title, text),
+                         title_key or self.title_key)
+        self.ax.relim()
+        self.ax.autoscale_view()
+        self.figure.tight_layout()
+        self.canvas.draw_idle()
+        self.window.deiconify()
+        self.window.lift()
+
+    def _create(self):
+        Figure, FigureCanvasTkAgg = _chart_classes()
+        self.window = tk.Toplevel(self.master)
+        localizer.title(self.window, self.title_key)
+        self.figure = Figure(figsize=(8, 4))
+        self.ax = self.figure.add_subplot(111)
+        self.bars = None
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self.window)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        localizer.custom(self.window, "xlabel", lambda text: self._relabel(self.ax.set_xlabel, text), self.xlabel_key)
+        localizer.custom(self.window, "ylabel", lambda text: self._relabel(self.ax.set_ylabel, text), self.ylabel_key)
+        # Closing only hides the window, so the next chart reuses it
+        self.window.protocol("WM_DELETE_WINDOW", self.window.withdraw)
+
+    def _relabel(self, setter, text):
+        setter(text)
+        self.figure.tight_layout()
+        self.canvas.draw_idle()
 
 
 # ---------------------- Login Screen ----------------------
+# Builds the login form in `root`. on_login(session) runs after a successful
+# login; by default the form is replaced by the POS window in the same root.
 class LoginApp:
-    def __init__(self, root):
+    def __init__(self, root, on_login=None):
         self.root = root
-        self.root.title(t("login_title"))
+        self.on_login = on_login or self.open_app
+        localizer.title(self.root, "login_title")
         self.root.geometry("300x150")
+        self.frame = tk.Frame(root)
+        self.frame.pack(fill=tk.BOTH, expand=True)
 
-        tk.Label(root, text=t("username")).pack(pady=5)
-        self.username_entry = tk.Entry(root)
+        localizer.text(tk.Label(self.frame), "username").pack(pady=5)
+        self.username_entry = tk.Entry(self.frame)
         self.username_entry.pack(pady=5)
 
-        tk.Label(root, text=t("password")).pack(pady=5)
-        self.password_entry = tk.Entry(root, show="*")
+        localizer.text(tk.Label(self.frame), "password").pack(pady=5)
+        self.password_entry = tk.Entry(self.frame, show="*")
         self.password_entry.pack(pady=5)
+        self.password_entry.bind("<Return>", lambda event: self.check_login())
 
-        tk.Button(root, text=t("login"), command=self.check_login).pack(pady=10)
-
-        # Hard-coded credentials for simplicity
-        self.credentials = {"admin": "admin", "cashier": "1234"}
+        localizer.text(tk.Button(self.frame, command=self.check_login), "login").pack(pady=10)
+        self.username_entry.focus_set()
 
     def check_login(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
-        if username in self.credentials and self.credentials[username] == password:
-            self.root.destroy()
-            main_app = tk.Tk()
-            POSApp(main_app)
-            main_app.mainloop()
-        else:
-            messagebox.showerror(t("login_title"), t("invalid_credentials"))
+        try:
+            session = users.auth.login(username, password)
+        except LoginThrottled as e:
+            messagebox.showerror(t("login_title"), t("login_throttled", seconds=int(e.retry_after) + 1),
+                                 parent=self.root)
+            return
+        except AuthError:
+            self.password_entry.delete(0, tk.END)
+            messagebox.showerror(t("login_title"), t("invalid_credentials"), parent=self.root)
+            return
+        self.on_login(session)
+
+    def open_app(self, session, on_ready=None):
+        # on_ready(root) runs once the main window has been drawn
+        self.frame.destroy()
+        self.root.geometry("")
+        POSApp(self.root, session)
+        if on_ready:
+            self.root.after_idle(on_ready, self.root)
 
 
 # ---------------------- Main POS Application ----------------------
+# POSApp callbacks timed when instrumentation is on; Tk binds commands when
+# the window is built, so enable_instrumentation() must run before POSApp.
+UI_CALLBACKS = ("save_product", "update_product", "delete_product", "import_products", "load_inventory",
+                "refresh_inventory_rows", "receive_stock", "show_stock_history", "show_reorder_list", "sell_product",
+                "add_to_basket", "update_suggestions", "checkout", "reprint_receipt", "load_sales", "generate_report",
+                "show_sales_chart", "show_analytics", "show_inventory_chart", "backup_db", "restore_db", "export_csv",
+                "update_dashboard", "switch_user")
+
+
 class POSApp:
-    def __init__(self, root):
+    def __init__(self, root, session):
         self.root = root
-        self.root.title(t("title"))
+        self.session = session
+        localizer.title(self.root, "window_title", username=session.username)
 
         # Dashboard at the top
         self.dashboard_label = tk.Label(root, text="", font=("Arial", 12), fg="blue")
@@ -310,12 +435,21 @@ class POSApp:
         # Menu for language selection and help
         self.menu_bar = tk.Menu(root)
         language_menu = tk.Menu(self.menu_bar, tearoff=0)
-        language_menu.add_command(label="English", command=lambda: self.set_language("en"))
-        language_menu.add_command(label="Swahili", command=lambda: self.set_language("sw"))
-        self.menu_bar.add_cascade(label=t("choose_language"), menu=language_menu)
+        # Every catalog in poslite/locales, each under its own language name
+        for locale, language_name in i18n.available_locales().items():
+            language_menu.add_command(label=language_name, command=lambda locale=locale: self.set_language(locale))
+        self.menu_bar.add_cascade(menu=language_menu)
+        localizer.menu(self.menu_bar, 0, "choose_language")
         help_menu = tk.Menu(self.menu_bar, tearoff=0)
-        help_menu.add_command(label=t("help"), command=self.show_help)
-        self.menu_bar.add_cascade(label=t("help"), menu=help_menu)
+        help_menu.add_command(command=self.show_help)
+        localizer.menu(help_menu, 0, "help")
+        self.menu_bar.add_cascade(menu=help_menu)
+        localizer.menu(self.menu_bar, 1, "help")
+        self.menu_bar.add_command(command=self.switch_user)
+        localizer.menu(self.menu_bar, 2, "switch_user")
+        if metrics.instrumentation.enabled:
+            self.menu_bar.add_command(command=self.show_metrics)
+            localizer.menu(self.menu_bar, 3, "metrics")
         root.config(menu=self.menu_bar)
 
         # Main frame with notebook
@@ -328,79 +462,220 @@ class POSApp:
         self.sales_tab = ttk.Frame(self.notebook)
         self.report_tab = ttk.Frame(self.notebook)
 
-        self.notebook.add(self.inventory_tab, text=t("inventory_tab"))
-        self.notebook.add(self.sales_tab, text=t("sales_tab"))
-        self.notebook.add(self.report_tab, text=t("reports_tab"))
+        for tab, key in ((self.inventory_tab, "inventory_tab"), (self.sales_tab, "sales_tab"),
+                         (self.report_tab, "reports_tab")):
+            self.notebook.add(tab)
+            localizer.tab(self.notebook, tab, key)
+
+        # Status bar for background tasks
+        self.tasks = TaskRunner(root)
+        self.status_frame = ttk.Frame(root)
+        self.status_frame.pack(fill=tk.X, side=tk.BOTTOM)
+        self.status_label = ttk.Label(self.status_frame, text="")
+        self.status_label.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = localizer.text(ttk.Button(self.status_frame, command=self.tasks.cancel_all,
+                                                       state="disabled"), "cancel")
+        self.cancel_button.pack(side=tk.RIGHT, padx=5)
+        self.progress_bar = ttk.Progressbar(self.status_frame, length=150, mode="determinate")
+        self.progress_bar.pack(side=tk.RIGHT, padx=5)
+        root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         self.setup_inventory_tab()
         self.setup_sales_tab()
         self.setup_report_tab()
+        self.apply_role()
+
+        # Receipts of this till's sales are printed through a spool once the
+        # sale is in the store, since the receipt number comes from there
+        self.print_spool = None
+        self.print_events = queue.Queue()
+        self.unprinted = set()  # journal uuids of sales still to print
+        if receipts.PRINTER is not None:
+            self.print_spool = receipts.PrintSpool(receipts.PRINTER,
+                                                   on_error=lambda *event: self.print_events.put(event))
+            self.print_spool.start()
+
+        # Sales are journaled locally and replayed into the store
+        self.journal_events = queue.Queue()
+        self.journal = journal.SaleJournal(
+            on_applied=lambda applied, failed: self.journal_events.put((applied, failed)))
+        self.journal.start()
+        self.poll_journal()
+
+    def on_close(self):
+        self.tasks.shutdown()
+        self.journal.stop()
+        if self.print_spool is not None:
+            self.print_spool.stop()
+        metrics.instrumentation.flush()
+        self.root.destroy()
+
+    def switch_user(self):
+        # Logs in over the running window; a cashier with a live session is
+        # checked without re-deriving the password hash.
+        dialog = tk.Toplevel(self.root)
+        dialog.transient(self.root)
+
+        def logged_in(session):
+            dialog.destroy()
+            self.session = session
+            localizer.title(self.root, "window_title", username=session.username)
+            self.cart.clear()
+            self.refresh_basket()
+            self.apply_role()
+
+        LoginApp(dialog, on_login=logged_in)
+        dialog.grab_set()
+
+    def apply_role(self):
+        # Inventory edits, imports and restores are for admins only
+        state = ["!disabled"] if self.session.is_admin else ["disabled"]
+        for button in (self.save_button, self.update_button, self.delete_button, self.import_button,
+                       self.receive_button, self.restore_button):
+            button.state(state)
+        # Files and backups live on the server when running against one
+        if service.remote_store is not None:
+            for button in (self.import_button, self.backup_button, self.restore_button, self.export_button):
+                button.state(["disabled"])
+
+    def require_admin(self):
+        if self.session.is_admin:
+            return True
+        messagebox.showerror(t("title"), t("admin_only"))
+        return False
 
-    def set_language(self, lang):
-        global current_lang
-        current_lang = lang
-        # Update menu labels and notebook tabs
-        self.menu_bar.entryconfig(0, label=t("choose_language"))
-        self.menu_bar.entryconfig(1, label=t("help"))
-        self.notebook.tab(0, text=t("inventory_tab"))
-        self.notebook.tab(1, text=t("sales_tab"))
-        self.notebook.tab(2, text=t("reports_tab"))
-        self.update_dashboard()
+    def run_task(self, name, fn, on_done, button=None):
+        # Dispatch fn(task) to a worker; on_done(result) runs on the Tk thread.
+        def finish():
+            if button is not None:
+                button.state(["!disabled"])
+                self.apply_role()
+            if not self.tasks.active:
+                self.progress_bar.stop()
+                self.progress_bar.config(mode="determinate", value=0)
+                self.cancel_button.state(["disabled"])
+
+        def done(result):
+            finish()
+            self.status_label.config(text="")
+            on_done(result)
+
+        def error(exc):
+            finish()
+            if isinstance(exc, TaskCancelled):
+                self.status_label.config(text=t("task_cancelled", task=name))
+            else:
+                self.status_label.config(text="")
+                messagebox.showerror(t("title"), f"{name}: {exc}")
+
+        def progress(done_count, total):
+            if total:
+                self.progress_bar.stop()
+                self.progress_bar.config(mode="determinate", value=100.0 * done_count / total)
+
+        if button is not None:
+            button.state(["disabled"])
+        self.status_label.config(text=t("working", task=name))
+        self.cancel_button.state(["!disabled"])
+        self.progress_bar.config(mode="indeterminate")
+        self.progress_bar.start(20)
+        return self.tasks.submit(name, fn, on_done=done, on_error=error, on_progress=progress)
+
+    def set_language(self, locale):
+        i18n.set_locale(locale)
+        localizer.relabel()
 
     def show_help(self):
         messagebox.showinfo(t("help"), t("help_text"))
 
+    def show_metrics(self):
+        # Debug panel over the instrumentation snapshot, refreshed while open
+        window = tk.Toplevel(self.root)
+        localizer.title(window, "metrics")
+        columns = ("name", "calls", "errors", "rows", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")
+        tree = ttk.Treeview(window, columns=columns, show="headings", height=20)
+        for column in columns:
+            localizer.heading(tree, column, "metric_" + column)
+            tree.column(column, width=420 if column == "name" else 70, anchor=tk.W if column == "name" else tk.E)
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        def refresh():
+            if not window.winfo_exists():
+                return
+            tree.delete(*tree.get_children())
+            for name, summary in metrics.instrumentation.snapshot().items():
+                tree.insert("", tk.END, values=[name] + [summary[column] if column in ("calls", "errors", "rows")
+                                                         else f"{summary[column]:.2f}" for column in columns[1:]])
+            window.after(2000, refresh)
+
+        def reset():
+            metrics.instrumentation.reset()
+            tree.delete(*tree.get_children())
+
+        buttons = ttk.Frame(window)
+        buttons.pack(fill=tk.X)
+        localizer.text(ttk.Button(buttons, command=reset), "metrics_reset").pack(side=tk.LEFT, padx=5, pady=5)
+        localizer.text(ttk.Button(buttons, command=metrics.instrumentation.flush),
+                       "metrics_flush").pack(side=tk.LEFT, padx=5, pady=5)
+        refresh()
+
     def update_dashboard(self):
-        inventory = db_fetch_inventory()
-        total_products = len(inventory)
-        low_stock = sum(1 for item in inventory if item[2] < item[4])
-        # Today's sales
-        today = date.today().strftime("%Y-%m-%d")
-        connection = sqlite3.connect("pos_lite.db")
-        cursor = connection.cursor()
-        cursor.execute("SELECT SUM(total) FROM sales WHERE DATE(sale_date)=?", (today,))
-        result = cursor.fetchone()
-        connection.close()
-        today_sales = result[0] if result[0] is not None else 0.0
-        dashboard_text = t("dashboard", total_products=total_products, low_stock=low_stock, today_sales=today_sales)
-        self.dashboard_label.config(text=dashboard_text)
+        localizer.text(self.dashboard_label, "dashboard", **store.db_fetch_dashboard_stats())
 
     # ---------------------- Inventory Tab ----------------------
     def setup_inventory_tab(self):
-        ttk.Label(self.inventory_tab, text=t("product_name")).grid(row=0, column=0, padx=5, pady=5)
+        localizer.text(ttk.Label(self.inventory_tab), "product_name").grid(row=0, column=0, padx=5, pady=5)
         self.product_name_entry = ttk.Entry(self.inventory_tab)
         self.product_name_entry.grid(row=0, column=1, padx=5, pady=5)
 
-        ttk.Label(self.inventory_tab, text=t("quantity")).grid(row=1, column=0, padx=5, pady=5)
+        localizer.text(ttk.Label(self.inventory_tab), "quantity").grid(row=1, column=0, padx=5, pady=5)
         self.quantity_entry = ttk.Entry(self.inventory_tab)
         self.quantity_entry.grid(row=1, column=1, padx=5, pady=5)
 
-        ttk.Label(self.inventory_tab, text=t("price")).grid(row=2, column=0, padx=5, pady=5)
+        localizer.text(ttk.Label(self.inventory_tab), "price").grid(row=2, column=0, padx=5, pady=5)
         self.price_entry = ttk.Entry(self.inventory_tab)
         self.price_entry.grid(row=2, column=1, padx=5, pady=5)
 
-        ttk.Label(self.inventory_tab, text=t("threshold")).grid(row=3, column=0, padx=5, pady=5)
+        localizer.text(ttk.Label(self.inventory_tab), "threshold").grid(row=3, column=0, padx=5, pady=5)
         self.threshold_entry = ttk.Entry(self.inventory_tab)
         self.threshold_entry.grid(row=3, column=1, padx=5, pady=5)
 
-        self.save_button = ttk.Button(self.inventory_tab, text=t("save_product"), command=self.save_product)
+        self.save_button = localizer.text(ttk.Button(self.inventory_tab, command=self.save_product), "save_product")
         self.save_button.grid(row=4, column=0, columnspan=2, pady=5)
 
-        self.update_button = ttk.Button(self.inventory_tab, text=t("update_product"), command=self.update_product)
+        self.update_button = localizer.text(ttk.Button(self.inventory_tab, command=self.update_product),
+                                            "update_product")
         self.update_button.grid(row=5, column=0, columnspan=2, pady=5)
 
-        self.delete_button = ttk.Button(self.inventory_tab, text=t("delete_product"), command=self.delete_product)
+        self.delete_button = localizer.text(ttk.Button(self.inventory_tab, command=self.delete_product),
+                                            "delete_product")
         self.delete_button.grid(row=6, column=0, columnspan=2, pady=5)
 
         self.inventory_tree = ttk.Treeview(self.inventory_tab, columns=("ID", "Name", "Quantity", "Price", "Threshold"),
                                            show="headings")
-        self.inventory_tree.heading("ID", text="ID")
-        self.inventory_tree.heading("Name", text=t("product_name"))
-        self.inventory_tree.heading("Quantity", text=t("quantity"))
-        self.inventory_tree.heading("Price", text=t("price"))
-        self.inventory_tree.heading("Threshold", text=t("threshold"))
+        localizer.heading(self.inventory_tree, "ID", "id")
+        localizer.heading(self.inventory_tree, "Name", "product_name")
+        localizer.heading(self.inventory_tree, "Quantity", "quantity")
+        localizer.heading(self.inventory_tree, "Price", "price")
+        localizer.heading(self.inventory_tree, "Threshold", "threshold")
         self.inventory_tree.grid(row=7, column=0, columnspan=2, pady=5)
         self.inventory_tree.bind("<<TreeviewSelect>>", self.on_inventory_select)
+        inventory_scrollbar = ttk.Scrollbar(self.inventory_tab, orient=tk.VERTICAL)
+        inventory_scrollbar.grid(row=7, column=2, sticky="ns", pady=5)
+        self.inventory_view = VirtualTreeview(self.inventory_tree, inventory_scrollbar,
+                                              store.db_fetch_inventory_page, key_of=lambda row: row.id)
+
+        self.import_button = localizer.text(ttk.Button(self.inventory_tab, command=self.import_products), "import_csv")
+        self.import_button.grid(row=8, column=0, columnspan=2, pady=5)
+
+        stock_frame = ttk.Frame(self.inventory_tab)
+        stock_frame.grid(row=9, column=0, columnspan=2, pady=5)
+        self.receive_button = localizer.text(ttk.Button(stock_frame, command=self.receive_stock), "receive_stock")
+        self.receive_button.pack(side=tk.LEFT, padx=5)
+        self.history_button = localizer.text(ttk.Button(stock_frame, command=self.show_stock_history), "stock_history")
+        self.history_button.pack(side=tk.LEFT, padx=5)
+        self.reorder_button = localizer.text(ttk.Button(stock_frame, command=self.show_reorder_list), "reorder_list")
+        self.reorder_button.pack(side=tk.LEFT, padx=5)
 
         self.load_inventory()
 
@@ -418,19 +693,23 @@ class POSApp:
             self.threshold_entry.insert(0, values[4])
 
     def save_product(self):
+        if not self.require_admin():
+            return
         try:
             name = self.product_name_entry.get()
             quantity = int(self.quantity_entry.get())
             price = float(self.price_entry.get())
             threshold = int(self.threshold_entry.get())
-            db_save_product(name, quantity, price, threshold)
-            messagebox.showinfo(t("title"), t("save_product") + " successful!")
-            self.load_inventory()
+            product_id = store.db_save_product(name, quantity, price, threshold)
+            messagebox.showinfo(t("title"), t("product_saved"))
+            self.refresh_inventory_rows([product_id])
             self.update_dashboard()
         except Exception as e:
-            messagebox.showerror(t("title"), f"Error saving product: {e}")
+            messagebox.showerror(t("title"), t("save_error", error=e))
 
     def update_product(self):
+        if not self.require_admin():
+            return
         selected = self.inventory_tree.selection()
         if selected:
             item_id = self.inventory_tree.item(selected[0], "values")[0]
@@ -439,227 +718,836 @@ class POSApp:
                 quantity = int(self.quantity_entry.get())
                 price = float(self.price_entry.get())
                 threshold = int(self.threshold_entry.get())
-                db_update_product(item_id, name, quantity, price, threshold)
-                messagebox.showinfo(t("title"), t("update_product") + " successful!")
-                self.load_inventory()
+                store.db_update_product(item_id, name, quantity, price, threshold)
+                messagebox.showinfo(t("title"), t("product_updated"))
+                self.refresh_inventory_rows([int(item_id)])
                 self.update_dashboard()
             except Exception as e:
-                messagebox.showerror(t("title"), f"Error updating product: {e}")
+                messagebox.showerror(t("title"), t("update_error", error=e))
         else:
             messagebox.showerror(t("title"), t("select_product"))
 
     def delete_product(self):
+        if not self.require_admin():
+            return
         selected = self.inventory_tree.selection()
         if selected:
             item_id = self.inventory_tree.item(selected[0], "values")[0]
             try:
-                db_delete_product(item_id)
-                messagebox.showinfo(t("title"), t("delete_product") + " successful!")
-                self.load_inventory()
+                store.db_delete_product(item_id)
+                messagebox.showinfo(t("title"), t("product_deleted"))
+                self.inventory_view.remove_row(item_id)
                 self.update_dashboard()
             except Exception as e:
-                messagebox.showerror(t("title"), f"Error deleting product: {e}")
+                messagebox.showerror(t("title"), t("delete_error", error=e))
         else:
             messagebox.showerror(t("title"), t("select_product"))
 
+    def import_products(self):
+        if not self.require_admin():
+            return
+        filename = filedialog.askopenfilename(parent=self.root, title=t("import_csv"),
+                                              filetypes=[("CSV", "*.csv *.csv.gz"), ("All files", "*")])
+        if not filename:
+            return
+
+        def done(report):
+            message = t("import_success", inserted=report["inserted"], updated=report["updated"],
+                        rejected=len(report["rejected"]))
+            for line, reason in report["rejected"][:10]:
+                message += "\n  " + t("import_rejected_line", line=line, reason=reason)
+            messagebox.showinfo(t("title"), message)
+            self.load_inventory()
+            self.update_dashboard()
+
+        self.run_task(t("import_csv"), lambda task: csvio.import_products_from_csv(filename, progress=task.progress),
+                      done, button=self.import_button)
+
+    def selected_product_id(self):
+        selected = self.inventory_tree.selection()
+        if not selected:
+            messagebox.showerror(t("title"), t("select_product"))
+            return None
+        return int(self.inventory_tree.item(selected[0], "values")[0])
+
+    def receive_stock(self):
+        if not self.require_admin():
+            return
+        product_id = self.selected_product_id()
+        if product_id is None:
+            return
+        quantity = simpledialog.askinteger(t("receive_stock"), t("receive_quantity"), minvalue=1, parent=self.root)
+        if quantity is None:
+            return
+        try:
+            store.db_receive_stock(product_id, quantity)
+        except Exception as e:
+            messagebox.showerror(t("title"), t("error", error=e))
+            return
+        self.refresh_inventory_rows([product_id])
+        self.update_dashboard()
+
+    def show_stock_history(self):
+        # The product's movements, newest first, under its reconciliation
+        product_id = self.selected_product_id()
+        if product_id is None:
+            return
+        check = store.db_reconcile_stock(product_id)
+        if check is None:
+            return
+        window = tk.Toplevel(self.root)
+        localizer.title(window, "stock_history_title", product_id=product_id)
+        if check.difference:
+            text = t("stock_difference", on_hand=check.on_hand, balance=check.ledger_balance or 0,
+                     difference=check.difference)
+        else:
+            text = t("stock_reconciled", balance=check.on_hand)
+        ttk.Label(window, text=text, foreground="red" if check.difference else "").pack(padx=5, pady=5)
+        columns = ("Date", "Kind", "Quantity", "Balance", "Reference", "Note")
+        tree = ttk.Treeview(window, columns=columns, show="headings", height=20)
+        for column, key in zip(columns, ("date", "movement_kind", "quantity", "balance", "reference", "note")):
+            localizer.heading(tree, column, key)
+            tree.column(column, width=150 if column in ("Date", "Note") else 90)
+        tree.pack(fill=tk.BOTH, expand=True)
+        for movement in store.db_fetch_stock_movements(product_id, limit=500):
+            tree.insert("", tk.END, values=(movement.moved_at, movement.kind, f"{movement.quantity:+d}",
+                                            movement.balance, movement.reference or "", movement.note or ""))
+
+    def show_reorder_list(self):
+        def done(rows):
+            if not rows:
+                messagebox.showinfo(t("title"), t("reorder_none"))
+                return
+            window = tk.Toplevel(self.root)
+            localizer.title(window, "reorder_list")
+            columns = ("ID", "Name", "Quantity", "Threshold", "Per day", "Days left", "Order")
+            tree = ttk.Treeview(window, columns=columns, show="headings", height=20)
+            for column, key in zip(columns, ("id", "product_name", "quantity", "threshold", "per_day", "days_left",
+                                             "order_quantity")):
+                localizer.heading(tree, column, key)
+                tree.column(column, width=200 if column == "Name" else 80, anchor=tk.W if column == "Name" else tk.E)
+            tree.pack(fill=tk.BOTH, expand=True)
+            for row in rows:
+                tree.insert("", tk.END, values=(row.id, row.product_name, row.quantity, row.threshold,
+                                                f"{row.daily_units:.1f}",
+                                                "-" if row.days_left is None else f"{row.days_left:.0f}",
+                                                row.order_quantity))
+
+        self.run_task(t("reorder_list"), lambda task: store.db_fetch_reorder_suggestions(), done,
+                      button=self.reorder_button)
+
     def load_inventory(self):
-        for row in self.inventory_tree.get_children():
-            self.inventory_tree.delete(row)
-        for item in db_fetch_inventory():
-            self.inventory_tree.insert("", tk.END, values=item)
+        self.inventory_view.reset()
+
+    def refresh_inventory_rows(self, product_ids):
+        for product_id in product_ids:
+            product = store.db_fetch_product(product_id)
+            if product is None:
+                self.inventory_view.remove_row(product_id)
+            else:
+                self.inventory_view.update_row(product)
 
     # ---------------------- Sales Tab ----------------------
     def setup_sales_tab(self):
-        ttk.Label(self.sales_tab, text=t("product_id")).grid(row=0, column=0, padx=5, pady=5)
+        # Takes a product id, a scanned barcode or SKU, or the start of a name;
+        # matches show alongside as you type. A scanner's Enter goes straight
+        # into the basket.
+        localizer.text(ttk.Label(self.sales_tab), "product_search").grid(row=0, column=0, padx=5, pady=5)
         self.product_id_entry = ttk.Entry(self.sales_tab)
         self.product_id_entry.grid(row=0, column=1, padx=5, pady=5)
-
-        ttk.Label(self.sales_tab, text=t("sale_quantity")).grid(row=1, column=0, padx=5, pady=5)
+        self.product_id_entry.bind("<KeyRelease>", self.schedule_suggestions)
+        self.product_id_entry.bind("<Return>", self.scan_product)
+        self.product_id_entry.bind("<Down>", lambda event: self.suggestion_list.focus_set())
+        self.suggestions = []
+        self.suggestion_job = None
+        self.suggestion_list = tk.Listbox(self.sales_tab, height=6, width=45)
+        self.suggestion_list.grid(row=0, column=2, rowspan=4, padx=5, pady=5, sticky="nsew")
+        self.suggestion_list.bind("<Double-Button-1>", self.pick_suggestion)
+        self.suggestion_list.bind("<Return>", self.pick_suggestion)
+
+        localizer.text(ttk.Label(self.sales_tab), "sale_quantity").grid(row=1, column=0, padx=5, pady=5)
         self.sale_quantity_entry = ttk.Entry(self.sales_tab)
         self.sale_quantity_entry.grid(row=1, column=1, padx=5, pady=5)
+        self.sale_quantity_entry.insert(0, "1")
 
-        ttk.Label(self.sales_tab, text=t("payment_method")).grid(row=2, column=0, padx=5, pady=5)
+        localizer.text(ttk.Label(self.sales_tab), "payment_method").grid(row=2, column=0, padx=5, pady=5)
         self.payment_method_combobox = ttk.Combobox(self.sales_tab, values=["Cash", "Mobile Money", "Other"],
                                                     state="readonly")
         self.payment_method_combobox.grid(row=2, column=1, padx=5, pady=5)
         self.payment_method_combobox.current(0)
 
-        self.sell_button = ttk.Button(self.sales_tab, text=t("sell"), command=self.sell_product)
-        self.sell_button.grid(row=3, column=0, columnspan=2, pady=5)
+        button_frame = ttk.Frame(self.sales_tab)
+        button_frame.grid(row=3, column=0, columnspan=2, pady=5)
+        self.sell_button = localizer.text(ttk.Button(button_frame, command=self.sell_product), "sell")
+        self.sell_button.pack(side=tk.LEFT, padx=2)
+        self.add_to_basket_button = localizer.text(ttk.Button(button_frame, command=self.add_to_basket),
+                                                   "add_to_basket")
+        self.add_to_basket_button.pack(side=tk.LEFT, padx=2)
+        self.checkout_button = localizer.text(ttk.Button(button_frame, command=self.checkout), "checkout")
+        self.checkout_button.pack(side=tk.LEFT, padx=2)
+        self.clear_basket_button = localizer.text(ttk.Button(button_frame, command=self.clear_basket), "clear_basket")
+        self.clear_basket_button.pack(side=tk.LEFT, padx=2)
+        self.reprint_button = localizer.text(ttk.Button(button_frame, command=self.reprint_receipt), "reprint_receipt")
+        self.reprint_button.pack(side=tk.LEFT, padx=2)
+
+        self.cart = Cart()
+        self.basket_tree = ttk.Treeview(self.sales_tab, columns=("ID", "Name", "Quantity", "Price", "Total"),
+                                        show="headings", height=5)
+        localizer.heading(self.basket_tree, "ID", "product_id")
+        localizer.heading(self.basket_tree, "Name", "product_name")
+        localizer.heading(self.basket_tree, "Quantity", "quantity")
+        localizer.heading(self.basket_tree, "Price", "price")
+        localizer.heading(self.basket_tree, "Total", "total")
+        self.basket_tree.grid(row=4, column=0, columnspan=2, pady=5)
+        self.basket_tree.bind("<Delete>", self.remove_basket_line)
+        self.basket_total_label = ttk.Label(self.sales_tab, text="")
+        self.basket_total_label.grid(row=5, column=0, columnspan=2, pady=5)
+        self.refresh_basket()
 
         self.sales_tree = ttk.Treeview(self.sales_tab, columns=("ID", "Name", "Quantity", "Total", "Date", "Payment"),
                                        show="headings")
-        self.sales_tree.heading("ID", text="Sale ID")
-        self.sales_tree.heading("Name", text="Product Name")
-        self.sales_tree.heading("Quantity", text=t("sale_quantity"))
-        self.sales_tree.heading("Total", text="Total")
-        self.sales_tree.heading("Date", text="Date/Time")
-        self.sales_tree.heading("Payment", text=t("payment_method"))
-        self.sales_tree.grid(row=4, column=0, columnspan=2, pady=5)
+        localizer.heading(self.sales_tree, "ID", "sale_id")
+        localizer.heading(self.sales_tree, "Name", "product_name")
+        localizer.heading(self.sales_tree, "Quantity", "sale_quantity")
+        localizer.heading(self.sales_tree, "Total", "total")
+        localizer.heading(self.sales_tree, "Date", "date_time")
+        localizer.heading(self.sales_tree, "Payment", "payment_method")
+        self.sales_tree.grid(row=6, column=0, columnspan=2, pady=5)
 
-        self.refresh_sales_button = ttk.Button(self.sales_tab, text=t("refresh_sales"), command=self.load_sales)
-        self.refresh_sales_button.grid(row=5, column=0, columnspan=2, pady=5)
+        self.refresh_sales_button = localizer.text(ttk.Button(self.sales_tab, command=self.load_sales), "refresh_sales")
+        self.refresh_sales_button.grid(row=7, column=0, columnspan=2, pady=5)
 
         self.load_sales()
 
+    def find_product(self, text):
+        # A barcode or SKU first, so numeric barcodes are not read as ids,
+        # then a product id, then an exact name. All are index lookups.
+        text = text.strip()
+        if not text:
+            return None
+        product = store.db_fetch_product_by_code(text)
+        if product is None and text.isdigit():
+            product = store.db_fetch_product(int(text))
+        if product is None:
+            product = store.db_fetch_product_by_name(text)
+        return product
+
+    def schedule_suggestions(self, event=None):
+        # Waits for a pause in typing, so a scanner's burst of keystrokes
+        # costs one search rather than one per digit
+        if event is not None and event.keysym in ("Return", "Down", "Up"):
+            return
+        if self.suggestion_job is not None:
+            self.root.after_cancel(self.suggestion_job)
+        self.suggestion_job = self.root.after(120, self.update_suggestions)
+
+    def update_suggestions(self):
+        self.suggestion_job = None
+        try:
+            self.suggestions = store.db_search_products(self.product_id_entry.get(), limit=8)
+        except journal.TRANSIENT_ERRORS:
+            self.suggestions = []
+        self.suggestion_list.delete(0, tk.END)
+        for product in self.suggestions:
+            self.suggestion_list.insert(tk.END, f"{product.id}  {product.product_name}  "
+                                                f"${product.price:.2f}  ({product.quantity})")
+
+    def clear_suggestions(self):
+        if self.suggestion_job is not None:
+            self.root.after_cancel(self.suggestion_job)
+            self.suggestion_job = None
+        self.suggestions = []
+        self.suggestion_list.delete(0, tk.END)
+
+    def pick_suggestion(self, event=None):
+        selection = self.suggestion_list.curselection()
+        if not selection:
+            return
+        product = self.suggestions[selection[0]]
+        self.product_id_entry.delete(0, tk.END)
+        self.product_id_entry.insert(0, str(product.id))
+        self.clear_suggestions()
+        self.product_id_entry.focus_set()
+
+    def scan_product(self, event=None):
+        if self.add_to_basket():
+            self.product_id_entry.delete(0, tk.END)
+            self.clear_suggestions()
+
     def sell_product(self):
+        offline = False
+        text = self.product_id_entry.get().strip()
         try:
-            product_id = int(self.product_id_entry.get())
             quantity = int(self.sale_quantity_entry.get())
+            if quantity <= 0:
+                raise ValueError(t("quantity_not_positive"))
             payment_method = self.payment_method_combobox.get()
-            inventory = db_fetch_inventory()
-            for item in inventory:
-                if item[0] == product_id:
-                    if item[2] >= quantity:
-                        total = quantity * item[3]
-                        db_save_sale(product_id, quantity, total, payment_method)
-                        new_quantity = item[2] - quantity
-                        db_update_product(product_id, item[1], new_quantity, item[3], item[4])
-                        messagebox.showinfo(t("title"), t("sale_completed").replace("${total}", f"{total}"))
-                        self.load_inventory()
-                        self.load_sales()
-                        self.update_dashboard()
-                        return
-                    else:
-                        messagebox.showerror(t("title"), t("not_enough_inventory"))
-                        return
-            messagebox.showerror(t("title"), "Product not found!")
+            product = self.find_product(text)
+        except journal.TRANSIENT_ERRORS as e:
+            # The store is unreachable: journal the sale anyway, it is checked
+            # on replay. Only an id can be journaled without a lookup.
+            if not text.isdigit():
+                messagebox.showerror(t("title"), t("error", error=e))
+                return
+            offline = True
         except Exception as e:
-            messagebox.showerror(t("title"), f"Error: {e}")
+            messagebox.showerror(t("title"), t("error", error=e))
+            return
+        if offline:
+            if self.record_sale([(int(text), quantity)], payment_method):
+                messagebox.showinfo(t("title"), t("sale_recorded_offline"))
+        elif product is None:
+            messagebox.showerror(t("title"), t("product_not_found"))
+        elif product.quantity < quantity:
+            messagebox.showerror(t("title"), t("not_enough_inventory"))
+        elif self.record_sale([(product.id, quantity)], payment_method):
+            messagebox.showinfo(t("title"), t("sale_completed", total=f"{product.price * quantity:.2f}"))
+
+    def record_sale(self, lines, payment_method):
+        # Sales land in the journal first and the replayer applies them, so
+        # a locked or unreachable store does not hold up the till;
+        # poll_journal refreshes the views once they are in.
+        try:
+            entry_uuid = self.journal.record(lines, payment_method)
+        except Exception as e:
+            messagebox.showerror(t("title"), t("error", error=e))
+            return False
+        if self.print_spool is not None:
+            self.unprinted.add(entry_uuid)
+        return True
+
+    def poll_journal(self):
+        self.root.after(500, self.poll_journal)
+        product_ids, failures = set(), []
+        while True:
+            try:
+                applied, failed = self.journal_events.get_nowait()
+            except queue.Empty:
+                break
+            for entry_uuid, receipt_id, remaining in applied:
+                product_ids.update(remaining)
+                if entry_uuid in self.unprinted:
+                    self.unprinted.discard(entry_uuid)
+                    self.print_spool.submit(receipt_id)
+            for entry_uuid, error in failed:
+                self.unprinted.discard(entry_uuid)
+            failures.extend(failed)
+        if product_ids:
+            self.refresh_inventory_rows(product_ids)
+            self.load_sales()
+            self.update_dashboard()
+        if failures:
+            messagebox.showerror(t("title"), t("journal_failed", count=len(failures)) +
+                                 "".join(f"\n  {error}" for entry_uuid, error in failures[:10]))
+        self.poll_printer()
+
+    def poll_printer(self):
+        # Spool errors arrive from its worker; a printer that is only not
+        # ready (offline, out of paper) shows in the status bar while the
+        # spool retries, a receipt given up on gets a message box
+        while True:
+            try:
+                receipt_id, error, retrying = self.print_events.get_nowait()
+            except queue.Empty:
+                break
+            if retrying:
+                self.status_label.config(text=t("printer_waiting", number=receipt_id, error=error))
+            elif error is None:
+                # The printer is back
+                self.status_label.config(text="")
+            else:
+                self.status_label.config(text="")
+                messagebox.showerror(t("title"), t("print_failed", number=receipt_id, error=error))
+
+    def add_to_basket(self):
+        try:
+            quantity = int(self.sale_quantity_entry.get())
+            product = self.find_product(self.product_id_entry.get())
+            if product is None:
+                messagebox.showerror(t("title"), t("product_not_found"))
+                return False
+            if product.quantity < self.cart.quantity_of(product.id) + quantity:
+                messagebox.showerror(t("title"), t("not_enough_inventory"))
+                return False
+            self.cart.add(product.id, product.product_name, product.price, quantity)
+        except Exception as e:
+            messagebox.showerror(t("title"), t("error", error=e))
+            return False
+        self.refresh_basket()
+        return True
+
+    def remove_basket_line(self, event=None):
+        for row in self.basket_tree.selection():
+            self.cart.remove(int(row))
+        self.refresh_basket()
+
+    def clear_basket(self):
+        self.cart.clear()
+        self.refresh_basket()
+
+    def refresh_basket(self):
+        for row in self.basket_tree.get_children():
+            self.basket_tree.delete(row)
+        for product_id, (name, price, quantity) in self.cart.lines.items():
+            self.basket_tree.insert("", tk.END, iid=str(product_id),
+                                    values=(product_id, name, quantity, f"{price:.2f}", f"{price * quantity:.2f}"))
+        localizer.text(self.basket_total_label, "basket_total", items=self.cart.item_count(), total=self.cart.total())
+
+    def checkout(self):
+        if not self.cart:
+            messagebox.showerror(t("title"), t("basket_empty"))
+            return
+        total = self.cart.total()
+        if self.record_sale(self.cart.items(), self.payment_method_combobox.get()):
+            self.cart.clear()
+            self.refresh_basket()
+            messagebox.showinfo(t("title"), t("checkout_completed", total=total))
+
+    def reprint_receipt(self):
+        # Reprints are marked as copies and go through the spool like new
+        # receipts; without a printer the copy is saved to a PDF, HTML or
+        # text file instead
+        number = simpledialog.askinteger(t("reprint_receipt"), t("reprint_number"), minvalue=1, parent=self.root)
+        if number is None:
+            return
+        try:
+            receipt = store.db_fetch_receipt(number)
+        except Exception as e:
+            messagebox.showerror(t("title"), t("error", error=e))
+            return
+        if receipt is None:
+            messagebox.showerror(t("title"), t("receipt_not_found", number=number))
+            return
+        if self.print_spool is not None:
+            self.print_spool.submit(number, copy=True)
+            return
+        filename = filedialog.asksaveasfilename(parent=self.root, title=t("reprint_receipt"), defaultextension=".pdf",
+                                                initialfile=receipts.receipt_file_name(number, "pdf", copy=True),
+                                                filetypes=[("PDF", "*.pdf"), ("HTML", "*.html"), ("Text", "*.txt")])
+        if not filename:
+            return
+        try:
+            receipts.save_receipt(receipt, filename, copy=True)
+        except Exception as e:
+            messagebox.showerror(t("title"), t("error", error=e))
+            return
+        messagebox.showinfo(t("title"), t("receipt_saved", path=filename))
 
     def load_sales(self):
         for row in self.sales_tree.get_children():
             self.sales_tree.delete(row)
-        for sale in db_fetch_recent_sales(limit=10):
+        for sale in store.db_fetch_recent_sales(limit=10):
             self.sales_tree.insert("", tk.END, values=sale)
 
     # ---------------------- Reports Tab ----------------------
     def setup_report_tab(self):
-        ttk.Label(self.report_tab, text=t("start_date")).grid(row=0, column=0, padx=5, pady=5)
+        localizer.text(ttk.Label(self.report_tab), "start_date").grid(row=0, column=0, padx=5, pady=5)
         self.start_date_entry = ttk.Entry(self.report_tab)
         self.start_date_entry.grid(row=0, column=1, padx=5, pady=5)
 
-        ttk.Label(self.report_tab, text=t("end_date")).grid(row=1, column=0, padx=5, pady=5)
+        localizer.text(ttk.Label(self.report_tab), "end_date").grid(row=1, column=0, padx=5, pady=5)
         self.end_date_entry = ttk.Entry(self.report_tab)
         self.end_date_entry.grid(row=1, column=1, padx=5, pady=5)
 
-        self.report_button = ttk.Button(self.report_tab, text=t("generate_report"), command=self.generate_report)
+        self.report_button = localizer.text(ttk.Button(self.report_tab, command=self.generate_report),
+                                            "generate_report")
         self.report_button.grid(row=2, column=0, columnspan=2, pady=5)
 
         self.report_tree = ttk.Treeview(self.report_tab, columns=("ID", "Name", "Quantity", "Total", "Date"),
                                         show="headings")
-        self.report_tree.heading("ID", text="ID")
-        self.report_tree.heading("Name", text="Product Name")
-        self.report_tree.heading("Quantity", text=t("quantity"))
-        self.report_tree.heading("Total", text="Total")
-        self.report_tree.heading("Date", text="Date")
+        localizer.heading(self.report_tree, "ID", "id")
+        localizer.heading(self.report_tree, "Name", "product_name")
+        localizer.heading(self.report_tree, "Quantity", "quantity")
+        localizer.heading(self.report_tree, "Total", "total")
+        localizer.heading(self.report_tree, "Date", "date")
         self.report_tree.grid(row=3, column=0, columnspan=2, pady=5)
+        report_scrollbar = ttk.Scrollbar(self.report_tab, orient=tk.VERTICAL)
+        report_scrollbar.grid(row=3, column=2, sticky="ns", pady=5)
+        self.report_view = VirtualTreeview(self.report_tree, report_scrollbar, lambda after, limit, reverse: [],
+                                           key_of=lambda row: (row.sale_date, row.id))
 
         # Buttons for charts, backup/restore, export
-        self.sales_chart_button = ttk.Button(self.report_tab, text=t("sales_chart"), command=self.show_sales_chart)
+        self.sales_chart_button = localizer.text(ttk.Button(self.report_tab, command=self.show_sales_chart),
+                                                 "sales_chart")
         self.sales_chart_button.grid(row=4, column=0, columnspan=2, pady=5)
-        self.inventory_chart_button = ttk.Button(self.report_tab, text=t("inventory_chart"),
-                                                 command=self.show_inventory_chart)
-        self.inventory_chart_button.grid(row=5, column=0, columnspan=2, pady=5)
-        self.backup_button = ttk.Button(self.report_tab, text=t("backup"), command=self.backup_db)
-        self.backup_button.grid(row=6, column=0, columnspan=2, pady=5)
-        self.restore_button = ttk.Button(self.report_tab, text=t("restore"), command=self.restore_db)
-        self.restore_button.grid(row=7, column=0, columnspan=2, pady=5)
-        self.export_button = ttk.Button(self.report_tab, text=t("export_csv"), command=self.export_csv)
-        self.export_button.grid(row=8, column=0, columnspan=2, pady=5)
+        self.analytics_button = localizer.text(ttk.Button(self.report_tab, command=self.show_analytics), "analytics")
+        self.analytics_button.grid(row=5, column=0, columnspan=2, pady=5)
+        self.inventory_chart_button = localizer.text(ttk.Button(self.report_tab, command=self.show_inventory_chart),
+                                                     "inventory_chart")
+        self.inventory_chart_button.grid(row=6, column=0, columnspan=2, pady=5)
+        self.backup_button = localizer.text(ttk.Button(self.report_tab, command=self.backup_db), "backup")
+        self.backup_button.grid(row=7, column=0, columnspan=2, pady=5)
+        self.restore_button = localizer.text(ttk.Button(self.report_tab, command=self.restore_db), "restore")
+        self.restore_button.grid(row=8, column=0, columnspan=2, pady=5)
+        self.export_button = localizer.text(ttk.Button(self.report_tab, command=self.export_csv), "export_csv")
+        self.export_button.grid(row=9, column=0, columnspan=2, pady=5)
+        self.report_summary_label = ttk.Label(self.report_tab, text="")
+        self.report_summary_label.grid(row=10, column=0, columnspan=2, pady=5)
+        self.sales_chart = ChartWindow(self.root, "sales_chart_window", "date", "chart_total_sales", "blue")
+        self.inventory_chart = ChartWindow(self.root, "inventory_chart_window", "chart_product", "quantity", "green")
 
     def generate_report(self):
         start_date = self.start_date_entry.get()
         end_date = self.end_date_entry.get()
         try:
-            sales = db_fetch_sales_report(start_date, end_date)
-            for row in self.report_tree.get_children():
-                self.report_tree.delete(row)
-            for sale in sales:
-                self.report_tree.insert("", tk.END, values=sale)
+            store.day_range(start_date, end_date)
         except Exception as e:
-            messagebox.showerror(t("title"), f"Error generating report: {e}")
+            messagebox.showerror(t("title"), t("report_error", error=e))
+            return
+
+        def fetch_page(after, limit, reverse):
+            return store.db_fetch_sales_report_page(start_date, end_date, after, limit, reverse)
+
+        def work(task):
+            summary = store.db_fetch_sales_summary(start_date, end_date)
+            task.check()
+            return summary, fetch_page(None, self.report_view.page_size, False)
+
+        def done(result):
+            summary, first_page = result
+            self.report_view.reset(fetch_page, rows=first_page)
+            localizer.text(self.report_summary_label, "report_summary", **summary)
+
+        self.run_task(t("generate_report"), work, done, button=self.report_button)
 
     def show_sales_chart(self):
         start_date = self.start_date_entry.get()
         end_date = self.end_date_entry.get()
         if not start_date or not end_date:
-            messagebox.showerror(t("title"), "Please enter start and end dates.")
-            return
-        sales = db_fetch_sales_report(start_date, end_date)
-        if not sales:
-            messagebox.showinfo(t("title"), "No sales data found for this period.")
-            return
-        sales_by_date = {}
-        for sale in sales:
-            date_str = sale[4][:10]
-            total = sale[3]
-            sales_by_date[date_str] = sales_by_date.get(date_str, 0) + total
-        dates = sorted(sales_by_date.keys())
-        totals = [sales_by_date[d] for d in dates]
-        chart_window = tk.Toplevel(self.root)
-        chart_window.title("Sales Chart")
-        fig = plt.Figure(figsize=(8, 4))
-        ax = fig.add_subplot(111)
-        ax.bar(dates, totals, color="blue")
-        ax.set_xlabel("Date")
-        ax.set_ylabel("Total Sales ($)")
-        ax.set_title("Sales Over Time")
-        for label in ax.get_xticklabels():
-            label.set_rotation(45)
-        fig.tight_layout()
-        canvas = FigureCanvasTkAgg(fig, master=chart_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+            messagebox.showerror(t("title"), t("dates_required"))
+            return
+        self.run_task(t("sales_chart"), lambda task: store.db_fetch_sales_by_period(start_date, end_date),
+                      self.draw_sales_chart, button=self.sales_chart_button)
+
+    def draw_sales_chart(self, result):
+        bucket, rows = result
+        if not rows:
+            messagebox.showinfo(t("title"), t("analytics_no_sales"))
+            return
+        self.sales_chart.show([row.period for row in rows], [row.revenue for row in rows],
+                              title_key="sales_over_time_" + bucket)
+
+    def show_analytics(self):
+        start_date = self.start_date_entry.get()
+        end_date = self.end_date_entry.get()
+        if not start_date or not end_date:
+            messagebox.showerror(t("title"), t("dates_required"))
+            return
+        # Imported here so NumPy only loads when analytics are first opened
+        from poslite import analytics
+        self.run_task(t("analytics"), lambda task: analytics.analyze_sales(start_date, end_date),
+                      self.draw_analytics, button=self.analytics_button)
+
+    def draw_analytics(self, result):
+        if not result["totals"]["lines"]:
+            messagebox.showinfo(t("title"), t("analytics_no_sales"))
+            return
+        window = tk.Toplevel(self.root)
+        localizer.title(window, "analytics_title", start=result["start"], stop=result["stop"],
+                        ms=result["seconds"] * 1000)
+        notebook = ttk.Notebook(window)
+        notebook.pack(fill=tk.BOTH, expand=True)
+
+        # Totals against the equally long period before
+        summary = ttk.Frame(notebook)
+        notebook.add(summary)
+        localizer.tab(notebook, summary, "analytics_summary")
+        tree = ttk.Treeview(summary, columns=("figure", "value", "previous", "change"), show="headings", height=6)
+        for column in ("figure", "value", "previous", "change"):
+            localizer.heading(tree, column, column)
+            tree.column(column, width=150 if column == "figure" else 110, anchor=tk.W if column == "figure" else tk.E)
+        for key, value in result["totals"].items():
+            delta = result["deltas"][key]
+            number = "{:,.2f}" if isinstance(value, float) else "{:,}"
+            row = tree.insert("", tk.END, values=("", number.format(value), number.format(result["previous"][key]),
+                                                  "-" if delta is None else f"{delta:+.1%}"))
+            localizer.custom(tree, f"figure {key}", lambda text, row=row: tree.set(row, "figure", text),
+                             "figure_" + key)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        products = ttk.Frame(notebook)
+        notebook.add(products)
+        localizer.tab(notebook, products, "analytics_products")
+        tree = ttk.Treeview(products, columns=("ID", "Name", "Units", "Revenue"), show="headings", height=20)
+        for column, key in zip(("ID", "Name", "Units", "Revenue"), ("id", "product_name", "units", "revenue")):
+            localizer.heading(tree, column, key)
+            tree.column(column, width=220 if column == "Name" else 90, anchor=tk.W if column == "Name" else tk.E)
+        for product_id, name, revenue, units in result["by_product"]:
+            tree.insert("", tk.END, values=(product_id, name, f"{units:,}", f"{revenue:,.2f}"))
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        # Weekday x hour of day heatmap, darker cells taking more revenue
+        hours = ttk.Frame(notebook)
+        notebook.add(hours)
+        localizer.tab(notebook, hours, "analytics_hours")
+        cell, left, top = 26, 40, 20
+        canvas = tk.Canvas(hours, width=left + 24 * cell + 10, height=top + 7 * cell + 10, bg="white")
+        canvas.pack(padx=5, pady=5)
+        peak = max(max(row) for row in result["heatmap"]) or 1
+        for hour in range(24):
+            canvas.create_text(left + hour * cell + cell / 2, top / 2, text=str(hour))
+        for weekday, row in enumerate(result["heatmap"]):
+            label = canvas.create_text(left / 2, top + weekday * cell + cell / 2)
+            localizer.custom(canvas, f"weekday {weekday}",
+                             lambda text, label=label: canvas.itemconfigure(label, text=text), f"weekday_{weekday}")
+            for hour, revenue in enumerate(row):
+                shade = 255 - int(200 * revenue / peak)
+                canvas.create_rectangle(left + hour * cell, top + weekday * cell, left + (hour + 1) * cell,
+                                        top + (weekday + 1) * cell, fill=f"#{shade:02x}{shade:02x}ff", outline="#ddd")
+
+        payments = ttk.Frame(notebook)
+        notebook.add(payments)
+        localizer.tab(notebook, payments, "analytics_payments")
+        tree = ttk.Treeview(payments, columns=("Method", "Revenue", "Share"), show="headings", height=6)
+        for column, key in zip(("Method", "Revenue", "Share"), ("payment_method", "revenue", "share")):
+            localizer.heading(tree, column, key)
+            tree.column(column, width=160 if column == "Method" else 110, anchor=tk.W if column == "Method" else tk.E)
+        for method, revenue, share in result["by_payment"]:
+            tree.insert("", tk.END, values=(method, f"{revenue:,.2f}", f"{share:.1%}"))
+        tree.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
     def show_inventory_chart(self):
-        inventory = db_fetch_inventory()
-        if not inventory:
-            messagebox.showinfo(t("title"), "No inventory data found.")
-            return
-        product_names = [item[1] for item in inventory]
-        quantities = [item[2] for item in inventory]
-        chart_window = tk.Toplevel(self.root)
-        chart_window.title("Inventory Chart")
-        fig = plt.Figure(figsize=(8, 4))
-        ax = fig.add_subplot(111)
-        ax.bar(product_names, quantities, color="green")
-        ax.set_xlabel("Product")
-        ax.set_ylabel("Quantity")
-        ax.set_title("Current Inventory Levels")
-        for label in ax.get_xticklabels():
-            label.set_rotation(45)
-        fig.tight_layout()
-        canvas = FigureCanvasTkAgg(fig, master=chart_window)
-        canvas.draw()
-        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+        self.run_task(t("inventory_chart"), lambda task: store.db_fetch_inventory_levels(), self.draw_inventory_chart,
+                      button=self.inventory_chart_button)
+
+    def draw_inventory_chart(self, result):
+        rows, (other_count, other_quantity) = result
+        if not rows:
+            messagebox.showinfo(t("title"), t("no_inventory_data"))
+            return
+        labels = [row.product_name for row in rows]
+        quantities = [row.quantity for row in rows]
+        if other_count:
+            labels.append(t("chart_others", count=other_count))
+            quantities.append(other_quantity)
+        self.inventory_chart.show(labels, quantities, title_key="inventory_levels")
 
     def backup_db(self):
-        if backup_db():
-            messagebox.showinfo(t("title"), t("backup_success"))
-        else:
-            messagebox.showerror(t("title"), "Backup failed.")
+        def done(filename):
+            if filename:
+                messagebox.showinfo(t("title"), t("backup_saved", filename=filename))
+            else:
+                messagebox.showerror(t("title"), t("backup_failed"))
+
+        self.run_task(t("backup"), lambda task: backup.backup_db(progress=task.progress), done,
+                      button=self.backup_button)
 
     def restore_db(self):
-        if restore_db():
-            messagebox.showinfo(t("title"), t("restore_success"))
-            self.load_inventory()
-            self.load_sales()
-            self.update_dashboard()
-        else:
-            messagebox.showerror(t("title"), "Restore failed.")
+        if not self.require_admin():
+            return
+        # Restore swaps the database contents, so it stays on the Tk thread and
+        # first stops any background work that could be reading it: running
+        # tasks are cancelled and waited for, and the journal replayer holds.
+        latest = backup.find_backup()
+        if latest is None:
+            messagebox.showerror(t("title"), t("no_backup"))
+            return
+        latest_time = datetime.now() if latest == backup.LEGACY_BACKUP else backup.backup_time(latest)
+        restore_point = simpledialog.askstring(t("restore"), t("restore_point"),
+                                               initialvalue=latest_time.strftime("%Y-%m-%d %H:%M:%S"),
+                                               parent=self.root)
+        if restore_point is None:
+            return
+        try:
+            at = datetime.fromisoformat(restore_point.strip())
+        except ValueError as e:
+            messagebox.showerror(t("title"), t("error", error=e))
+            return
+        self.tasks.cancel_all(wait=True)
+        try:
+            with self.journal.paused():
+                restored = backup.restore_db(path=latest if latest == backup.LEGACY_BACKUP else None, at=at)
+        except backup.BackupError as e:
+            messagebox.showerror(t("title"), t("restore_failed", error=e))
+            return
+        if not restored:
+            messagebox.showerror(t("title"), t("no_backup"))
+            return
+        messagebox.showinfo(t("title"), t("restore_success"))
+        self.load_inventory()
+        self.load_sales()
+        self.update_dashboard()
 
     def export_csv(self):
-        if export_inventory_to_csv() and export_sales_to_csv():
-            messagebox.showinfo(t("title"), t("export_success"))
-        else:
-            messagebox.showerror(t("title"), "Export failed.")
+        # Sales follow the report date range when one is entered
+        start_date = self.start_date_entry.get() or None
+        end_date = self.end_date_entry.get() or None
+
+        def work(task):
+            inventory = csvio.export_inventory_to_csv()
+            task.check()
+            sales = csvio.export_sales_to_csv(start_date=start_date, end_date=end_date, progress=task.progress)
+            return inventory, sales
+
+        def done(result):
+            inventory, sales = result
+            messagebox.showinfo(t("title"), t("export_done", inventory=inventory["rows"], sales=sales["rows"],
+                                              rate=sales["rows_per_sec"]))
+
+        self.run_task(t("export_csv"), work, done, button=self.export_button)
 
 
 # ---------------------- Main ----------------------
 if __name__ == "__main__":
-    initialize_db()
-    # Start with the login window
-    login_root = tk.Tk()
-    LoginApp(login_root)
-    login_root.mainloop()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="POS Lite")
+    parser.add_argument("--db", default=store.DB_PATH, help="store database file (default: %(default)s)")
+    parser.add_argument("--server", metavar="URL", help="run the GUI against a POS Lite service, e.g. "
+                                                        "http://127.0.0.1:8765")
+    subparsers = parser.add_subparsers(dest="command")
+    serve_parser = subparsers.add_parser("serve", help="run the headless JSON API for several tills")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--max-batch", type=int, default=64, help="most writes grouped into one commit")
+    serve_parser.add_argument("--verbose", action="store_true", help="log every request")
+    import_parser = subparsers.add_parser("import-products", help="upsert products from a CSV file on their sku")
+    import_parser.add_argument("filename")
+    import_parser.add_argument("--replace-quantity", action="store_true",
+                               help="set stock to the file's quantity instead of adding it")
+    import_parser.add_argument("--batch-size", type=int, default=5000)
+    archive_parser = subparsers.add_parser("archive-sales", help="move sales of old months into yearly archive files")
+    archive_parser.add_argument("--keep-months", type=int, default=12,
+                                help="closed months to keep in the store (default: %(default)s)")
+    archive_parser.add_argument("--no-vacuum", action="store_true", help="do not compact the store afterwards")
+    reconcile_parser = subparsers.add_parser("reconcile-stock", help="list products whose stock differs from the "
+                                                                     "stock movement ledger")
+    reconcile_parser.add_argument("--fix", action="store_true",
+                                  help="take the stock on hand as right and book the differences as adjustments")
+    print_parser = subparsers.add_parser("print-receipt", help="print a receipt again, or save or show it")
+    print_parser.add_argument("number", type=int)
+    print_parser.add_argument("--output", metavar="FILE", help="save it as FILE (.pdf, .html, .txt or .bin) instead")
+    print_parser.add_argument("--copy", action="store_true", help="mark it as a copy")
+    branch_parser = subparsers.add_parser("add-branch", help="register a branch store for consolidated reports")
+    branch_parser.add_argument("name")
+    branch_parser.add_argument("path", help="the branch's database, or the copy of it head office receives")
+    sync_parser = subparsers.add_parser("sync-branches", help="merge the branches' new sales into the "
+                                                              "consolidation database")
+    sync_parser.add_argument("names", nargs="*", help="branches to sync (default: all)")
+    branch_report_parser = subparsers.add_parser("branch-report", help="sales per branch from the consolidation "
+                                                                       "database")
+    branch_report_parser.add_argument("start_date")
+    branch_report_parser.add_argument("end_date", nargs="?")
+    branch_report_parser.add_argument("--sales", action="store_true", help="list every sale, not just the totals")
+    for consolidation_parser in (branch_parser, sync_parser, branch_report_parser):
+        consolidation_parser.add_argument("--consolidated", metavar="FILE", default=consolidation.CONSOLIDATION_PATH,
+                                          help="consolidation database (default: %(default)s)")
+    user_parser = subparsers.add_parser("set-user", help="create a user or change their password and role")
+    user_parser.add_argument("username")
+    user_parser.add_argument("--role", choices=users.ROLES, default="cashier")
+    parser.add_argument("--printer", metavar="TARGET", help="print receipts to a device (/dev/usb/lp0), a file or a "
+                                                            "directory, or a network printer (tcp://host:9100)")
+    parser.add_argument("--receipt-format", choices=receipts.RECEIPT_FORMATS, default="escpos",
+                        help="what a device, file or directory printer is sent (default: %(default)s)")
+    parser.add_argument("--metrics", metavar="FILE", help="record timings and write them to FILE periodically")
+    parser.add_argument("--metrics-interval", type=float, default=30.0, help="seconds between metrics flushes")
+    parser.add_argument("--slow-ms", type=float, default=100.0, help="log calls and statements slower than this")
+    parser.add_argument("--slow-log", metavar="FILE", help="slow call log (default: next to --metrics)")
+    # Used by benchmarks/bench_startup.py: append when the login window and
+    # then the main window are up to FILE, and exit.
+    parser.add_argument("--startup-timing", metavar="FILE", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.db != store.DB_PATH:
+        store.open_store(args.db)
+        journal.JOURNAL_PATH = os.path.splitext(args.db)[0] + "_journal.db"
+        backup.BACKUP_DIR = os.path.splitext(args.db)[0] + "_backups"
+        backup.LEGACY_BACKUP = os.path.splitext(args.db)[0] + "_backup.db"
+    if args.printer:
+        receipts.PRINTER = receipts.make_printer(args.printer, args.receipt_format)
+    if args.server:
+        service.use_remote_store(args.server)
+    else:
+        store.initialize_db()
+    if args.metrics:
+        metrics.enable_instrumentation(args.metrics, args.metrics_interval, args.slow_ms,
+                                       args.slow_log or os.path.splitext(args.metrics)[0] + "_slow.log",
+                                       ui_class=POSApp, ui_callbacks=UI_CALLBACKS)
+    if args.command == "serve":
+        server = service.make_server(args.host, args.port, args.max_batch, args.verbose)
+        print(f"POS Lite service on http://{args.host}:{server.server_address[1]} ({store.DB_PATH})")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            server.writer.stop()
+            metrics.instrumentation.flush()
+    elif args.command == "import-products":
+        report = csvio.import_products_from_csv(args.filename, args.replace_quantity, args.batch_size)
+        print(f"{report['inserted']} inserted, {report['updated']} updated, {len(report['rejected'])} rejected "
+              f"in {report['seconds']:.2f}s ({report['rows_per_sec']:.0f} rows/s)")
+        for line, reason in report["rejected"]:
+            print(f"  line {line}: {reason}")
+    elif args.command == "archive-sales":
+        report = archive.archive_sales(args.keep_months, vacuum=not args.no_vacuum)
+        print(f"{report['sales']} sales and {report['receipts']} receipts before {report['cutoff']} archived "
+              f"to {store.archive_dir()} in {report['seconds']:.2f}s; store {report['size_before'] / 1e6:.1f} MB -> "
+              f"{report['size_after'] / 1e6:.1f} MB")
+    elif args.command == "reconcile-stock":
+        rows = store.db_reconcile_inventory(fix=args.fix)
+        for row in rows:
+            print(f"  product {row.product_id}: on hand {row.on_hand}, ledger {row.ledger_balance}, "
+                  f"difference {row.difference:+d}")
+        print(f"{len(rows)} product(s) differ from the ledger" + (" (adjusted)" if args.fix and rows else ""))
+    elif args.command == "print-receipt":
+        receipt = store.db_fetch_receipt(args.number)
+        if receipt is None:
+            parser.error(f"there is no receipt number {args.number}")
+        if args.output:
+            print(f"Saved receipt {args.number} as {receipts.save_receipt(receipt, args.output, args.copy)} "
+                  f"to {args.output}")
+        elif receipts.PRINTER is not None:
+            receipts.PrintSpool(receipts.PRINTER).print_receipt(args.number, args.copy)
+            print(f"Printed receipt {args.number} to {args.printer}")
+        else:
+            print(receipts.render_receipt(receipt, "text", args.copy), end="")
+    elif args.command in ("add-branch", "sync-branches", "branch-report"):
+        consolidated = consolidation.Consolidation(args.consolidated)
+        if args.command == "add-branch":
+            consolidated.add_branch(args.name, args.path)
+            print(f"Branch {args.name}: {os.path.abspath(args.path)}")
+        elif args.command == "sync-branches":
+            for name in args.names or [branch.name for branch in consolidated.branches()]:
+                report = consolidated.sync_branch(name)
+                print(f"{name}: {report['sales']} new sales, {report['archived_sales']} from archives, up to sale "
+                      f"{report['last_sale_id']} in {report['seconds']:.2f}s")
+                if report["missing_archives"]:
+                    print(f"  archives not found next to {name}: {', '.join(report['missing_archives'])}")
+                if report["rewound"]:
+                    print(f"  warning: {name} hands out sale ids below {report['last_sale_id']} again; it may have "
+                          f"been restored from an older backup")
+        else:
+            if args.sales:
+                for sale in consolidated.sales_report(args.start_date, args.end_date):
+                    print(f"  {sale.sale_date}  {sale.branch:<16} {sale.product_name:<30} {sale.quantity:>5} "
+                          f"{sale.total:>10.2f}  {sale.payment_method or ''}")
+            totals = consolidated.sales_summary(args.start_date, args.end_date)
+            for row in totals:
+                print(f"{row.branch:<20} {row.sale_count:>8} sales {row.units:>9} units {row.revenue:>14,.2f}")
+            print(f"{'All branches':<20} {sum(row.sale_count for row in totals):>8} sales "
+                  f"{sum(row.units for row in totals):>9} units {sum(row.revenue for row in totals):>14,.2f}")
+    elif args.command == "set-user":
+        import getpass
+        password = getpass.getpass(f"Password for {args.username}: ")
+        if password != getpass.getpass("Repeat password: "):
+            parser.error("passwords do not match")
+        users.db_save_user(args.username, password, args.role)
+        print(f"Saved {args.role} {args.username}")
+    else:
+        # Start with the login window
+        login_root = tk.Tk()
+        login = LoginApp(login_root)
+        if args.startup_timing:
+            def mark(event):
+                with open(args.startup_timing, "a") as f:
+                    f.write(f"{event} {time.time():.6f}\n")
+
+            def app_ready(root):
+                mark("app_ready")
+                root.destroy()
+
+            def login_ready():
+                mark("login_window")
+                login.open_app(users.auth.start_session("admin", "admin"), on_ready=app_ready)
+
+            login_root.after_idle(login_ready)
+        login_root.mainloop()
\ No newline at end of file
@@ -5,7 +5,7 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=[('poslite/locales/*.json', 'poslite/locales')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,53 @@
+# POS Lite backend: the store, backups, CSV import/export, users, the
+# headless service, the sale journal, receipt printing, branch consolidation
+# and the translation catalogs, with no Tk dependency, so the store can be
+# scripted directly:
+#
+#   import poslite
+#   poslite.open_store("pos_lite.db")
+#   poslite.initialize_db()
+#   product = poslite.db_fetch_product_by_name("Milk")
+#   poslite.db_sell(product.id, 2, "Cash")
+#
+# enable_instrumentation() rebinds the functions below both here and on
+# their modules (store, users, backup, csvio, archive, receipts).
+# use_remote_store() only rebinds them on store, so code that must follow
+# it, like main.py, looks them up there at call time.
+from .store import (
+    SCHEMA_VERSION, CHART_BUCKETS, MOVEMENT_KINDS, ConnectionPool, ProductCache, PrefixIndex, Cart, Product, Sale,
+    PeriodTotal, StockLevel, StockMovement, StockReconciliation, ReorderSuggestion, Receipt, ReceiptLine,
+    ProductNotFoundError,
+    InsufficientStockError, open_store, initialize_db, product_cache, db_stats, db_save_product, db_fetch_inventory,
+    db_fetch_inventory_page, db_update_product, db_delete_product, db_save_sale, db_fetch_product,
+    db_fetch_product_by_name, db_fetch_product_by_code, db_search_products, db_sell, db_checkout,
+    db_fetch_sales_report, db_fetch_sales_report_page, db_fetch_sales_summary, db_fetch_recent_sales,
+    db_fetch_sales_total, db_fetch_daily_totals, db_fetch_sales_by_period, db_fetch_inventory_levels,
+    db_fetch_dashboard_stats, db_receive_stock, db_adjust_stock, db_fetch_stock_movements, db_reconcile_stock,
+    db_reconcile_inventory, db_fetch_reorder_suggestions, db_fetch_receipt, day_range, archive_dir, attach_archive,
+    sales_sources,
+)
+from .backup import (
+    BACKUP_DIR, BACKUP_KEEP, LEGACY_BACKUP, BackupError, backup_time, list_backups, backup_db, find_backup, restore_db,
+)
+from .csvio import (
+    INVENTORY_EXPORT_COLUMNS, SALES_EXPORT_COLUMNS, IMPORT_COLUMNS, export_inventory_to_csv, export_sales_to_csv,
+    import_products_from_csv,
+)
+from .users import (
+    PASSWORD_ITERATIONS, ROLES, User, AuthError, LoginThrottled, Session, Authenticator, hash_password,
+    verify_password, db_fetch_user, db_save_user,
+)
+from .service import GroupCommitWriter, RemoteStore, make_server, use_remote_store
+from .archive import archive_sales, list_archives
+# poslite.analytics needs NumPy, so it is not imported here: import it as
+# `from poslite import analytics` where the sales analytics are used.
+from .journal import JOURNAL_PATH, TRANSIENT_ERRORS, SaleJournal
+from .consolidation import (
+    CONSOLIDATION_PATH, Branch, BranchSale, BranchTotal, BranchProductTotal, Consolidation,
+)
+from .receipts import (
+    RECEIPT_FORMATS, PRINT_RETRY_ERRORS, ReceiptTemplate, FilePrinter, NetworkPrinter, PrintSpool, render_receipt,
+    receipt_file_name, save_receipt, make_printer,
+)
+from .i18n import DEFAULT_LOCALE, Catalog, available_locales, load_catalog, set_locale, current_locale
+from .metrics import Metric, Instrumentation, instrumentation, enable_instrumentation
@@ -0,0 +1,238 @@
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from . import store
+
+# ---------------------- Sales Analytics ----------------------
+# Sales are loaded a month at a time into NumPy columns and every figure is
+# a vectorised reduction over them (bincount, diff, masks), so no Python
+# loop ever runs per sale. Closed months are also written to a columnar
+# snapshot next to the store (pos_lite.db -> pos_lite_columns/), so after
+# the first load a year of sales comes back from disk rather than SQLite.
+# A month is reloaded when its sale count in daily_totals moves.
+SALE_COLUMNS = np.dtype([
+    ("product_id", np.int32),
+    ("quantity", np.int32),
+    ("total", np.float64),
+    ("day", np.int32),  # days since 1970-01-01
+    ("hour", np.int8),
+    ("payment", np.int8),  # index into the month's payment method labels
+    ("basket", np.int64),  # receipt id, or -sale id for a sale without one
+])
+MEMORY_MONTHS = 36
+EPOCH = date(1970, 1, 1)
+
+# Report tasks run on TaskRunner workers, so several threads can ask for the
+# same month at once; _months_lock makes the check, load and store one step,
+# which also keeps two threads from writing the same snapshot files.
+_months = {}
+_months_lock = threading.Lock()
+
+
+def columns_dir():
+    return os.path.splitext(store.db_pool.path)[0] + "_columns"
+
+
+def _month_bounds(month):
+    # "2025-03" -> ("2025-03-01", "2025-04-01")
+    year, number = map(int, month.split("-"))
+    return f"{month}-01", f"{year + number // 12:04d}-{number % 12 + 1:02d}-01"
+
+
+def _load_month_from_store(month, labels):
+    # Streams the month's rows from every sales table holding them straight
+    # into a structured array; the date, hour and payment label are turned
+    # into integers by SQLite so the rows arrive as plain numbers.
+    start, stop = _month_bounds(month)
+    payment = "CASE COALESCE(payment_method, '')" + "".join(f" WHEN ? THEN {code}" for code in range(len(labels)))
+    parts = []
+    for schema, leg_start, leg_stop in store.sales_sources(start, stop):
+        cursor = store.db_pool.execute(f"""
+            SELECT COALESCE(product_id, 0), COALESCE(quantity, 0), COALESCE(total, 0),
+                   CAST(julianday(substr(sale_date, 1, 10)) - 2440587.5 AS INTEGER),
+                   CAST(substr(sale_date, 12, 2) AS INTEGER), {payment} ELSE -1 END, COALESCE(receipt_id, -id)
+            FROM {schema}.sales WHERE sale_date >= ? AND sale_date < ?
+        """, (*labels, leg_start, leg_stop))
+        parts.append(np.fromiter(cursor, dtype=SALE_COLUMNS))
+    rows = np.concatenate(parts) if len(parts) > 1 else parts[0]
+    return {name: np.ascontiguousarray(rows[name]) for name in SALE_COLUMNS.names}
+
+
+def _month(month, count, labels, closed):
+    with _months_lock:
+        key = (store.db_pool.path, month)
+        cached = _months.get(key)
+        if cached is not None and cached[0] == count:
+            return cached[1], cached[2]
+        prefix = os.path.join(columns_dir(), f"sales_{month}")
+        columns = None
+        if closed and os.path.exists(prefix + ".json"):
+            with open(prefix + ".json") as f:
+                meta = json.load(f)
+            if meta["count"] == count:
+                # Memory-mapped: pages are read as the reductions touch them
+                columns = {name: np.load(f"{prefix}.{name}.npy", mmap_mode="r") for name in SALE_COLUMNS.names}
+                labels = meta["labels"]
+        if columns is None:
+            columns = _load_month_from_store(month, labels)
+            if closed:
+                # The columns first and the metadata last, so a snapshot only
+                # counts as valid once all of it is on disk
+                os.makedirs(columns_dir(), exist_ok=True)
+                for name, values in columns.items():
+                    np.save(f"{prefix}.{name}.npy", values)
+                with open(prefix + ".json.tmp", "w") as f:
+                    json.dump({"count": count, "labels": labels}, f)
+                os.replace(prefix + ".json.tmp", prefix + ".json")
+        if len(_months) >= MEMORY_MONTHS:
+            _months.pop(next(iter(_months)))
+        _months[key] = (count, columns, labels)
+        return columns, labels
+
+
+# The sales of a day range as columns, with the figures the report views
+# show. Built by load_sales(). Revenue by day, hour and payment method all
+# come from one bincount into a (day, hour, payment method) cube, so the
+# big columns are scanned once however many views are drawn.
+class SalesFrame:
+    def __init__(self, start, stop, columns, payment_methods):
+        self.start = start
+        self.stop = stop
+        self.columns = columns
+        self.payment_methods = payment_methods
+        self._cube = None
+
+    def __len__(self):
+        return len(self.columns["total"])
+
+    def cube(self):
+        if self._cube is None:
+            first = (date.fromisoformat(self.start) - EPOCH).days
+            days = (date.fromisoformat(self.stop) - EPOCH).days - first
+            methods = max(len(self.payment_methods), 1)
+            # In place, on one intp array that bincount can take as is
+            cells = self.columns["day"].astype(np.intp)
+            cells -= first
+            cells *= 24
+            cells += self.columns["hour"]
+            cells *= methods
+            cells += self.columns["payment"]
+            self._cube = np.bincount(cells, weights=self.columns["total"],
+                                     minlength=days * 24 * methods)[:days * 24 * methods].reshape(days, 24, methods)
+        return self._cube
+
+    def totals(self):
+        total = self.columns["total"]
+        basket = self.columns["basket"]
+        # Lines of one receipt are stored next to each other, so a basket
+        # starts wherever the receipt id changes
+        baskets = int(np.count_nonzero(basket[1:] != basket[:-1])) + 1 if len(basket) else 0
+        revenue = float(total.sum())
+        units = int(self.columns["quantity"].sum(dtype=np.int64))
+        return {"revenue": revenue, "units": units, "lines": len(total), "baskets": baskets,
+                "avg_basket": revenue / baskets if baskets else 0.0,
+                "units_per_basket": units / baskets if baskets else 0.0}
+
+    def by_product(self, top=20):
+        # (product_id, revenue, units) of the best sellers by revenue
+        if not len(self):
+            return []
+        product = self.columns["product_id"].astype(np.intp)
+        revenue = np.bincount(product, weights=self.columns["total"])
+        units = np.bincount(product, weights=self.columns["quantity"])
+        best = np.argsort(revenue)[::-1][:top]
+        best = best[revenue[best] > 0]
+        return [(int(product_id), float(revenue[product_id]), int(units[product_id])) for product_id in best]
+
+    def by_day(self):
+        # Revenue per day of the range, zero on days without sales
+        return self.cube().sum(axis=(1, 2))
+
+    def by_hour(self):
+        return self.cube().sum(axis=(0, 2))
+
+    def heatmap(self):
+        # Revenue by weekday (Monday first) and hour of day, a 7 x 24 array;
+        # 1970-01-01 was a Thursday
+        by_day_hour = self.cube().sum(axis=2)
+        weekdays = ((date.fromisoformat(self.start) - EPOCH).days + 3 + np.arange(len(by_day_hour))) % 7
+        heatmap = np.zeros((7, 24))
+        np.add.at(heatmap, weekdays, by_day_hour)
+        return heatmap
+
+    def by_payment(self):
+        # (payment method, revenue, share of revenue), largest first
+        revenue = self.cube().sum(axis=(0, 1))
+        total = revenue.sum()
+        return [(self.payment_methods[code] or "-", float(revenue[code]), float(revenue[code] / total))
+                for code in np.argsort(revenue)[::-1] if revenue[code] > 0]
+
+
+def load_sales(start_date, end_date=None, today=None):
+    # SalesFrame of [start_date, end_date], both inclusive ISO days
+    start, stop = store.day_range(start_date, end_date)
+    this_month = (today or date.today()).isoformat()[:7]
+    # Whole months, since months are what gets cached
+    last_month = (date.fromisoformat(stop) - timedelta(days=1)).isoformat()[:7]
+    months = (start[:7] + "-01", _month_bounds(last_month)[1])
+    counts = dict(store.db_pool.execute("""
+        SELECT substr(day, 1, 7), SUM(sale_count) FROM daily_totals WHERE day >= ? AND day < ? GROUP BY 1
+    """, months).fetchall())
+    labels = [row[0] for row in store.db_pool.execute(
+        "SELECT DISTINCT payment_method FROM daily_totals WHERE day >= ? AND day < ? ORDER BY 1", months)]
+    parts = []
+    for month in sorted(counts):
+        month_start, month_stop = _month_bounds(month)
+        columns, month_labels = _month(month, counts[month], labels, closed=month < this_month)
+        if month_labels != labels:
+            # Map the month's payment codes onto the range's label list
+            remap = np.array([labels.index(label) if label in labels else 0 for label in month_labels], dtype=np.int8)
+            columns = dict(columns, payment=remap[columns["payment"]])
+        if month_start < start or month_stop > stop:
+            first = (date.fromisoformat(start) - EPOCH).days
+            last = (date.fromisoformat(stop) - EPOCH).days
+            keep = (columns["day"] >= first) & (columns["day"] < last)
+            columns = {name: values[keep] for name, values in columns.items()}
+        parts.append(columns)
+    if parts:
+        columns = {name: np.concatenate([part[name] for part in parts]) for name in SALE_COLUMNS.names}
+    else:
+        columns = {name: np.zeros(0, dtype=SALE_COLUMNS[name]) for name in SALE_COLUMNS.names}
+    return SalesFrame(start, stop, columns, labels)
+
+
+def _delta(current, previous):
+    return (current - previous) / previous if previous else None
+
+
+def analyze_sales(start_date, end_date=None, top=20, today=None):
+    # Everything the analytics views show for a range, plus the same totals
+    # for the equally long period just before it and the relative change.
+    began = time.perf_counter()
+    frame = load_sales(start_date, end_date, today)
+    days = (date.fromisoformat(frame.stop) - date.fromisoformat(frame.start)).days
+    previous_start = date.fromisoformat(frame.start) - timedelta(days=days)
+    previous = load_sales(previous_start.isoformat(), (previous_start + timedelta(days=days - 1)).isoformat(), today)
+    totals, previous_totals = frame.totals(), previous.totals()
+    products = frame.by_product(top)
+    names = {}
+    if products:
+        ids = [product_id for product_id, revenue, units in products]
+        names = dict(store.db_pool.execute(
+            f"SELECT id, product_name FROM inventory WHERE id IN ({','.join('?' * len(ids))})", ids).fetchall())
+    return {
+        "start": frame.start, "stop": frame.stop, "totals": totals, "previous": previous_totals,
+        "deltas": {key: _delta(totals[key], previous_totals[key]) for key in totals},
+        "by_product": [(product_id, names.get(product_id, f"#{product_id}"), revenue, units)
+                       for product_id, revenue, units in products],
+        "by_hour": frame.by_hour().tolist(),
+        "heatmap": frame.heatmap().tolist(),
+        "by_payment": frame.by_payment(),
+        "by_day": frame.by_day().tolist(),
+        "seconds": time.perf_counter() - began,
+    }
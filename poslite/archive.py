@@ -0,0 +1,109 @@
+import os
+import time
+from datetime import date, datetime
+
+from . import store
+
+# ---------------------- Sales Archive ----------------------
+# Tables of an archive file: the sales and receipts of the months moved into
+# it, with the same columns and ids they had in the store.
+ARCHIVE_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS {schema}.receipts (
+        id INTEGER PRIMARY KEY,
+        created_at TEXT NOT NULL,
+        payment_method TEXT,
+        total REAL NOT NULL,
+        item_count INTEGER NOT NULL,
+        uuid TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS {schema}.sales (
+        id INTEGER PRIMARY KEY,
+        product_id INTEGER,
+        quantity INTEGER,
+        total REAL,
+        sale_date TEXT,
+        payment_method TEXT,
+        receipt_id INTEGER
+    )""",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_sales_sale_date ON sales (sale_date)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_sales_product_id ON sales (product_id)",
+)
+SALE_COLUMNS = "id, product_id, quantity, total, sale_date, payment_method, receipt_id"
+RECEIPT_COLUMNS = "id, created_at, payment_method, total, item_count, uuid"
+
+
+def _month_start(day, months_back=0):
+    month = day.year * 12 + day.month - 1 - months_back
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def archive_sales(keep_months=12, today=None, vacuum=True, progress=None):
+    # Moves the sales (and receipts) of every month that closed more than
+    # keep_months ago into one archive file per year under
+    # store.archive_dir(), leaving the daily_totals rollup and a
+    # sales_archives row per month behind, so the live tables only hold
+    # recent trading. Reports read the archives back transparently.
+    #
+    # Each year is copied in one transaction on the archive and removed in
+    # a second one on the store, which also records it in sales_archives;
+    # an interrupted run leaves the rows in the store and is simply run
+    # again. Sales replayed later into an archived month stay in the store
+    # until the next run moves them too.
+    began = time.perf_counter()
+    size_before = os.path.getsize(store.db_pool.path)
+    cutoff = _month_start(today or date.today(), keep_months).isoformat()
+    months = [row[0] for row in store.db_pool.execute(
+        "SELECT DISTINCT substr(day, 1, 7) FROM daily_totals WHERE day < ? ORDER BY 1", (cutoff,))]
+    years = sorted({month[:4] for month in months})
+    report = {"cutoff": cutoff, "months": [], "sales": 0, "receipts": 0}
+    os.makedirs(store.archive_dir(), exist_ok=True)
+    for done, year in enumerate(years, 1):
+        start, stop = f"{year}-01-01", min(f"{int(year) + 1:04d}-01-01", cutoff)
+        if not store.db_pool.execute("SELECT 1 FROM sales WHERE sale_date >= ? AND sale_date < ? LIMIT 1",
+                                     (start, stop)).fetchone():
+            continue
+        file = f"sales_{year}.db"
+        schema = store.attach_archive(file, create=True)
+        with store.db_pool.transaction() as cursor:
+            for statement in ARCHIVE_SCHEMA:
+                cursor.execute(statement.format(schema=schema))
+            cursor.execute(f"INSERT OR IGNORE INTO {schema}.receipts ({RECEIPT_COLUMNS}) "
+                           f"SELECT {RECEIPT_COLUMNS} FROM main.receipts WHERE created_at >= ? AND created_at < ?",
+                           (start, stop))
+            cursor.execute(f"INSERT OR IGNORE INTO {schema}.sales ({SALE_COLUMNS}) "
+                           f"SELECT {SALE_COLUMNS} FROM main.sales WHERE sale_date >= ? AND sale_date < ?",
+                           (start, stop))
+        # Only rows now safely in the archive are removed from the store
+        archived_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with store.db_pool.transaction() as cursor:
+            moved = cursor.execute(f"""
+                SELECT substr(sale_date, 1, 7), COUNT(*), COALESCE(SUM(total), 0) FROM main.sales
+                WHERE sale_date >= ? AND sale_date < ? AND id IN (SELECT id FROM {schema}.sales) GROUP BY 1
+            """, (start, stop)).fetchall()
+            cursor.executemany("""
+                INSERT INTO sales_archives (period, file, sale_count, revenue, archived_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (period) DO UPDATE SET sale_count = sale_count + excluded.sale_count,
+                    revenue = revenue + excluded.revenue, archived_at = excluded.archived_at
+            """, [(period, file, count, revenue, archived_at) for period, count, revenue in moved])
+            cursor.execute(f"DELETE FROM main.sales WHERE sale_date >= ? AND sale_date < ? "
+                           f"AND id IN (SELECT id FROM {schema}.sales)", (start, stop))
+            report["sales"] += cursor.rowcount
+            cursor.execute(f"DELETE FROM main.receipts WHERE created_at >= ? AND created_at < ? "
+                           f"AND id IN (SELECT id FROM {schema}.receipts)", (start, stop))
+            report["receipts"] += cursor.rowcount
+        report["months"] += [period for period, count, revenue in moved]
+        if progress:
+            progress(done, len(years))
+    if vacuum and report["sales"]:
+        # Hand the freed pages back so backups of the store shrink too
+        store.db_pool.execute("VACUUM")
+        store.db_pool.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    report.update(seconds=time.perf_counter() - began, size_before=size_before,
+                  size_after=os.path.getsize(store.db_pool.path))
+    return report
+
+
+def list_archives():
+    # (period, file, sale_count, revenue, archived_at) per archived month
+    return store.db_pool.execute("SELECT period, file, sale_count, revenue, archived_at FROM sales_archives "
+                                 "ORDER BY period").fetchall()
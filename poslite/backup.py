@@ -0,0 +1,233 @@
+import os
+import shutil
+import sqlite3
+import struct
+from datetime import datetime
+
+from . import store
+
+# ---------------------- Backup and Restore ----------------------
+# main.py --db moves both next to the store (shop.db -> shop_backups/), so
+# stores sharing a directory never restore each other's backups
+BACKUP_DIR = "backups"
+BACKUP_KEEP = 10
+LEGACY_BACKUP = "pos_lite_backup.db"
+DELTA_MAGIC = b"POSLDELTA1"
+
+
+class BackupError(Exception):
+    pass
+
+
+def _backup_stamp(when=None):
+    return (when or datetime.now()).strftime("%Y%m%d_%H%M%S_%f")
+
+
+def backup_time(path):
+    # pos_lite_20261018_101500_123456.db -> datetime
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return datetime.strptime(stem[len("pos_lite_"):], "%Y%m%d_%H%M%S_%f")
+
+
+def list_backups(directory=None):
+    # (time, path, base) tuples, oldest first; base is None for full backups
+    # and the full backup a delta applies to otherwise.
+    directory = directory or BACKUP_DIR
+    if not os.path.isdir(directory):
+        return []
+    backups = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if not name.startswith("pos_lite_"):
+            continue
+        try:
+            when = backup_time(path)
+        except ValueError:
+            continue
+        if name.endswith(".db"):
+            backups.append((when, path, None))
+        elif name.endswith(".delta"):
+            backups.append((when, path, _read_delta_header(path)[2]))
+    backups.sort()
+    return backups
+
+
+def _copy_database(source, filename, pages=256, progress=None):
+    # The online backup API copies `pages` pages per step. The source keeps
+    # one WAL read transaction open for the whole copy, so every step reads
+    # the same snapshot: tills keep committing sales meanwhile, and their
+    # commits no longer restart the copy, which on a busy store could
+    # otherwise start over forever. The copy is written in rollback-journal
+    # mode.
+    def step(status, remaining, total):
+        if progress:
+            progress(total - remaining, total)
+
+    target = sqlite3.connect(filename)
+    snapshot = not source.in_transaction
+    try:
+        if snapshot:
+            source.execute("BEGIN")
+            source.execute("SELECT 1 FROM sqlite_master LIMIT 1")
+        source.backup(target, pages=pages, progress=step, sleep=0)
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        if snapshot and source.in_transaction:
+            source.execute("ROLLBACK")
+        target.close()
+
+
+def _changed_pages(snapshot, base, page_size):
+    with open(snapshot, "rb") as new, open(base, "rb") as old:
+        page_no = 0
+        while True:
+            page = new.read(page_size)
+            if not page:
+                return
+            if old.read(page_size) != page:
+                yield page_no, page
+            page_no += 1
+
+
+def _write_delta(filename, snapshot, base):
+    # Ships only the pages that differ from the base full backup: header,
+    # base file name, then (page number, page) records.
+    page_size = _page_size(snapshot)
+    page_count = os.path.getsize(snapshot) // page_size
+    base_name = os.path.basename(base).encode()
+    with open(filename, "wb") as f:
+        f.write(DELTA_MAGIC)
+        f.write(struct.pack(">IIH", page_size, page_count, len(base_name)))
+        f.write(base_name)
+        for page_no, page in _changed_pages(snapshot, base, page_size):
+            f.write(struct.pack(">I", page_no))
+            f.write(page)
+
+
+def _read_delta_header(filename):
+    with open(filename, "rb") as f:
+        if f.read(len(DELTA_MAGIC)) != DELTA_MAGIC:
+            raise BackupError(f"{filename} is not a POS Lite delta backup")
+        page_size, page_count, name_length = struct.unpack(">IIH", f.read(10))
+        base = os.path.join(os.path.dirname(filename), f.read(name_length).decode())
+        return page_size, page_count, base, f.tell()
+
+
+def _apply_delta(filename, target):
+    page_size, page_count, base, offset = _read_delta_header(filename)
+    if not os.path.exists(base):
+        raise BackupError(f"Base backup {base} for {filename} is missing")
+    shutil.copyfile(base, target)
+    with open(filename, "rb") as delta, open(target, "r+b") as f:
+        delta.seek(offset)
+        while True:
+            record = delta.read(4)
+            if not record:
+                break
+            f.seek(struct.unpack(">I", record)[0] * page_size)
+            f.write(delta.read(page_size))
+        f.truncate(page_count * page_size)
+
+
+def _page_size(filename):
+    connection = sqlite3.connect(filename)
+    try:
+        return connection.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def _integrity_check(filename):
+    connection = sqlite3.connect(filename)
+    try:
+        result = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+    finally:
+        connection.close()
+    if result != ["ok"]:
+        raise BackupError(f"Integrity check failed for {filename}: {'; '.join(result[:5])}")
+
+
+def _rotate_backups(directory, keep):
+    # Keep the newest `keep` full backups and the deltas built on them.
+    backups = list_backups(directory)
+    full = [path for when, path, base in backups if base is None]
+    expired = set(full[:-keep] if keep else full)
+    for when, path, base in backups:
+        if path in expired or (base is not None and (base in expired or not os.path.exists(base))):
+            os.remove(path)
+
+
+def backup_db(directory=None, incremental=False, keep=BACKUP_KEEP, pages=256, progress=None):
+    # Writes a timestamped backup and returns its path, or None on failure.
+    # incremental=True writes a delta against the newest full backup instead,
+    # falling back to a full backup when there is none yet.
+    directory = directory or BACKUP_DIR
+    os.makedirs(directory, exist_ok=True)
+    stamp = _backup_stamp()
+    full = [path for when, path, base in list_backups(directory) if base is None]
+    filename = os.path.join(directory, f"pos_lite_{stamp}.db")
+    snapshot = filename
+    if incremental and full:
+        filename = os.path.join(directory, f"pos_lite_{stamp}.delta")
+        snapshot = filename + ".tmp"
+    try:
+        _copy_database(store.db_pool.connection(), snapshot, pages, progress)
+        if snapshot != filename:
+            _write_delta(filename, snapshot, full[-1])
+            os.remove(snapshot)
+        _rotate_backups(directory, keep)
+        return filename
+    except BaseException as e:
+        # Never leave a partial backup behind; cancellation still propagates.
+        for path in {snapshot, filename}:
+            if os.path.exists(path):
+                os.remove(path)
+        if isinstance(e, (sqlite3.Error, OSError, BackupError)):
+            return None
+        raise
+
+
+def find_backup(at=None, directory=None):
+    # Newest backup taken at or before `at` (a datetime); the legacy single
+    # backup file is used when the backup directory has none.
+    backups = [path for when, path, base in list_backups(directory) if at is None or when <= at]
+    if backups:
+        return backups[-1]
+    if at is None and os.path.exists(LEGACY_BACKUP):
+        return LEGACY_BACKUP
+    return None
+
+
+def restore_db(path=None, at=None, directory=None):
+    # Rebuilds the chosen backup in a scratch file and only swaps it in once
+    # PRAGMA integrity_check passes. The swap goes through the backup API into
+    # the live connection, which keeps the WAL consistent for other readers;
+    # callers stop their own background work first (see main.py restore_db).
+    # Returns False when there is no backup to restore. Any other failure (a
+    # damaged backup, a missing delta base, a locked store) raises BackupError
+    # saying why; only one during the swap itself can leave the store changed.
+    path = path or find_backup(at, directory)
+    if path is None:
+        return False
+    candidate = store.db_pool.path + ".restore"
+    try:
+        if path.endswith(".delta"):
+            _apply_delta(path, candidate)
+        else:
+            shutil.copyfile(path, candidate)
+        _integrity_check(candidate)
+        source = sqlite3.connect(candidate)
+        try:
+            store.db_pool.close_all()
+            source.backup(store.db_pool.connection())
+        finally:
+            source.close()
+        # Older backups may predate the current schema and aggregates
+        store.initialize_db()
+    except (sqlite3.Error, OSError) as e:
+        raise BackupError(f"Restoring {path} failed: {e}") from e
+    finally:
+        for suffix in ("", "-journal", "-wal", "-shm"):
+            if os.path.exists(candidate + suffix):
+                os.remove(candidate + suffix)
+    return True
@@ -0,0 +1,240 @@
+import os
+import time
+from collections import namedtuple
+from datetime import date, datetime
+
+from .store import CHART_BUCKETS, ConnectionPool, PeriodTotal, day_range, as_rows
+
+# ---------------------- Multi-Store Consolidation ----------------------
+# Head office keeps one consolidation database holding the sales of every
+# branch store. sync_branch() ATTACHes a branch's database (a live file on a
+# share, or the latest backup it sent in) and copies only the sales past the
+# branch's high-water mark, the largest sales.id merged so far, which is a
+# range seek on the sales primary key however large the branch has grown.
+# Cross-store reports then read the consolidation database alone, with the
+# same daily rollup the stores use, so no branch is copied in full again.
+CONSOLIDATION_PATH = "pos_lite_consolidated.db"
+
+BranchSale = namedtuple("BranchSale", ("branch", "id", "product_name", "quantity", "total", "sale_date",
+                                       "payment_method"))
+BranchTotal = namedtuple("BranchTotal", ("branch", "sale_count", "units", "revenue"))
+BranchProductTotal = namedtuple("BranchProductTotal", ("product_name", "sku", "units", "revenue", "branches"))
+Branch = namedtuple("Branch", ("id", "name", "path", "last_sale_id", "synced_at"))
+
+CONSOLIDATION_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS branches (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        path TEXT NOT NULL,
+        last_sale_id INTEGER NOT NULL DEFAULT 0,
+        synced_at TEXT
+    )""",
+    # The branch's products as of its last sync, for names in reports
+    """CREATE TABLE IF NOT EXISTS branch_products (
+        branch_id INTEGER NOT NULL,
+        id INTEGER NOT NULL,
+        product_name TEXT NOT NULL,
+        sku TEXT,
+        price REAL,
+        quantity INTEGER,
+        PRIMARY KEY (branch_id, id)
+    ) WITHOUT ROWID""",
+    # id is the sale's id in its branch
+    """CREATE TABLE IF NOT EXISTS branch_sales (
+        branch_id INTEGER NOT NULL,
+        id INTEGER NOT NULL,
+        product_id INTEGER,
+        quantity INTEGER,
+        total REAL,
+        sale_date TEXT,
+        payment_method TEXT,
+        receipt_id INTEGER,
+        PRIMARY KEY (branch_id, id)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS idx_branch_sales_sale_date ON branch_sales (sale_date)",
+    """CREATE TABLE IF NOT EXISTS branch_daily_totals (
+        branch_id INTEGER NOT NULL,
+        day TEXT NOT NULL,
+        payment_method TEXT NOT NULL,
+        revenue REAL NOT NULL DEFAULT 0,
+        units INTEGER NOT NULL DEFAULT 0,
+        sale_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, branch_id, payment_method)
+    ) WITHOUT ROWID""",
+    # INSERT OR IGNORE skips the trigger for rows already merged, so a sync
+    # that is run again never counts a sale twice
+    """CREATE TRIGGER IF NOT EXISTS trg_branch_sales_insert AFTER INSERT ON branch_sales BEGIN
+        INSERT OR IGNORE INTO branch_daily_totals (branch_id, day, payment_method)
+            VALUES (NEW.branch_id, substr(NEW.sale_date, 1, 10), COALESCE(NEW.payment_method, ''));
+        UPDATE branch_daily_totals SET revenue = revenue + COALESCE(NEW.total, 0),
+            units = units + COALESCE(NEW.quantity, 0), sale_count = sale_count + 1
+            WHERE day = substr(NEW.sale_date, 1, 10) AND branch_id = NEW.branch_id
+                AND payment_method = COALESCE(NEW.payment_method, '');
+    END""",
+)
+BRANCH_SALE_COLUMNS = "id, product_id, quantity, total, sale_date, payment_method, receipt_id"
+
+
+class Consolidation:
+    def __init__(self, path=None):
+        self.pool = ConnectionPool(path or CONSOLIDATION_PATH)
+        with self.pool.transaction() as cursor:
+            for statement in CONSOLIDATION_SCHEMA:
+                cursor.execute(statement)
+
+    def close(self):
+        self.pool.close_all()
+
+    # ---------------------- Branches ----------------------
+    def add_branch(self, name, path):
+        # Registers a branch store, or moves an existing one to a new path
+        # (its high-water mark is kept)
+        with self.pool.transaction() as cursor:
+            cursor.execute("INSERT INTO branches (name, path) VALUES (?, ?) "
+                           "ON CONFLICT (name) DO UPDATE SET path = excluded.path", (name, os.path.abspath(path)))
+            return cursor.execute("SELECT id FROM branches WHERE name = ?", (name,)).fetchone()[0]
+
+    def branches(self):
+        return as_rows(self.pool.execute("SELECT id, name, path, last_sale_id, synced_at FROM branches ORDER BY name"),
+                       Branch).fetchall()
+
+    def branch(self, name):
+        row = self.pool.execute("SELECT id, name, path, last_sale_id, synced_at FROM branches WHERE name = ?",
+                                (name,)).fetchone()
+        if row is None:
+            raise LookupError(f"Unknown branch {name!r}")
+        return Branch(*row)
+
+    def _attach(self, path, schema):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Branch database {path} is missing")
+        self.pool.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+
+    def _detach(self, schema):
+        if any(row[1] == schema for row in self.pool.execute("PRAGMA database_list")):
+            self.pool.execute(f"DETACH DATABASE {schema}")
+
+    def _merge_sales(self, cursor, branch_id, schema, after):
+        # Sales of one attached sales table past the high-water mark
+        cursor.execute(f"INSERT OR IGNORE INTO branch_sales (branch_id, {BRANCH_SALE_COLUMNS}) "
+                       f"SELECT ?, {BRANCH_SALE_COLUMNS} FROM {schema}.sales WHERE id > ? ORDER BY id",
+                       (branch_id, after))
+        return cursor.rowcount
+
+    def sync_branch(self, name):
+        # Merges the branch's new sales and refreshes its product names and
+        # stock. The branch's sales archives (see poslite.archive) are read
+        # too, so months it archived before a sync reached them are not
+        # lost; each is a range seek past the mark like the live table.
+        # Archives missing next to the branch's file, as beside a backup sent
+        # in, are skipped and listed in the report. The mark only moves in
+        # the last transaction, once every source is in.
+        began = time.perf_counter()
+        branch = self.branch(name)
+        report = {"branch": name, "sales": 0, "archived_sales": 0, "missing_archives": [], "rewound": False}
+        self._attach(branch.path, "branch")
+        try:
+            archives = self.pool.execute("SELECT DISTINCT file FROM branch.sales_archives ORDER BY file").fetchall()
+            archive_dir = os.path.splitext(branch.path)[0] + "_archive"
+            for (file,) in archives:
+                if not os.path.exists(os.path.join(archive_dir, file)):
+                    report["missing_archives"].append(file)
+                    continue
+                self._attach(os.path.join(archive_dir, file), "branch_archive")
+                try:
+                    with self.pool.transaction() as cursor:
+                        report["archived_sales"] += self._merge_sales(cursor, branch.id, "branch_archive",
+                                                                      branch.last_sale_id)
+                finally:
+                    self._detach("branch_archive")
+            with self.pool.transaction() as cursor:
+                report["sales"] = self._merge_sales(cursor, branch.id, "branch", branch.last_sale_id)
+                cursor.execute("""
+                    INSERT INTO branch_products (branch_id, id, product_name, sku, price, quantity)
+                    SELECT ?, id, product_name, sku, price, quantity FROM branch.inventory WHERE true
+                    ON CONFLICT (branch_id, id) DO UPDATE SET product_name = excluded.product_name,
+                        sku = excluded.sku, price = excluded.price, quantity = excluded.quantity
+                    WHERE (product_name, sku, price, quantity)
+                        IS NOT (excluded.product_name, excluded.sku, excluded.price, excluded.quantity)
+                """, (branch.id,))
+                # A branch restored from an older backup hands out sale ids
+                # that were already merged; those sales need a look by hand.
+                # sqlite_sequence still holds the largest id ever handed out
+                # once archiving has emptied the sales table.
+                issued = cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM branch.sqlite_sequence "
+                                        "WHERE name = 'sales'").fetchone()[0]
+                report["rewound"] = issued < branch.last_sale_id
+                last_sale_id = max(branch.last_sale_id, cursor.execute(
+                    "SELECT COALESCE(MAX(id), 0) FROM branch_sales WHERE branch_id = ?", (branch.id,)).fetchone()[0])
+                cursor.execute("UPDATE branches SET last_sale_id = ?, synced_at = ? WHERE id = ?",
+                               (last_sale_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), branch.id))
+        finally:
+            self._detach("branch")
+        report.update(last_sale_id=last_sale_id, seconds=time.perf_counter() - began)
+        return report
+
+    def sync_all(self, progress=None):
+        reports = []
+        branches = self.branches()
+        for done, branch in enumerate(branches, 1):
+            reports.append(self.sync_branch(branch.name))
+            if progress:
+                progress(done, len(branches))
+        return reports
+
+    # ---------------------- Cross-Store Reports ----------------------
+    def _branch_filter(self, names, column="branch_id"):
+        if not names:
+            return "", []
+        ids = [self.branch(name).id for name in names]
+        return f" AND {column} IN ({','.join('?' * len(ids))})", ids
+
+    def sales_report(self, start_date, end_date, branches=None):
+        # Every branch's sales in [start_date, end_date], in sale_date order,
+        # through idx_branch_sales_sale_date
+        start, stop = day_range(start_date, end_date)
+        where, ids = self._branch_filter(branches, "s.branch_id")
+        return as_rows(self.pool.execute(f"""
+            SELECT b.name, s.id, COALESCE(p.product_name, '#' || s.product_id), s.quantity, s.total, s.sale_date,
+                   s.payment_method
+            FROM branch_sales s JOIN branches b ON b.id = s.branch_id
+                LEFT JOIN branch_products p ON p.branch_id = s.branch_id AND p.id = s.product_id
+            WHERE s.sale_date >= ? AND s.sale_date < ?{where} ORDER BY s.sale_date, s.branch_id, s.id
+        """, (start, stop, *ids)), BranchSale).fetchall()
+
+    def sales_summary(self, start_date, end_date):
+        # Per branch, from the daily rollup: one row per branch, day and
+        # payment method in the range
+        start, stop = day_range(start_date, end_date)
+        return as_rows(self.pool.execute("""
+            SELECT b.name, COALESCE(SUM(t.sale_count), 0), COALESCE(SUM(t.units), 0), COALESCE(SUM(t.revenue), 0)
+            FROM branches b LEFT JOIN branch_daily_totals t ON t.branch_id = b.id AND t.day >= ? AND t.day < ?
+            GROUP BY b.id ORDER BY b.name
+        """, (start, stop)), BranchTotal).fetchall()
+
+    def sales_by_period(self, start_date, end_date, bucket=None, branches=None):
+        # Revenue per bucket over the branches given (all by default), as
+        # store.db_fetch_sales_by_period does for one store
+        start, stop = day_range(start_date, end_date)
+        if bucket is None:
+            days = (date.fromisoformat(stop) - date.fromisoformat(start)).days
+            bucket = "day" if days <= 62 else "week" if days <= 366 else "month"
+        where, ids = self._branch_filter(branches)
+        rows = as_rows(self.pool.execute(f"""
+            SELECT {CHART_BUCKETS[bucket]} AS period, SUM(revenue) FROM branch_daily_totals
+            WHERE day >= ? AND day < ?{where} GROUP BY period ORDER BY period
+        """, (start, stop, *ids)), PeriodTotal).fetchall()
+        return bucket, rows
+
+    def top_products(self, start_date, end_date, top=20):
+        # Best sellers across branches; a product is matched between stores
+        # on its SKU, or its name where it has none
+        start, stop = day_range(start_date, end_date)
+        return as_rows(self.pool.execute("""
+            SELECT MIN(COALESCE(p.product_name, '#' || s.product_id)), p.sku, SUM(s.quantity), SUM(s.total),
+                   COUNT(DISTINCT s.branch_id)
+            FROM branch_sales s LEFT JOIN branch_products p ON p.branch_id = s.branch_id AND p.id = s.product_id
+            WHERE s.sale_date >= ? AND s.sale_date < ?
+            GROUP BY COALESCE(p.sku, p.product_name, s.branch_id || '#' || s.product_id)
+            ORDER BY SUM(s.total) DESC LIMIT ?
+        """, (start, stop, top)), BranchProductTotal).fetchall()
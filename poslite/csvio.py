@@ -0,0 +1,295 @@
+import csv
+import gzip
+import os
+import time
+from datetime import date, timedelta
+
+from . import store
+
+# ---------------------- CSV Export ----------------------
+INVENTORY_EXPORT_COLUMNS = {
+    "id": "ID",
+    "product_name": "Product Name",
+    "quantity": "Quantity",
+    "price": "Price",
+    "threshold": "Threshold",
+    "sku": "SKU",
+    "barcode": "Barcode",
+}
+SALES_EXPORT_COLUMNS = {
+    "id": "ID",
+    "product_id": "Product ID",
+    "quantity": "Quantity",
+    "total": "Total",
+    "sale_date": "Sale Date",
+    "payment_method": "Payment Method",
+    "receipt_id": "Receipt ID",
+}
+
+
+def _date_filter(column, start_date=None, end_date=None):
+    # Half-open, index-friendly bounds for optional start/end days
+    clauses, params = [], []
+    if start_date:
+        clauses.append(f"{column} >= ?")
+        params.append(date.fromisoformat(start_date).isoformat())
+    if end_date:
+        clauses.append(f"{column} < ?")
+        params.append((date.fromisoformat(end_date) + timedelta(days=1)).isoformat())
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def _select_columns(columns, allowed):
+    columns = list(columns or allowed)
+    unknown = [column for column in columns if column not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown export column(s): {', '.join(unknown)}")
+    return columns
+
+
+def _stream_to_csv(cursor, filename, headers, compress=False, chunk_size=5000, progress=None, total=None):
+    # Write rows as they come off the cursor, chunk_size at a time, so memory
+    # stays flat however many rows are exported. A failed or cancelled export
+    # does not leave a truncated file behind.
+    compress = compress or filename.endswith(".gz")
+    began = time.perf_counter()
+    rows = 0
+    try:
+        with (gzip.open(filename, "wt", compresslevel=6, newline="") if compress else open(filename, "w", newline="")) as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                writer.writerows(chunk)
+                rows += len(chunk)
+                if progress:
+                    progress(rows, total)
+    except BaseException:
+        cursor.close()
+        if os.path.exists(filename):
+            os.remove(filename)
+        raise
+    seconds = time.perf_counter() - began
+    return {"filename": filename, "rows": rows, "seconds": seconds,
+            "rows_per_sec": rows / seconds if seconds > 0 else float(rows)}
+
+
+def export_inventory_to_csv(filename="inventory_export.csv", columns=None, compress=False, chunk_size=5000,
+                            progress=None):
+    columns = _select_columns(columns, INVENTORY_EXPORT_COLUMNS)
+    total = store.db_pool.execute("SELECT total_products FROM inventory_stats WHERE id = 1").fetchone()[0]
+    cursor = store.db_pool.execute(f"SELECT {', '.join(columns)} FROM inventory")
+    return _stream_to_csv(cursor, filename, [INVENTORY_EXPORT_COLUMNS[column] for column in columns],
+                          compress, chunk_size, progress, total)
+
+
+class _ChainedCursor:
+    # fetchmany over several queries run one after another, each started only
+    # once the one before it is used up
+    def __init__(self, queries):
+        self.queries = iter(queries)
+        self.cursor = None
+
+    def fetchmany(self, size):
+        while True:
+            if self.cursor is None:
+                query = next(self.queries, None)
+                if query is None:
+                    return []
+                self.cursor = query()
+            rows = self.cursor.fetchmany(size)
+            if rows:
+                return rows
+            self.cursor = None
+
+    def close(self):
+        if self.cursor is not None:
+            self.cursor.close()
+
+
+def export_sales_to_csv(filename="sales_export.csv", start_date=None, end_date=None, columns=None, compress=False,
+                        chunk_size=5000, progress=None):
+    # Archived months are read from their archive files, then the store
+    columns = _select_columns(columns, SALES_EXPORT_COLUMNS)
+    total = None
+    if progress:
+        # The daily rollup gives an exact row count without touching sales
+        day_where, day_params = _date_filter("day", start_date, end_date)
+        total = store.db_pool.execute("SELECT COALESCE(SUM(sale_count), 0) FROM daily_totals" + day_where,
+                                day_params).fetchone()[0]
+    start = date.fromisoformat(start_date).isoformat() if start_date else None
+    stop = (date.fromisoformat(end_date) + timedelta(days=1)).isoformat() if end_date else None
+
+    def query(schema, start, stop):
+        clauses = [clause for clause, bound in (("sale_date >= ?", start), ("sale_date < ?", stop)) if bound]
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return lambda: store.db_pool.execute(f"SELECT {', '.join(columns)} FROM {schema}.sales" + where,
+                                             [bound for bound in (start, stop) if bound])
+
+    cursor = _ChainedCursor(query(*source) for source in store.sales_sources(start, stop))
+    return _stream_to_csv(cursor, filename, [SALES_EXPORT_COLUMNS[column] for column in columns],
+                          compress, chunk_size, progress, total)
+
+
+# ---------------------- CSV Import ----------------------
+# Header names accepted by import_products_from_csv; the export labels are
+# accepted too, so an inventory export can be edited and imported again.
+IMPORT_COLUMNS = ("sku", "product_name", "quantity", "price", "threshold", "barcode")
+IMPORT_ALIASES = {label.lower(): column for column, label in INVENTORY_EXPORT_COLUMNS.items()}
+IMPORT_ALIASES.update({column: column for column in IMPORT_COLUMNS})
+IMPORT_ALIASES["name"] = "product_name"
+
+
+def _parse_import_row(row, positions):
+    # Returns (sku, name, quantity, price, threshold, barcode) or raises
+    # ValueError; a blank barcode is None, which keeps the one on file
+    def field(column):
+        position = positions.get(column)
+        return row[position].strip() if position is not None and position < len(row) else ""
+
+    sku = field("sku")
+    name = field("product_name")
+    if not sku:
+        raise ValueError("missing sku")
+    if not name:
+        raise ValueError("missing product name")
+    try:
+        quantity = int(field("quantity") or 0)
+        price = float(field("price"))
+        threshold = int(field("threshold") or 0)
+    except ValueError as e:
+        raise ValueError(f"bad number ({e})")
+    if quantity < 0 or price < 0 or threshold < 0:
+        raise ValueError("negative quantity, price or threshold")
+    return sku, name, quantity, price, threshold, field("barcode") or None
+
+
+def _stock_by_sku(cursor, skus):
+    stock = {}
+    for i in range(0, len(skus), 500):
+        chunk = skus[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        stock.update((sku, (product_id, quantity)) for sku, product_id, quantity in cursor.execute(
+            f"SELECT sku, id, quantity FROM inventory WHERE sku IN ({placeholders})", chunk))
+    return stock
+
+
+def _claim_barcodes(cursor, batch, owners, codes, rejected):
+    # A barcode belongs to one product. Rows of (line number, row) that would
+    # give a product a barcode another one holds, in the store or earlier in
+    # the file, are rejected here instead of failing the whole import on
+    # idx_inventory_barcode. owners (barcode -> holder, None once released)
+    # and codes (sku -> barcode) follow the rows accepted so far and are
+    # filled from inventory a batch at a time.
+    skus = list({row[0] for line, row in batch if row[5] is not None and row[0] not in codes})
+    barcodes = list({row[5] for line, row in batch if row[5] is not None and row[5] not in owners})
+    for i in range(0, len(skus), 500):
+        chunk = skus[i:i + 500]
+        for sku, barcode in cursor.execute(f"SELECT sku, barcode FROM inventory WHERE sku IN "
+                                           f"({','.join('?' * len(chunk))})", chunk):
+            codes[sku] = barcode
+            if barcode is not None:
+                owners.setdefault(barcode, sku)
+    for i in range(0, len(barcodes), 500):
+        chunk = barcodes[i:i + 500]
+        for barcode, product_id, sku in cursor.execute(f"SELECT barcode, id, sku FROM inventory WHERE barcode IN "
+                                                       f"({','.join('?' * len(chunk))})", chunk):
+            owners.setdefault(barcode, sku if sku is not None else f"product {product_id}")
+    accepted = []
+    for line, row in batch:
+        sku, barcode = row[0], row[5]
+        if barcode is not None:
+            owner = owners.get(barcode)
+            if owner is not None and owner != sku:
+                rejected.append((line, f"barcode {barcode} already belongs to {owner}"))
+                continue
+            previous = codes.get(sku)
+            if previous is not None and previous != barcode:
+                owners[previous] = None
+            owners[barcode] = sku
+            codes[sku] = barcode
+        accepted.append(row)
+    return accepted
+
+
+def _upsert_products(cursor, batch, replace_quantity, seen):
+    # Reads the stock of the batch's keys before and after it is written:
+    # that tells inserts from updates without a query per row, and gives the
+    # stock movements to book, one per product.
+    skus = list({row[0] for row in batch})
+    before = _stock_by_sku(cursor, skus)
+    quantity = "excluded.quantity" if replace_quantity else "quantity + excluded.quantity"
+    cursor.executemany(f"""
+        INSERT INTO inventory (sku, product_name, quantity, price, threshold, barcode) VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (sku) DO UPDATE SET product_name = excluded.product_name, quantity = {quantity},
+            price = excluded.price, threshold = excluded.threshold, barcode = COALESCE(excluded.barcode, barcode)
+    """, batch)
+    movements = []
+    for sku, (product_id, after) in _stock_by_sku(cursor, skus).items():
+        if sku not in before:
+            movements.append((product_id, "opening", after, after, None, "import"))
+        elif after != before[sku][1]:
+            movements.append((product_id, "adjustment" if replace_quantity else "receipt", after - before[sku][1],
+                              after, None, "import"))
+    store._record_movements(cursor, movements)
+    inserted = 0
+    for row in batch:
+        if row[0] not in seen and row[0] not in before:
+            inserted += 1
+        seen.add(row[0])
+    return inserted, len(batch) - inserted
+
+
+def import_products_from_csv(filename, replace_quantity=False, batch_size=5000, progress=None):
+    # Streams a product CSV (plain or .gz) and upserts it on sku in one
+    # transaction, batch_size rows per executemany. A delivery adds to the
+    # stock on hand unless replace_quantity is set; invalid rows, and rows
+    # whose barcode belongs to another product, are skipped and listed as
+    # (line number, reason) in the returned report.
+    began = time.perf_counter()
+    report = {"filename": filename, "inserted": 0, "updated": 0, "rejected": []}
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "rt", newline="") as f, store.db_pool.transaction() as cursor:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError(f"{filename} is empty")
+        positions = {}
+        for position, label in enumerate(header):
+            column = IMPORT_ALIASES.get(label.strip().lower())
+            if column and column not in positions:
+                positions[column] = position
+        missing = [column for column in ("sku", "product_name", "price") if column not in positions]
+        if missing:
+            raise ValueError(f"Missing import column(s): {', '.join(missing)}")
+        seen = set()
+        owners, codes = {}, {}
+        batch = []
+        for row in reader:
+            if not any(value.strip() for value in row):
+                continue
+            try:
+                batch.append((reader.line_num, _parse_import_row(row, positions)))
+            except ValueError as e:
+                report["rejected"].append((reader.line_num, str(e)))
+            if len(batch) >= batch_size:
+                accepted = _claim_barcodes(cursor, batch, owners, codes, report["rejected"])
+                inserted, updated = _upsert_products(cursor, accepted, replace_quantity, seen)
+                report["inserted"] += inserted
+                report["updated"] += updated
+                batch = []
+                if progress:
+                    progress(report["inserted"] + report["updated"], None)
+        if batch:
+            accepted = _claim_barcodes(cursor, batch, owners, codes, report["rejected"])
+            inserted, updated = _upsert_products(cursor, accepted, replace_quantity, seen)
+            report["inserted"] += inserted
+            report["updated"] += updated
+    report["rejected"].sort()
+    store.product_cache.invalidate()
+    rows = report["inserted"] + report["updated"]
+    seconds = time.perf_counter() - began
+    report.update(rows=rows, seconds=seconds, rows_per_sec=rows / seconds if seconds > 0 else float(rows))
+    return report
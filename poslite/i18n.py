@@ -0,0 +1,82 @@
+import json
+import os
+import threading
+from string import Formatter
+
+# ---------------------- Translation Catalogs ----------------------
+# One JSON catalog per locale in poslite/locales (en.json, sw.json, ...),
+# each a flat key -> text map plus "language_name", the name shown in the
+# language menu. A catalog is read the first time its locale is used and
+# compiled once: texts without fields are kept ready to return and only the
+# others keep a bound str.format, so most labels cost t() one dict lookup
+# and no formatting. Keys a catalog lacks fall back to the default locale,
+# then to the key itself.
+LOCALE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales")
+DEFAULT_LOCALE = "en"
+
+
+class Catalog:
+    def __init__(self, locale, messages):
+        self.locale = locale
+        self.messages = messages
+        self.language_name = messages.get("language_name", locale)
+        self.plain = {}
+        self.templates = {}
+        for key, text in messages.items():
+            if any(field is not None for _, field, _, _ in Formatter().parse(text)):
+                self.templates[key] = text.format
+            else:
+                # "{{" escapes still need one pass to become "{"
+                self.plain[key] = text.replace("{{", "{").replace("}}", "}")
+
+
+_catalogs = {}
+_lock = threading.RLock()  # loading a locale loads its fallback under the lock
+_active = None
+
+
+def available_locales():
+    # locale -> language name, read from the catalog files without compiling
+    # the ones not loaded yet
+    locales = {}
+    for name in sorted(os.listdir(LOCALE_DIR)):
+        locale, extension = os.path.splitext(name)
+        if extension == ".json":
+            if locale in _catalogs:
+                locales[locale] = _catalogs[locale].language_name
+            else:
+                with open(os.path.join(LOCALE_DIR, name), encoding="utf-8") as f:
+                    locales[locale] = json.load(f).get("language_name", locale)
+    return locales
+
+
+def load_catalog(locale):
+    catalog = _catalogs.get(locale)
+    if catalog is None:
+        with _lock:
+            catalog = _catalogs.get(locale)
+            if catalog is None:
+                with open(os.path.join(LOCALE_DIR, locale + ".json"), encoding="utf-8") as f:
+                    messages = json.load(f)
+                if locale != DEFAULT_LOCALE:
+                    messages = {**load_catalog(DEFAULT_LOCALE).messages, **messages}
+                catalog = _catalogs[locale] = Catalog(locale, messages)
+    return catalog
+
+
+def set_locale(locale):
+    global _active
+    _active = load_catalog(locale)
+
+
+def current_locale():
+    return (_active or load_catalog(DEFAULT_LOCALE)).locale
+
+
+def t(key, **kwargs):
+    catalog = _active or load_catalog(DEFAULT_LOCALE)
+    text = catalog.plain.get(key)
+    if text is not None:
+        return text
+    template = catalog.templates.get(key)
+    return template(**kwargs) if template is not None else key
@@ -0,0 +1,138 @@
+import json
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from . import store
+from .service import GroupCommitWriter
+from .store import ConnectionPool
+from .users import AuthError
+
+# ---------------------- Offline Sale Journal ----------------------
+JOURNAL_PATH = "pos_lite_journal.db"
+# Errors that mean "try again later": the store is locked, the server is
+# unreachable or the session expired. Anything else, a server error or a
+# refused permission included, fails the entry and leaves it for review so
+# the sales queued behind it keep draining.
+TRANSIENT_ERRORS = (sqlite3.OperationalError, ConnectionError, AuthError)
+
+
+# Write-ahead journal for checkouts. record() makes a sale durable in a
+# small side database (synchronous=FULL, appends grouped into one fsync by a
+# GroupCommitWriter) and returns at once; a replayer thread then applies each
+# entry to the store, local or remote, through db_checkout with the entry's
+# uuid, so an entry applied twice after a crash is still sold once. A locked
+# or unreachable store only delays the replay, never the checkout.
+class SaleJournal:
+    REPLAY_BATCH = 100
+
+    def __init__(self, path=None, retry_interval=2.0, on_applied=None):
+        self.pool = ConnectionPool(path or JOURNAL_PATH,
+                                   pragmas=ConnectionPool.PRAGMAS + ("PRAGMA synchronous=FULL",))
+        with self.pool.transaction() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS sale_journal (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    uuid TEXT NOT NULL UNIQUE,
+                    created_at TEXT NOT NULL,
+                    payment_method TEXT,
+                    lines TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    receipt_id INTEGER,
+                    error TEXT
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_sale_journal_status ON sale_journal (status, id)")
+        self.retry_interval = retry_interval
+        self.on_applied = on_applied
+        self.writer = GroupCommitWriter(pool=self.pool)
+        self._wakeup = threading.Event()
+        self._replaying = threading.Lock()
+        self._stopping = False
+        self._thread = None
+
+    def record(self, lines, payment_method):
+        entry_uuid = str(uuid.uuid4())
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.writer.submit(self.pool.execute, "INSERT INTO sale_journal (uuid, created_at, payment_method, lines) "
+                           "VALUES (?, ?, ?, ?)", (entry_uuid, created_at, payment_method, json.dumps(lines)))
+        self._wakeup.set()
+        return entry_uuid
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="pos-journal", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.writer.stop()
+        self.pool.close_all()
+
+    @contextmanager
+    def paused(self):
+        # Holds the replayer between passes, e.g. while the store is restored
+        with self._replaying:
+            yield
+
+    def replay(self, limit=REPLAY_BATCH):
+        # One pass over pending entries in journal order. Stops at the first
+        # transient error so later sales never overtake an earlier one.
+        # Returns (applied, failed, error) with the entries' outcomes.
+        applied, failed = [], []
+        entries = self.pool.execute("SELECT uuid, created_at, payment_method, lines FROM sale_journal "
+                                    "WHERE status = 'pending' ORDER BY id LIMIT ?", (limit,)).fetchall()
+        for entry_uuid, created_at, payment_method, lines in entries:
+            try:
+                receipt_id, total, remaining = store.db_checkout([tuple(line) for line in json.loads(lines)],
+                                                                 payment_method, entry_uuid, created_at)
+            except TRANSIENT_ERRORS as e:
+                return applied, failed, e
+            except Exception as e:
+                with self.pool.transaction() as cursor:
+                    cursor.execute("UPDATE sale_journal SET status = 'failed', error = ? WHERE uuid = ?",
+                                   (f"{type(e).__name__}: {e}", entry_uuid))
+                failed.append((entry_uuid, e))
+                continue
+            with self.pool.transaction() as cursor:
+                cursor.execute("UPDATE sale_journal SET status = 'applied', receipt_id = ?, error = NULL "
+                               "WHERE uuid = ?", (receipt_id, entry_uuid))
+            applied.append((entry_uuid, receipt_id, remaining))
+        return applied, failed, None
+
+    def pending_count(self):
+        return self.pool.execute("SELECT COUNT(*) FROM sale_journal WHERE status = 'pending'").fetchone()[0]
+
+    def failed_entries(self):
+        return self.pool.execute("SELECT uuid, created_at, lines, error FROM sale_journal "
+                                 "WHERE status = 'failed' ORDER BY id").fetchall()
+
+    def retry_failed(self):
+        with self.pool.transaction() as cursor:
+            cursor.execute("UPDATE sale_journal SET status = 'pending' WHERE status = 'failed'")
+        self._wakeup.set()
+
+    def prune(self, days=30):
+        # Applied entries are only needed until the store's own backups cover them
+        cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        with self.pool.transaction() as cursor:
+            cursor.execute("DELETE FROM sale_journal WHERE status = 'applied' AND created_at < ?", (cutoff,))
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                with self._replaying:
+                    applied, failed, error = self.replay()
+            except sqlite3.Error as e:
+                applied, failed, error = [], [], e
+            self.pool.idle()
+            if (applied or failed) and self.on_applied:
+                self.on_applied(applied, failed)
+            if error is None and len(applied) + len(failed) == self.REPLAY_BATCH:
+                continue
+            self._wakeup.wait(self.retry_interval if error is not None else None)
@@ -0,0 +1,192 @@
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from . import archive, backup, csvio, receipts, store, users
+
+# ---------------------- Instrumentation ----------------------
+INSTRUMENTED_MODULES = (store, users, backup, csvio, archive, receipts)
+INSTRUMENTED_FUNCTIONS = ("backup_db", "restore_db", "export_inventory_to_csv", "export_sales_to_csv",
+                          "import_products_from_csv", "initialize_db", "archive_sales", "render_receipt")
+# Latency histogram buckets grow by 2 ** 0.25 (~19%) from 1 microsecond
+HISTOGRAM_BASE = 2 ** 0.25
+
+
+# Per-name call counts, errors, rows and a log-bucketed latency histogram,
+# so percentiles cost O(1) memory however many calls are recorded.
+class Metric:
+    __slots__ = ("calls", "errors", "rows", "total", "max", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {}
+
+    def add(self, seconds, rows=None, error=False):
+        self.calls += 1
+        self.errors += error
+        self.rows += rows or 0
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        bucket = max(0, math.ceil(math.log(max(seconds * 1e6, 1), HISTOGRAM_BASE)))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the fraction-th call, in ms
+        target = fraction * self.calls
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= target:
+                return min(HISTOGRAM_BASE ** bucket / 1000, self.max * 1000)
+        return self.max * 1000
+
+    def summary(self):
+        return {"calls": self.calls, "errors": self.errors, "rows": self.rows,
+                "mean_ms": self.total / self.calls * 1000 if self.calls else 0.0,
+                "p50_ms": self.percentile(0.5), "p95_ms": self.percentile(0.95), "p99_ms": self.percentile(0.99),
+                "max_ms": self.max * 1000}
+
+
+# Opt-in timing of db_* functions, UI callbacks and individual SQL
+# statements. Statements are timed through set_trace_callback, which fires
+# as each statement starts: a statement runs until the next one starts on
+# the same thread, its transaction() ends, its thread goes idle or the
+# instrumented call around it returns, so its time includes fetching its
+# rows but never the thread's wait for more work. Calls slower than slow_ms go to the slow log.
+class Instrumentation:
+    def __init__(self):
+        self.enabled = False
+        self.slow_ms = 100.0
+        self.slow_log = None
+        self.metrics_file = None
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._flusher = None
+
+    def record(self, name, seconds, rows=None, error=False, detail=None):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Metric()
+            metric.add(seconds, rows, error)
+        if seconds * 1000 >= self.slow_ms and self.slow_log:
+            with self._lock, open(self.slow_log, "a") as f:
+                f.write(f"{datetime.now().isoformat(timespec='milliseconds')} {seconds * 1000:.1f} ms {name}"
+                        f"{' ' + detail if detail else ''}\n")
+
+    def wrap(self, name, fn):
+        def instrumented(*args, **kwargs):
+            began = time.perf_counter()
+            error = True
+            try:
+                result = fn(*args, **kwargs)
+                error = False
+                return result
+            finally:
+                self.finish_statement()
+                elapsed = time.perf_counter() - began
+                rows = None
+                if not error and isinstance(result, list):
+                    rows = len(result)
+                elif not error and isinstance(result, dict) and isinstance(result.get("rows"), int):
+                    rows = result["rows"]
+                detail = repr(args)[:200] if elapsed * 1000 >= self.slow_ms else None
+                self.record(name, elapsed, rows, error, detail)
+        instrumented.__wrapped__ = fn
+        instrumented.__name__ = getattr(fn, "__name__", name)
+        return instrumented
+
+    def trace_statement(self, sql):
+        self.finish_statement()
+        self._local.statement = (sql, time.perf_counter())
+
+    def finish_statement(self):
+        statement = getattr(self._local, "statement", None)
+        if statement is None:
+            return
+        self._local.statement = None
+        sql, began = statement
+        self.record("sql: " + _normalize_sql(sql), time.perf_counter() - began)
+
+    def snapshot(self):
+        with self._lock:
+            return {name: metric.summary() for name, metric in sorted(self._metrics.items())}
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def flush(self):
+        if not self.metrics_file:
+            return
+        document = {"timestamp": datetime.now().isoformat(timespec="seconds"), "slow_ms": self.slow_ms,
+                    "metrics": self.snapshot(), "pool": store.db_stats()}
+        scratch = self.metrics_file + ".tmp"
+        with open(scratch, "w") as f:
+            json.dump(document, f, indent=2)
+        os.replace(scratch, self.metrics_file)
+
+    def _flush_periodically(self, interval):
+        while self.enabled:
+            time.sleep(interval)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+
+instrumentation = Instrumentation()
+
+
+def _normalize_sql(sql):
+    # One metric per statement shape. The trace callback sees statements with
+    # their parameters expanded, so literals go back to ? (which also keeps
+    # names and amounts out of the metrics) and IN lists of any length fold.
+    sql = " ".join(sql.split())
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", "?", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?...)", sql)
+    return sql[:200]
+
+
+def enable_instrumentation(metrics_file=None, flush_interval=30.0, slow_ms=100.0, slow_log=None, ui_class=None,
+                           ui_callbacks=()):
+    # Wraps every db_* function, the slow file operations and the
+    # ui_callbacks methods of ui_class, on their modules and as re-exported
+    # from the package, and traces statements on every pooled connection,
+    # including ones opened later.
+    if instrumentation.enabled:
+        return instrumentation
+    instrumentation.enabled = True
+    instrumentation.metrics_file = metrics_file
+    instrumentation.slow_ms = slow_ms
+    instrumentation.slow_log = slow_log
+    package = sys.modules[__package__]
+    for module in INSTRUMENTED_MODULES:
+        for name, fn in list(vars(module).items()):
+            if callable(fn) and (name.startswith("db_") or name in INSTRUMENTED_FUNCTIONS) and name != "db_pool":
+                wrapped = instrumentation.wrap(name, fn)
+                setattr(module, name, wrapped)
+                if getattr(package, name, None) is fn:
+                    setattr(package, name, wrapped)
+    for name in ui_callbacks:
+        setattr(ui_class, name, instrumentation.wrap("ui: " + name, getattr(ui_class, name)))
+    store.ConnectionPool.trace_callback = instrumentation.trace_statement
+    store.ConnectionPool.statement_done = instrumentation.finish_statement
+    for connection in list(store.db_pool._connections):
+        connection.set_trace_callback(instrumentation.trace_statement)
+    if metrics_file:
+        instrumentation._flusher = threading.Thread(target=instrumentation._flush_periodically,
+                                                    args=(flush_interval,), name="pos-metrics", daemon=True)
+        instrumentation._flusher.start()
+    return instrumentation
@@ -0,0 +1,371 @@
+import base64
+import html
+import json
+import mimetypes
+import os
+import queue
+import socket
+import sqlite3
+import threading
+
+from . import i18n, store
+from .i18n import t
+
+# ---------------------- Receipt Rendering ----------------------
+# A receipt is rendered from templates compiled once per paper width and
+# locale: the translated labels, rules and column widths are baked into
+# bound str.format calls, so rendering a receipt is one format per line.
+# The store header (name, address lines, footer, logo) comes from a JSON
+# file next to the store (pos_lite.db -> pos_lite_receipt.json) and is
+# rendered once per output format, until that file changes.
+RECEIPT_FORMATS = ("text", "escpos", "html", "pdf")
+EXTENSIONS = {"text": ".txt", "escpos": ".bin", "html": ".html", "pdf": ".pdf"}
+DEFAULT_SETTINGS = {
+    "name": "POS Lite",
+    "lines": [],  # address, phone, tax number...
+    "footer": None,  # None prints the catalog's receipt_thanks
+    "width": 48,  # characters per line: 48 on 80 mm paper, 32 on 58 mm
+    "logo": None,  # image shown on HTML receipts, relative to the settings file
+    "codepage": 19,  # ESC t page for the printer, 19 is PC858 (Latin-1 with the euro)
+    "encoding": "cp858",
+}
+
+# ESC/POS commands
+ESC_INIT = b"\x1b@"
+ESC_CENTER = b"\x1ba\x01"
+ESC_LEFT = b"\x1ba\x00"
+ESC_BOLD_ON = b"\x1bE\x01"
+ESC_BOLD_OFF = b"\x1bE\x00"
+ESC_DOUBLE_ON = b"\x1d!\x11"
+ESC_DOUBLE_OFF = b"\x1d!\x00"
+ESC_FEED_CUT = b"\x1bd\x04\x1dV\x01"  # feed four lines, partial cut
+
+_settings = (None, None, None)  # (path, mtime, settings)
+_headers = {}  # (format, width, locale) -> rendered header and footer of the current settings
+_templates = {}  # (width, locale) -> ReceiptTemplate, ("html", width, locale) -> HtmlTemplate
+
+
+def settings_path():
+    # pos_lite.db -> pos_lite_receipt.json, so each store prints its own header
+    return os.path.splitext(store.db_pool.path)[0] + "_receipt.json"
+
+
+def load_settings():
+    # The receipt settings, reread only when the file's mtime moves; the
+    # cached headers go with the settings they were rendered from.
+    global _settings
+    path = settings_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if _settings[:2] != (path, mtime):
+        settings = dict(DEFAULT_SETTINGS)
+        if mtime is not None:
+            with open(path, encoding="utf-8") as f:
+                settings.update(json.load(f))
+        _headers.clear()
+        _settings = (path, mtime, settings)
+    return _settings[2]
+
+
+def _literal(text):
+    # A translated label baked into a format string
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+class ReceiptTemplate:
+    # The body of a receipt, between the store header and footer, as plain
+    # text `width` characters wide. Every piece is a bound str.format.
+    def __init__(self, width):
+        rule = "-" * width
+        self.width = width
+        self.copy = t("receipt_copy").center(width).rstrip() + "\n"
+        self.head = (_literal(t("receipt_number")) + " {number:06d}\n{created_at}\n" + rule + "\n").format
+        self.line = ("{name:.%d}\n  {quantity:>4} x {price:>9.2f}{total:>%d.2f}\n" % (width, width - 18)).format
+        total_label = _literal(t("receipt_total"))
+        self.total = (rule + "\n" + total_label + "{total:>%d.2f}\n" % (width - len(total_label))).format
+        self.tail = (_literal(t("receipt_paid")) + " {payment_method}\n" +
+                     _literal(t("receipt_items")) + " {item_count}\n").format
+
+    def sections(self, receipt, copy=False):
+        # (text, bold) pieces: the copy marker, the lines, the total, the rest
+        body = self.head(number=receipt.id, created_at=receipt.created_at) + "".join(
+            self.line(name=line.product_name, quantity=line.quantity, price=line.total / line.quantity,
+                      total=line.total) for line in receipt.lines)
+        sections = [(self.copy, True)] if copy else []
+        sections += [(body, False), (self.total(total=receipt.total), True),
+                     (self.tail(payment_method=receipt.payment_method or "-", item_count=receipt.item_count), False)]
+        return sections
+
+
+def receipt_template(width):
+    key = (width, i18n.current_locale())
+    template = _templates.get(key)
+    if template is None:
+        template = _templates[key] = ReceiptTemplate(width)
+    return template
+
+
+HTML_STYLE = ("body{font-family:monospace;max-width:%dch;margin:1em auto}header,footer{text-align:center}"
+              "header img{max-width:100%%}h1{font-size:1.4em;margin:.2em 0}table{width:100%%;border-collapse:collapse}"
+              "td.n{text-align:right}tr.total td{font-weight:bold;border-top:1px dashed}")
+
+
+class HtmlTemplate:
+    def __init__(self, width):
+        style = _literal(HTML_STYLE % width)
+        self.page = ('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>' + _literal(t("receipt_number")) +
+                     " {number:06d}</title><style>" + style + "</style></head><body>\n{header}{copy}<p>" +
+                     _literal(t("receipt_number")) + " {number:06d}<br>{created_at}</p>\n<table>\n{lines}"
+                     '<tr class="total"><td colspan="3">' + _literal(t("receipt_total")) +
+                     '</td><td class="n">{total:.2f}</td></tr>\n</table>\n<p>' + _literal(t("receipt_paid")) +
+                     " {payment_method}<br>" + _literal(t("receipt_items")) +
+                     " {item_count}</p>\n{footer}</body></html>\n").format
+        self.line = ('<tr><td>{name}</td><td class="n">{quantity}</td><td class="n">{price:.2f}</td>'
+                     '<td class="n">{total:.2f}</td></tr>\n').format
+        self.copy = "<p><strong>" + html.escape(t("receipt_copy")) + "</strong></p>\n"
+
+
+def html_template(width):
+    key = ("html", width, i18n.current_locale())
+    template = _templates.get(key)
+    if template is None:
+        template = _templates[key] = HtmlTemplate(width)
+    return template
+
+
+def _header(format, width):
+    # The store header and footer rendered for one output format
+    key = (format, width, i18n.current_locale())  # the default footer is translated
+    cached = _headers.get(key)
+    if cached is not None:
+        return cached
+    settings = load_settings()
+    footer = settings["footer"] if settings["footer"] is not None else t("receipt_thanks")
+    if format == "html":
+        logo = ""
+        if settings["logo"]:
+            # Embedded, so the page is one self-contained file
+            path = os.path.join(os.path.dirname(settings_path()), settings["logo"])
+            with open(path, "rb") as f:
+                data = base64.b64encode(f.read()).decode("ascii")
+            logo = f'<img src="data:{mimetypes.guess_type(path)[0] or "image/png"};base64,{data}" alt="">'
+        header = ("<header>" + logo + "<h1>" + html.escape(settings["name"]) + "</h1>" +
+                  "".join(f"<div>{html.escape(line)}</div>" for line in settings["lines"]) + "</header>\n")
+        cached = (header, "<footer><p>" + html.escape(footer) + "</p></footer>\n")
+    elif format == "escpos":
+        encoding = settings["encoding"]
+        # Double width halves the characters that fit on a line
+        name = settings["name"][:width // 2].encode(encoding, "replace")
+        lines = "".join(line[:width] + "\n" for line in settings["lines"]).encode(encoding, "replace")
+        cached = (ESC_INIT + b"\x1bt" + bytes([settings["codepage"]]) + ESC_CENTER + ESC_BOLD_ON + ESC_DOUBLE_ON +
+                  name + b"\n" + ESC_DOUBLE_OFF + ESC_BOLD_OFF + lines + ESC_LEFT + b"\n",
+                  ESC_CENTER + ("\n" + footer[:width] + "\n").encode(encoding, "replace") + ESC_LEFT + ESC_FEED_CUT)
+    else:
+        # (text, bold) pieces, as for ReceiptTemplate.sections
+        cached = ([(settings["name"][:width].center(width).rstrip() + "\n", True),
+                   ("".join(line[:width].center(width).rstrip() + "\n" for line in settings["lines"]) + "\n", False)],
+                  [("\n" + footer[:width].center(width).rstrip() + "\n", False)])
+    _headers[key] = cached
+    return cached
+
+
+def _pdf(sections, width):
+    # A single-page PDF in Courier, as tall as the receipt, written by hand:
+    # the fixed-width text needs no layout engine.
+    size, leading, margin = 8, 10, 14
+    lines = [(line, bold) for text, bold in sections for line in text.rstrip("\n").split("\n")]
+    page_width = round(width * size * 0.6 + 2 * margin)
+    page_height = len(lines) * leading + 2 * margin
+    content = [f"BT {leading} TL {margin} {page_height - margin - size + leading} Td"]
+    for line, bold in lines:
+        text = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        content.append(f"/F{2 if bold else 1} {size} Tf ({text}) '")
+    content.append("ET")
+    stream = "\n".join(content).encode("cp1252", "replace")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width} {page_height}] "
+        f"/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>".encode("ascii"),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def render_receipt(receipt, format="text", copy=False, width=None):
+    # A store.Receipt as str (text, html) or bytes (escpos, pdf); copy marks
+    # a reprint.
+    if format not in RECEIPT_FORMATS:
+        raise ValueError(f"Unknown receipt format {format!r}")
+    width = width or load_settings()["width"]
+    header, footer = _header(format, width)
+    if format == "html":
+        template = html_template(width)
+        lines = "".join(template.line(name=html.escape(line.product_name), quantity=line.quantity,
+                                      price=line.total / line.quantity, total=line.total) for line in receipt.lines)
+        return template.page(number=receipt.id, created_at=receipt.created_at, lines=lines, total=receipt.total,
+                             payment_method=html.escape(receipt.payment_method or "-"),
+                             item_count=receipt.item_count, header=header, footer=footer,
+                             copy=template.copy if copy else "")
+    sections = receipt_template(width).sections(receipt, copy)
+    if format == "escpos":
+        encoding = load_settings()["encoding"]
+        return header + b"".join(ESC_BOLD_ON + text.encode(encoding, "replace") + ESC_BOLD_OFF if bold
+                                 else text.encode(encoding, "replace") for text, bold in sections) + footer
+    sections = header + sections + footer
+    if format == "pdf":
+        return _pdf(sections, width)
+    return "".join(text for text, bold in sections)
+
+
+def receipt_file_name(receipt_id, format, copy=False):
+    return f"receipt_{receipt_id:06d}{'_copy' if copy else ''}{EXTENSIONS[format]}"
+
+
+def save_receipt(receipt, path, copy=False):
+    # Writes a receipt to a file in the format its extension names (.pdf,
+    # .html, .txt, .bin for ESC/POS); returns the format
+    extension = os.path.splitext(path)[1].lower()
+    format = {".htm": "html"}.get(extension) or next(
+        (name for name, known in EXTENSIONS.items() if known == extension), "pdf")
+    data = render_receipt(receipt, format, copy)
+    with open(path, "wb") as f:
+        f.write(data.encode("utf-8") if isinstance(data, str) else data)
+    return format
+
+
+# ---------------------- Printers ----------------------
+# A printer takes the rendered bytes of one receipt. format is what it is
+# sent: escpos for thermal printers, or any RECEIPT_FORMATS for a folder.
+PRINTER = None  # the till's printer, set by main.py --printer
+
+
+class FilePrinter:
+    # A printer reached through a path: a device node such as /dev/usb/lp0
+    # for a USB thermal printer, a plain file every job is appended to, or a
+    # directory that gets one file per receipt. The last two make a fake
+    # printer for testing and training.
+    def __init__(self, path, format="escpos"):
+        if format not in RECEIPT_FORMATS:
+            raise ValueError(f"Unknown receipt format {format!r}")
+        self.path = path
+        self.format = format
+
+    def send(self, data, receipt_id, copy=False):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if os.path.isdir(self.path):
+            with open(os.path.join(self.path, receipt_file_name(receipt_id, self.format, copy)), "wb") as f:
+                f.write(data)
+        else:
+            with open(self.path, "ab") as f:
+                f.write(data)
+
+
+class NetworkPrinter:
+    # An Ethernet/Wi-Fi thermal printer taking raw ESC/POS on port 9100
+    format = "escpos"
+
+    def __init__(self, host, port=9100, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def send(self, data, receipt_id, copy=False):
+        with socket.create_connection((self.host, self.port), self.timeout) as connection:
+            connection.sendall(data)
+
+
+def make_printer(target, format="escpos"):
+    # "tcp://host[:port]" is a network printer, anything else a FilePrinter path
+    if target.startswith("tcp://"):
+        host, _, port = target[len("tcp://"):].partition(":")
+        return NetworkPrinter(host, int(port or 9100))
+    return FilePrinter(target, format)
+
+
+# ---------------------- Print Spool ----------------------
+# Errors that mean the printer (or the store) is only unavailable for now:
+# offline, out of paper, lid open, database locked.
+PRINT_RETRY_ERRORS = (OSError, sqlite3.OperationalError)
+
+
+# Receipts to print wait in a queue and one worker thread fetches, renders
+# and sends them in order, so the till hands over a receipt number and
+# carries on however slow, or jammed, the printer is. A job the printer
+# refuses is retried every retry_interval seconds and holds back the ones
+# behind it, so receipts still come out in sale order. on_error(receipt_id,
+# error, retrying) is called from the worker thread: retrying is True while
+# the job waits for the printer, False when it was given up (a receipt that
+# does not exist, or retries ran out), and error is None once a job that
+# had to wait is printed after all.
+class PrintSpool:
+    def __init__(self, printer, retry_interval=5.0, retries=60, on_error=None):
+        self.printer = printer
+        self.retry_interval = retry_interval
+        self.retries = retries
+        self.on_error = on_error
+        self.printed = 0
+        self._jobs = queue.Queue()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="pos-print-spool", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        # Jobs still queued after timeout are dropped with the process
+        self._stopping.set()
+        self._jobs.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, receipt_id, copy=False):
+        self._jobs.put((receipt_id, copy))
+
+    def pending(self):
+        return self._jobs.qsize()
+
+    def print_receipt(self, receipt_id, copy=False):
+        # One job, synchronously; what the worker runs for each job
+        receipt = store.db_fetch_receipt(receipt_id)
+        if receipt is None:
+            raise LookupError(f"Receipt {receipt_id} not found")
+        self.printer.send(render_receipt(receipt, self.printer.format, copy), receipt_id, copy)
+        self.printed += 1
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            for attempt in range(self.retries + 1):
+                try:
+                    self.print_receipt(*job)
+                    if attempt and self.on_error:
+                        self.on_error(job[0], None, False)
+                    break
+                except PRINT_RETRY_ERRORS as e:
+                    retrying = attempt < self.retries and not self._stopping.is_set()
+                    if self.on_error:
+                        self.on_error(job[0], e, retrying)
+                    if not retrying or self._stopping.wait(self.retry_interval):
+                        break
+                except Exception as e:
+                    if self.on_error:
+                        self.on_error(job[0], e, False)
+                    break
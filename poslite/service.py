@@ -0,0 +1,512 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from . import store, users
+from .store import (
+    InsufficientStockError, PeriodTotal, Product, ProductNotFoundError, Receipt, ReceiptLine, ReorderSuggestion, Sale,
+    StockLevel, StockMovement, StockReconciliation,
+)
+from .users import AuthError, LoginThrottled, Session
+
+# ---------------------- Headless Service ----------------------
+# Serialises writes from every HTTP handler through one thread. It takes
+# whatever requests are queued (up to max_batch) and runs them in a single
+# transaction, each under its own SAVEPOINT so a failed sale does not undo
+# its neighbours. Many tills then cost one commit per batch rather than one
+# per sale, and only this thread ever takes the write lock.
+class GroupCommitWriter:
+    def __init__(self, max_batch=64, max_wait=0.0, pool=None):
+        self.pool = pool or store.db_pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.batches = 0
+        self.writes = 0
+        self._thread = threading.Thread(target=self._run, name="pos-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args):
+        # Blocks the calling handler until its write has been committed
+        done = threading.Event()
+        outcome = {}
+        self.requests.put((fn, args, done, outcome))
+        done.wait()
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+    def stop(self):
+        self.requests.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {"batches": self.batches, "writes": self.writes,
+                "writes_per_commit": self.writes / self.batches if self.batches else 0.0}
+
+    def _run(self):
+        while True:
+            self.pool.idle()
+            request = self.requests.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    request = self.requests.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)
+                    break
+                batch.append(request)
+            self._commit(batch)
+
+    def _commit(self, batch):
+        try:
+            with self.pool.transaction() as cursor:
+                for fn, args, done, outcome in batch:
+                    cursor.execute("SAVEPOINT request")
+                    try:
+                        outcome["result"] = fn(*args)
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO request")
+                        outcome["error"] = e
+                    cursor.execute("RELEASE request")
+        except Exception as e:
+            for fn, args, done, outcome in batch:
+                outcome.pop("result", None)
+                outcome["error"] = e
+        self.batches += 1
+        self.writes += len(batch)
+        for fn, args, done, outcome in batch:
+            done.set()
+
+
+def _json_rows(rows):
+    return [list(row) for row in rows]
+
+
+def _query_int(query, name, default=None):
+    value = query.get(name, [None])[0]
+    return default if value in (None, "") else int(value)
+
+
+# (method, path prefix) -> (handler, role). The handler gets the request
+# (server, query, body, path argument); role None means no login needed.
+def _service_routes():
+    def product_body(body):
+        return body["name"], int(body["quantity"]), float(body["price"]), int(body.get("threshold", 0))
+
+    def sell(request):
+        body = request.body
+        total, remaining = request.write(store.db_sell, int(body["product_id"]), int(body["quantity"]),
+                                         body.get("payment_method"))
+        return {"total": total, "remaining": remaining}
+
+    def checkout(request):
+        body = request.body
+        lines = [(int(product_id), int(quantity)) for product_id, quantity in body["lines"]]
+        receipt_id, total, remaining = request.write(store.db_checkout, lines, body.get("payment_method"),
+                                                     body.get("uuid"), body.get("sale_date"))
+        return {"receipt_id": receipt_id, "total": total, "remaining": remaining}
+
+    def report_page(request):
+        query = request.query
+        after = None
+        if query.get("after_date"):
+            after = (query["after_date"][0], _query_int(query, "after_id", 0))
+        return _json_rows(store.db_fetch_sales_report_page(query["start"][0], query.get("end", [None])[0], after,
+                                                           _query_int(query, "limit", 200),
+                                                           bool(_query_int(query, "reverse", 0))))
+
+    def product(request):
+        row = store.db_fetch_product(int(request.arg))
+        if row is None:
+            raise ProductNotFoundError(f"Product {request.arg} not found")
+        return list(row)
+
+    def product_lookup(request):
+        # ?code= is a scanned barcode or a SKU, ?name= an exact product name
+        query = request.query
+        if "code" in query:
+            key = query["code"][0]
+            row = store.db_fetch_product_by_code(key)
+        else:
+            key = query["name"][0]
+            row = store.db_fetch_product_by_name(key)
+        if row is None:
+            raise ProductNotFoundError(f"Product {key} not found")
+        return list(row)
+
+    def by_period(request):
+        query = request.query
+        bucket, rows = store.db_fetch_sales_by_period(query["start"][0], query.get("end", [None])[0],
+                                                      query.get("bucket", [None])[0])
+        return {"bucket": bucket, "rows": _json_rows(rows)}
+
+    def levels(request):
+        rows, others = store.db_fetch_inventory_levels(_query_int(request.query, "top", 20))
+        return {"rows": _json_rows(rows), "others": list(others)}
+
+    def reconcile(request):
+        row = store.db_reconcile_stock(int(request.arg))
+        if row is None:
+            raise ProductNotFoundError(f"Product {request.arg} not found")
+        return list(row)
+
+    def receipt(request):
+        row = store.db_fetch_receipt(int(request.arg))
+        return None if row is None else [*row[:-1], _json_rows(row.lines)]
+
+    def reorder(request):
+        query = request.query
+        return _json_rows(store.db_fetch_reorder_suggestions(_query_int(query, "days", 28),
+                                                             _query_int(query, "lead_days", 7),
+                                                             _query_int(query, "cover_days", 14),
+                                                             _query_int(query, "limit", 100)))
+
+    return {
+        ("GET", "/inventory/levels"): (levels, "cashier"),
+        ("GET", "/inventory"): (lambda request: _json_rows(store.db_fetch_inventory_page(
+            _query_int(request.query, "after_id"), _query_int(request.query, "limit", 200),
+            bool(_query_int(request.query, "reverse", 0)))), "cashier"),
+        ("GET", "/products/search"): (lambda request: _json_rows(store.db_search_products(
+            request.query.get("q", [""])[0], _query_int(request.query, "limit", 10))), "cashier"),
+        ("GET", "/products/"): (product, "cashier"),
+        ("GET", "/products"): (product_lookup, "cashier"),
+        ("POST", "/products"): (lambda request: {"id": request.write(store.db_save_product,
+                                                                     *product_body(request.body))}, "admin"),
+        ("PUT", "/products/"): (lambda request: request.write(store.db_update_product, int(request.arg),
+                                                               *product_body(request.body)), "admin"),
+        ("DELETE", "/products/"): (lambda request: request.write(store.db_delete_product, int(request.arg)),
+                                   "admin"),
+        ("GET", "/stock/movements/"): (lambda request: _json_rows(store.db_fetch_stock_movements(
+            int(request.arg), _query_int(request.query, "before_id"), _query_int(request.query, "limit", 50))),
+                                       "cashier"),
+        ("GET", "/stock/reconcile/"): (reconcile, "cashier"),
+        ("GET", "/stock/reorder"): (reorder, "cashier"),
+        ("POST", "/stock/receive"): (lambda request: {"balance": request.write(
+            store.db_receive_stock, int(request.body["product_id"]), int(request.body["quantity"]),
+            request.body.get("note"))}, "admin"),
+        ("POST", "/stock/adjust"): (lambda request: {"difference": request.write(
+            store.db_adjust_stock, int(request.body["product_id"]), int(request.body["counted"]),
+            request.body.get("note"))}, "admin"),
+        ("POST", "/sell"): (sell, "cashier"),
+        ("POST", "/checkout"): (checkout, "cashier"),
+        ("GET", "/receipts/"): (receipt, "cashier"),
+        ("GET", "/sales/recent"): (lambda request: _json_rows(store.db_fetch_recent_sales(
+            _query_int(request.query, "limit", 10))), "cashier"),
+        ("GET", "/reports/sales"): (report_page, "cashier"),
+        ("GET", "/reports/summary"): (lambda request: store.db_fetch_sales_summary(
+            request.query["start"][0], request.query.get("end", [None])[0]), "cashier"),
+        ("GET", "/reports/by-period"): (by_period, "cashier"),
+        ("GET", "/dashboard"): (lambda request: store.db_fetch_dashboard_stats(request.query.get("day", [None])[0]),
+                                "cashier"),
+        ("GET", "/stats"): (lambda request: {**store.db_stats(), **request.server.writer.stats()}, "cashier"),
+    }
+
+
+# Exceptions map to a status code; the client rebuilds them from the name.
+SERVICE_ERRORS = (
+    (LoginThrottled, 429),
+    (AuthError, 401),
+    (PermissionError, 403),
+    (ProductNotFoundError, 404),
+    (InsufficientStockError, 409),
+    (KeyError, 400),
+    (ValueError, 400),
+)
+
+
+def _make_service_handler():
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import urlsplit, parse_qs
+
+    class ServiceHandler(BaseHTTPRequestHandler):
+        # HTTP/1.1 keeps each till's connection (and its SQLite reader) open;
+        # without TCP_NODELAY the split header/body writes wait on delayed ACKs.
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+        def do_PUT(self):
+            self._dispatch("PUT")
+
+        def do_DELETE(self):
+            self._dispatch("DELETE")
+
+        def finish(self):
+            super().finish()
+            store.db_pool.release()
+
+        def log_message(self, format, *args):
+            if self.server.verbose:
+                super().log_message(format, *args)
+
+        def write(self, fn, *args):
+            return self.server.writer.submit(fn, *args)
+
+        def _dispatch(self, method):
+            url = urlsplit(self.path)
+            self.query = parse_qs(url.query)
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                self.body = json.loads(self.rfile.read(length)) if length else {}
+                if method == "POST" and url.path == "/login":
+                    session = users.auth.login(self.body["username"], self.body["password"])
+                    return self._reply(200, {"token": session.token, "username": session.username,
+                                             "role": session.role})
+                for (route_method, prefix), (handler, role) in self.server.routes.items():
+                    if route_method == method and (url.path == prefix or
+                                                   (prefix.endswith("/") and url.path.startswith(prefix))):
+                        self.arg = url.path[len(prefix):]
+                        self._authorize(role)
+                        return self._reply(200, handler(self))
+                self._reply(404, {"error": "NotFound", "message": url.path})
+            except Exception as e:
+                status = next((code for kind, code in SERVICE_ERRORS if isinstance(e, kind)), 500)
+                payload = {"error": type(e).__name__, "message": str(e)}
+                if isinstance(e, InsufficientStockError):
+                    payload.update(product_id=e.product_id, available=e.available, requested=e.requested)
+                if isinstance(e, LoginThrottled):
+                    payload.update(username=e.username, retry_after=e.retry_after)
+                self._reply(status, payload)
+
+        def _authorize(self, role):
+            header = self.headers.get("Authorization", "")
+            session = users.auth.session(header[len("Bearer "):]) if header.startswith("Bearer ") else None
+            if session is None:
+                raise AuthError("Login required")
+            if role == "admin" and not session.is_admin:
+                raise PermissionError("Administrator role required")
+
+        def _reply(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return ServiceHandler
+
+
+def make_server(host="127.0.0.1", port=8765, max_batch=64, verbose=False):
+    # Local JSON API over the db_* functions for several tills sharing one
+    # store; reads run on the handler threads, writes go through the
+    # GroupCommitWriter. Call serve_forever() on the result.
+    from http.server import ThreadingHTTPServer
+    server = ThreadingHTTPServer((host, port), _make_service_handler())
+    server.daemon_threads = True
+    server.routes = _service_routes()
+    server.writer = GroupCommitWriter(max_batch=max_batch)
+    server.verbose = verbose
+    return server
+
+
+# Client for make_server with the same signatures as the db_* functions it
+# replaces; use_remote_store() points the Tk client at a server this way.
+# Each thread keeps its own keep-alive connection.
+class RemoteStore:
+    FUNCTIONS = ("db_fetch_inventory_page", "db_fetch_product", "db_fetch_product_by_name", "db_fetch_product_by_code",
+                 "db_search_products", "db_save_product", "db_update_product", "db_delete_product", "db_sell",
+                 "db_checkout", "db_fetch_recent_sales", "db_fetch_sales_report_page", "db_fetch_sales_summary",
+                 "db_fetch_sales_by_period", "db_fetch_inventory_levels", "db_fetch_dashboard_stats", "db_receive_stock",
+                 "db_adjust_stock", "db_fetch_stock_movements", "db_reconcile_stock", "db_fetch_reorder_suggestions",
+                 "db_fetch_receipt")
+    ERRORS = {"AuthError": AuthError, "PermissionError": PermissionError, "ProductNotFoundError": ProductNotFoundError,
+              "KeyError": ValueError, "ValueError": ValueError, "OperationalError": sqlite3.OperationalError}
+    IDEMPOTENT = ("GET", "PUT", "DELETE")
+
+    def __init__(self, url, timeout=30):
+        from urllib.parse import urlsplit
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.token = None
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, **query):
+        import http.client
+        from urllib.parse import urlencode
+        query = {key: value for key, value in query.items() if value is not None}
+        if query:
+            path += "?" + urlencode(query)
+        headers = {"Content-Type": "application/json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        data = json.dumps(body).encode() if body is not None else None
+        for attempt in range(2):
+            connection = getattr(self._local, "connection", None)
+            reused = connection is not None and not self._dropped(connection)
+            if not reused:
+                if connection is not None:
+                    connection.close()
+                connection = self._local.connection = http.client.HTTPConnection(self.host, self.port,
+                                                                                 timeout=self.timeout)
+            sent = False
+            try:
+                connection.request(method, path, body=data, headers=headers)
+                sent = True
+                response = connection.getresponse()
+                payload = json.loads(response.read() or b"null")
+                break
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                self._local.connection = None
+                # Resend only what cannot be applied twice: a request a stale
+                # keep-alive connection refused outright, or an idempotent one
+                # the server closed on without answering. A write that may have
+                # reached the server is reported instead; /checkout carries the
+                # sale's uuid, so the journal's later retry still sells it once.
+                stale = reused and isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError,
+                                                  BrokenPipeError))
+                if attempt or not (stale and (not sent or method in self.IDEMPOTENT)):
+                    raise ConnectionError(f"POS Lite service unreachable: {e}") from e
+        if response.status >= 400:
+            raise self._error(payload)
+        return payload
+
+    @staticmethod
+    def _dropped(connection):
+        # An idle keep-alive socket the server has closed polls readable (EOF)
+        import select
+        return connection.sock is None or bool(select.select([connection.sock], [], [], 0)[0])
+
+    def _error(self, payload):
+        kind, message = payload.get("error"), payload.get("message", "")
+        if kind == "InsufficientStockError":
+            return InsufficientStockError(payload["product_id"], payload["available"], payload["requested"])
+        if kind == "LoginThrottled":
+            return LoginThrottled(payload["username"], payload["retry_after"])
+        return self.ERRORS.get(kind, RuntimeError)(message)
+
+    def login(self, username, password):
+        reply = self.request("POST", "/login", {"username": username, "password": password})
+        self.token = reply["token"]
+        session = Session(reply["username"], reply["role"], b"")
+        session.token = reply["token"]
+        return session
+
+    def start_session(self, username, role, verifier=b""):
+        return Session(username, role, verifier)
+
+    def db_fetch_inventory_page(self, after_id=None, limit=200, reverse=False):
+        return [Product(*row) for row in self.request("GET", "/inventory", after_id=after_id, limit=limit,
+                                                      reverse=int(reverse))]
+
+    def db_fetch_product(self, product_id):
+        try:
+            return Product(*self.request("GET", f"/products/{int(product_id)}"))
+        except ProductNotFoundError:
+            return None
+
+    def db_fetch_product_by_name(self, name):
+        try:
+            return Product(*self.request("GET", "/products", name=name))
+        except ProductNotFoundError:
+            return None
+
+    def db_fetch_product_by_code(self, code):
+        try:
+            return Product(*self.request("GET", "/products", code=code))
+        except ProductNotFoundError:
+            return None
+
+    def db_search_products(self, query, limit=10):
+        return [Product(*row) for row in self.request("GET", "/products/search", q=query, limit=limit)]
+
+    def db_save_product(self, name, quantity, price, threshold):
+        return self.request("POST", "/products", {"name": name, "quantity": quantity, "price": price,
+                                                  "threshold": threshold})["id"]
+
+    def db_update_product(self, item_id, name, quantity, price, threshold):
+        self.request("PUT", f"/products/{int(item_id)}", {"name": name, "quantity": quantity, "price": price,
+                                                          "threshold": threshold})
+
+    def db_delete_product(self, item_id):
+        self.request("DELETE", f"/products/{int(item_id)}")
+
+    def db_sell(self, product_id, quantity, payment_method):
+        reply = self.request("POST", "/sell", {"product_id": product_id, "quantity": quantity,
+                                               "payment_method": payment_method})
+        return reply["total"], reply["remaining"]
+
+    def db_checkout(self, lines, payment_method, sale_uuid=None, sale_date=None):
+        reply = self.request("POST", "/checkout", {"lines": list(lines), "payment_method": payment_method,
+                                                   "uuid": sale_uuid, "sale_date": sale_date})
+        return reply["receipt_id"], reply["total"], {int(key): value for key, value in reply["remaining"].items()}
+
+    def db_fetch_recent_sales(self, limit=10):
+        return [Sale(*row) for row in self.request("GET", "/sales/recent", limit=limit)]
+
+    def db_fetch_receipt(self, receipt_id):
+        reply = self.request("GET", f"/receipts/{int(receipt_id)}")
+        return None if reply is None else Receipt(*reply[:-1], [ReceiptLine(*line) for line in reply[-1]])
+
+    def db_fetch_sales_report_page(self, start_date, end_date, after=None, limit=200, reverse=False):
+        after_date, after_id = after or (None, None)
+        return [Sale(*row) for row in self.request("GET", "/reports/sales", start=start_date, end=end_date,
+                                                   after_date=after_date, after_id=after_id, limit=limit,
+                                                   reverse=int(reverse))]
+
+    def db_fetch_sales_summary(self, start_date, end_date):
+        return self.request("GET", "/reports/summary", start=start_date, end=end_date)
+
+    def db_fetch_sales_by_period(self, start_date, end_date, bucket=None):
+        reply = self.request("GET", "/reports/by-period", start=start_date, end=end_date, bucket=bucket)
+        return reply["bucket"], [PeriodTotal(*row) for row in reply["rows"]]
+
+    def db_fetch_inventory_levels(self, top=20):
+        reply = self.request("GET", "/inventory/levels", top=top)
+        return [StockLevel(*row) for row in reply["rows"]], tuple(reply["others"])
+
+    def db_fetch_dashboard_stats(self, day=None):
+        return self.request("GET", "/dashboard", day=day)
+
+    def db_receive_stock(self, product_id, quantity, note=None):
+        return self.request("POST", "/stock/receive", {"product_id": product_id, "quantity": quantity,
+                                                       "note": note})["balance"]
+
+    def db_adjust_stock(self, product_id, counted, note=None):
+        return self.request("POST", "/stock/adjust", {"product_id": product_id, "counted": counted,
+                                                      "note": note})["difference"]
+
+    def db_fetch_stock_movements(self, product_id, before_id=None, limit=50):
+        return [StockMovement(*row) for row in self.request("GET", f"/stock/movements/{int(product_id)}",
+                                                            before_id=before_id, limit=limit)]
+
+    def db_reconcile_stock(self, product_id):
+        try:
+            return StockReconciliation(*self.request("GET", f"/stock/reconcile/{int(product_id)}"))
+        except ProductNotFoundError:
+            return None
+
+    def db_fetch_reorder_suggestions(self, days=28, lead_days=7, cover_days=14, limit=100, today=None):
+        return [ReorderSuggestion(*row) for row in self.request("GET", "/stock/reorder", days=days,
+                                                                lead_days=lead_days, cover_days=cover_days,
+                                                                limit=limit)]
+
+
+remote_store = None
+
+
+def use_remote_store(url):
+    # Rebinds the store module's db_* functions (and users.auth) to a
+    # RemoteStore, so the unchanged Tk client runs against a shared server.
+    global remote_store
+    remote_store = RemoteStore(url)
+    for name in RemoteStore.FUNCTIONS:
+        setattr(store, name, getattr(remote_store, name))
+    users.auth = remote_store
+    return remote_store
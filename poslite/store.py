@@ -0,0 +1,1155 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+
+# ---------------------- Database Connection Pool ----------------------
+DB_PATH = "pos_lite.db"
+
+
+# One long-lived connection per thread, opened with WAL journaling and tuned
+# pragmas. Writes go through transaction() so each logical operation costs a
+# single commit; open_count/commit_count show how many file opens and fsyncs a
+# workflow (e.g. one sale) really costs.
+class ConnectionPool:
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA cache_size=-8000",  # ~8 MB page cache
+        "PRAGMA mmap_size=67108864",  # 64 MB memory-mapped I/O
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA busy_timeout=5000",
+    )
+
+    # Set by metrics.enable_instrumentation() to trace every statement and to
+    # stop the last one's timer once a thread is done with the database
+    trace_callback = None
+    statement_done = None
+
+    def __init__(self, path=DB_PATH, cached_statements=256, pragmas=PRAGMAS):
+        self.path = path
+        self.cached_statements = cached_statements
+        self.pragmas = pragmas
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}  # connection -> the thread that opened it
+        self._generation = 0
+        self.open_count = 0
+        self.commit_count = 0
+
+    def connection(self):
+        local = self._local
+        if getattr(local, "generation", None) != self._generation:
+            if getattr(local, "depth", 0):
+                # Finish the open transaction() before switching over
+                return local.connection
+            local.connection = self._open()
+            local.generation = self._generation
+            local.depth = 0
+        return local.connection
+
+    def _open(self):
+        # isolation_level=None: we issue BEGIN/COMMIT ourselves in transaction().
+        # cached_statements sizes the per-connection prepared statement cache.
+        connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                                     cached_statements=self.cached_statements)
+        for pragma in self.pragmas:
+            connection.execute(pragma)
+        if self.trace_callback is not None:
+            connection.set_trace_callback(self.trace_callback)
+        with self._lock:
+            self._connections[connection] = threading.current_thread()
+            self.open_count += 1
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        # Nested transaction() blocks join the outermost one, so composite
+        # operations still commit once.
+        connection = self.connection()
+        local = self._local
+        if local.depth:
+            local.depth += 1
+            try:
+                yield connection.cursor()
+            finally:
+                local.depth -= 1
+            return
+        connection.execute("BEGIN IMMEDIATE")
+        local.depth = 1
+        try:
+            yield connection.cursor()
+        except BaseException:
+            connection.rollback()
+            raise
+        else:
+            connection.commit()
+            with self._lock:
+                self.commit_count += 1
+        finally:
+            local.depth = 0
+            self.idle()
+
+    def execute(self, sql, params=()):
+        return self.connection().execute(sql, params)
+
+    def idle(self):
+        # The calling thread has finished its statements for now, e.g. before
+        # it waits for more work; the time until its next one is not theirs
+        if self.statement_done is not None:
+            self.statement_done()
+
+    def release(self):
+        # Closes the calling thread's connection, e.g. when a service handler
+        # thread is about to exit; the thread reopens lazily if it goes on.
+        local = self._local
+        connection = getattr(local, "connection", None)
+        if connection is None:
+            return
+        with self._lock:
+            self._connections.pop(connection, None)
+        local.connection = None
+        local.generation = None
+        connection.close()
+
+    def close_all(self):
+        # Used before the database contents are replaced; every thread reopens
+        # lazily. Only the calling thread's connection and those of threads
+        # that have exited are closed here: another thread may be in the
+        # middle of a query on its own, so that one is only dropped when the
+        # thread next asks for a connection, and closes once its last cursor
+        # is gone.
+        current = threading.current_thread()
+        with self._lock:
+            connections, self._connections = self._connections, {}
+            self._generation += 1
+        for connection, owner in connections.items():
+            if owner is current or not owner.is_alive():
+                try:
+                    connection.close()
+                except sqlite3.Error:
+                    pass
+
+    def stats(self):
+        return {"path": self.path, "open_count": self.open_count, "commit_count": self.commit_count,
+                "connections": len(self._connections)}
+
+    def reset_stats(self):
+        with self._lock:
+            self.open_count = 0
+            self.commit_count = 0
+
+
+db_pool = ConnectionPool()
+
+
+def open_store(path, **kwargs):
+    # Points every db_* function at another database file. Functions are
+    # looked up on this module at call time, so scripts and the other
+    # modules all follow.
+    global db_pool, DB_PATH
+    db_pool.close_all()
+    db_pool = ConnectionPool(path, **kwargs)
+    DB_PATH = path
+    return db_pool
+
+
+def db_stats():
+    return db_pool.stats()
+
+
+# ---------------------- Rows ----------------------
+# Query results are named tuples: new code reads fields by name, old code
+# keeps indexing and unpacking them, they still go straight into Treeview
+# values and JSON, and a row costs no more memory than a plain tuple.
+Product = namedtuple("Product", ("id", "product_name", "quantity", "price", "threshold", "sku", "barcode"),
+                     defaults=(None, None))
+Sale = namedtuple("Sale", ("id", "product_name", "quantity", "total", "sale_date", "payment_method"))
+PeriodTotal = namedtuple("PeriodTotal", ("period", "revenue"))
+StockLevel = namedtuple("StockLevel", ("product_name", "quantity"))
+StockMovement = namedtuple("StockMovement", ("id", "product_id", "kind", "quantity", "balance", "moved_at", "reference",
+                                             "note"))
+StockReconciliation = namedtuple("StockReconciliation", ("product_id", "on_hand", "ledger_balance", "difference",
+                                                         "movement_id", "moved_at"))
+ReorderSuggestion = namedtuple("ReorderSuggestion", ("id", "product_name", "quantity", "threshold", "daily_units",
+                                                     "days_left", "order_quantity"))
+ReceiptLine = namedtuple("ReceiptLine", ("product_id", "product_name", "quantity", "total"))
+Receipt = namedtuple("Receipt", ("id", "created_at", "payment_method", "total", "item_count", "lines"))
+
+PRODUCT_SELECT = "SELECT id, product_name, quantity, price, threshold, sku, barcode FROM inventory"
+# {schema} is main, or an attached sales archive (see sales_sources)
+SALE_SELECT_FROM = """
+    SELECT s.id, i.product_name, s.quantity, s.total, s.sale_date, s.payment_method
+    FROM {schema}.sales s JOIN main.inventory i ON s.product_id = i.id
+"""
+SALE_SELECT = SALE_SELECT_FROM.format(schema="main")
+
+
+def as_rows(cursor, row_type):
+    # Rows are built as row_type while they are fetched
+    cursor.row_factory = lambda cursor, row: row_type(*row)
+    return cursor
+
+
+# ---------------------- Database Functions ----------------------
+# Bump whenever initialize_db changes the schema. A database already at this
+# version skips the DDL entirely, which keeps startup to a single PRAGMA read.
+SCHEMA_VERSION = 7
+
+
+def initialize_db():
+    if db_pool.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+        return
+    with db_pool.transaction() as cursor:
+        # Inventory table with threshold
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS inventory (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                product_name TEXT NOT NULL,
+                quantity INTEGER NOT NULL,
+                price REAL NOT NULL,
+                threshold INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # Sales table with payment_method
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sales (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                product_id INTEGER,
+                quantity INTEGER,
+                total REAL,
+                sale_date TEXT,
+                payment_method TEXT,
+                FOREIGN KEY (product_id) REFERENCES inventory (id)
+            )
+        """)
+        # Receipts group the sale rows written by one checkout
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS receipts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at TEXT NOT NULL,
+                payment_method TEXT,
+                total REAL NOT NULL,
+                item_count INTEGER NOT NULL
+            )
+        """)
+        _ensure_column(cursor, "sales", "receipt_id", "INTEGER REFERENCES receipts (id)")
+        # Client-generated id of a journaled checkout, so replays are idempotent
+        _ensure_column(cursor, "receipts", "uuid", "TEXT")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_receipts_uuid ON receipts (uuid)")
+        # Optional supplier/product code; bulk imports upsert on it
+        _ensure_column(cursor, "inventory", "sku", "TEXT")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_sku ON inventory (sku)")
+        # Manufacturer barcode (EAN/UPC) read by the scanner on the Sales tab
+        _ensure_column(cursor, "inventory", "barcode", "TEXT")
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_barcode ON inventory (barcode)")
+        # Reports filter on the raw sale_date column so these indexes are usable
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_sale_date ON sales (sale_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_sales_product_id ON sales (product_id)")
+        _create_aggregates(cursor)
+        _create_search(cursor)
+        _create_ledger(cursor)
+        # One row per month moved out to a sales archive (poslite.archive)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sales_archives (
+                period TEXT PRIMARY KEY,
+                file TEXT NOT NULL,
+                sale_count INTEGER NOT NULL,
+                revenue REAL NOT NULL,
+                archived_at TEXT NOT NULL
+            )
+        """)
+        # Imported here: users needs this module for its own queries
+        from .users import _create_users
+        _create_users(cursor)
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+# Dashboard aggregates kept current by triggers, so reading them is O(1)
+# however large inventory and sales grow. Sales rows are append-only, hence
+# there is no delete trigger on sales.
+AGGREGATE_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_inventory_insert AFTER INSERT ON inventory BEGIN
+        UPDATE inventory_stats SET total_products = total_products + 1,
+            low_stock = low_stock + (NEW.quantity < NEW.threshold),
+            total_quantity = total_quantity + NEW.quantity WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_inventory_delete AFTER DELETE ON inventory BEGIN
+        UPDATE inventory_stats SET total_products = total_products - 1,
+            low_stock = low_stock - (OLD.quantity < OLD.threshold),
+            total_quantity = total_quantity - OLD.quantity WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_inventory_update AFTER UPDATE OF quantity, threshold ON inventory BEGIN
+        UPDATE inventory_stats
+            SET low_stock = low_stock + (NEW.quantity < NEW.threshold) - (OLD.quantity < OLD.threshold),
+                total_quantity = total_quantity + NEW.quantity - OLD.quantity
+            WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_sales_insert AFTER INSERT ON sales BEGIN
+        INSERT OR IGNORE INTO daily_totals (day, payment_method)
+            VALUES (substr(NEW.sale_date, 1, 10), COALESCE(NEW.payment_method, ''));
+        UPDATE daily_totals SET revenue = revenue + COALESCE(NEW.total, 0),
+            units = units + COALESCE(NEW.quantity, 0), sale_count = sale_count + 1
+            WHERE day = substr(NEW.sale_date, 1, 10) AND payment_method = COALESCE(NEW.payment_method, '');
+    END""",
+)
+
+
+def _create_aggregates(cursor):
+    existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS inventory_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_products INTEGER NOT NULL,
+            low_stock INTEGER NOT NULL,
+            total_quantity INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS daily_totals (
+            day TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            revenue REAL NOT NULL DEFAULT 0,
+            units INTEGER NOT NULL DEFAULT 0,
+            sale_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, payment_method)
+        ) WITHOUT ROWID
+    """)
+    # Backfill from existing rows the first time the aggregates appear
+    if "inventory_stats" not in existing:
+        cursor.execute("""
+            INSERT INTO inventory_stats (id, total_products, low_stock, total_quantity)
+            SELECT 1, COUNT(*), COALESCE(SUM(quantity < threshold), 0), COALESCE(SUM(quantity), 0) FROM inventory
+        """)
+    elif "total_quantity" not in {row[1] for row in cursor.execute("PRAGMA table_info(inventory_stats)")}:
+        # Stores from before total_quantity: backfill it and replace the
+        # inventory triggers, which did not maintain it yet
+        cursor.execute("ALTER TABLE inventory_stats ADD COLUMN total_quantity INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("UPDATE inventory_stats SET total_quantity = (SELECT COALESCE(SUM(quantity), 0) FROM inventory)")
+        for trigger in ("trg_inventory_insert", "trg_inventory_delete", "trg_inventory_update"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    if "daily_totals" not in existing:
+        cursor.execute("""
+            INSERT INTO daily_totals (day, payment_method, revenue, units, sale_count)
+            SELECT substr(sale_date, 1, 10), COALESCE(payment_method, ''), COALESCE(SUM(total), 0),
+                   COALESCE(SUM(quantity), 0), COUNT(*)
+            FROM sales GROUP BY 1, 2
+        """)
+    for trigger in AGGREGATE_TRIGGERS:
+        cursor.execute(trigger)
+    # The inventory chart's best-stocked products, read off the end of the index
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_quantity ON inventory (quantity)")
+
+
+# Product search: an FTS5 index over name and SKU kept in step by triggers,
+# and catalog_version, bumped whenever either column changes, which tells the
+# PrefixIndex fallback when to rebuild. Stock movements leave both alone.
+# Barcodes are only ever matched whole, through idx_inventory_barcode.
+SEARCH_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_inventory_fts_insert AFTER INSERT ON inventory BEGIN
+        INSERT INTO inventory_fts (rowid, product_name, sku) VALUES (NEW.id, NEW.product_name, NEW.sku);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_inventory_fts_delete AFTER DELETE ON inventory BEGIN
+        INSERT INTO inventory_fts (inventory_fts, rowid, product_name, sku)
+            VALUES ('delete', OLD.id, OLD.product_name, OLD.sku);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_inventory_fts_update AFTER UPDATE OF product_name, sku ON inventory BEGIN
+        INSERT INTO inventory_fts (inventory_fts, rowid, product_name, sku)
+            VALUES ('delete', OLD.id, OLD.product_name, OLD.sku);
+        INSERT INTO inventory_fts (rowid, product_name, sku) VALUES (NEW.id, NEW.product_name, NEW.sku);
+    END""",
+)
+CATALOG_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_catalog_insert AFTER INSERT ON inventory BEGIN
+        UPDATE inventory_stats SET catalog_version = catalog_version + 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_catalog_delete AFTER DELETE ON inventory BEGIN
+        UPDATE inventory_stats SET catalog_version = catalog_version + 1 WHERE id = 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_catalog_update AFTER UPDATE OF product_name, sku ON inventory BEGIN
+        UPDATE inventory_stats SET catalog_version = catalog_version + 1 WHERE id = 1;
+    END""",
+)
+
+
+def _create_search(cursor):
+    _ensure_column(cursor, "inventory_stats", "catalog_version", "INTEGER NOT NULL DEFAULT 0")
+    for trigger in CATALOG_TRIGGERS:
+        cursor.execute(trigger)
+    existing = cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'inventory_fts'").fetchone()
+    try:
+        # External content: the index stores no second copy of the names.
+        # prefix='1 2 3' keeps the first keystrokes of a type-ahead cheap.
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS inventory_fts USING fts5(
+                product_name, sku, content='inventory', content_rowid='id', prefix='1 2 3'
+            )
+        """)
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5; db_search_products uses the PrefixIndex
+        return
+    if not existing:
+        cursor.execute("INSERT INTO inventory_fts (inventory_fts) VALUES ('rebuild')")
+    for trigger in SEARCH_TRIGGERS:
+        cursor.execute(trigger)
+
+
+# Stock ledger (see the Stock Ledger section): movements cannot be changed
+# once written, and sale movements feed the per-product daily units that
+# reorder suggestions are computed from.
+LEDGER_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_stock_movements_update BEFORE UPDATE ON stock_movements BEGIN
+        SELECT RAISE(ABORT, 'stock_movements is append-only');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_stock_movements_delete BEFORE DELETE ON stock_movements BEGIN
+        SELECT RAISE(ABORT, 'stock_movements is append-only');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_stock_movements_sale AFTER INSERT ON stock_movements
+        WHEN NEW.kind = 'sale' BEGIN
+        INSERT OR IGNORE INTO product_daily_sales (day, product_id)
+            VALUES (substr(NEW.moved_at, 1, 10), NEW.product_id);
+        UPDATE product_daily_sales SET units = units - NEW.quantity
+            WHERE day = substr(NEW.moved_at, 1, 10) AND product_id = NEW.product_id;
+    END""",
+)
+
+
+def _create_ledger(cursor):
+    existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_movements (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            balance INTEGER NOT NULL,
+            moved_at TEXT NOT NULL,
+            reference INTEGER,
+            note TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stock_movements_product ON stock_movements (product_id, id)")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS product_daily_sales (
+            day TEXT NOT NULL,
+            product_id INTEGER NOT NULL,
+            units INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, product_id)
+        ) WITHOUT ROWID
+    """)
+    # Only the products under their threshold, so finding them reads no others
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_low_stock ON inventory (id) WHERE quantity < threshold")
+    # Backfill: the stock on hand becomes each product's opening balance, and
+    # the units sold per day come from the sales already recorded
+    if "stock_movements" not in existing:
+        cursor.execute("""
+            INSERT INTO stock_movements (product_id, kind, quantity, balance, moved_at)
+            SELECT id, 'opening', quantity, quantity, ? FROM inventory ORDER BY id
+        """, (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),))
+    if "product_daily_sales" not in existing:
+        cursor.execute("""
+            INSERT INTO product_daily_sales (day, product_id, units)
+            SELECT substr(sale_date, 1, 10), product_id, SUM(quantity) FROM sales
+            WHERE product_id IS NOT NULL GROUP BY 1, 2
+        """)
+    for trigger in LEDGER_TRIGGERS:
+        cursor.execute(trigger)
+
+
+def _ensure_column(cursor, table, column, declaration):
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+
+
+# Products by id, plus name -> id and barcode/SKU -> id indexes, for the lookups a till makes on
+# every scan. Each thread keeps its own entries, tied to PRAGMA data_version
+# on its own connection: a commit from any other connection (another thread
+# or till, the service, a restore) empties them, and the db_* writes below
+# drop the products they touch. Reads inside an open transaction bypass the
+# cache, since they can see rows that may still be rolled back.
+class ProductCache:
+    def __init__(self):
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def _entries(self):
+        connection = db_pool.connection()
+        if connection.in_transaction:
+            return None
+        version = connection.execute("PRAGMA data_version").fetchone()[0]
+        local = self._local
+        if getattr(local, "connection", None) is not connection or local.version != version:
+            local.connection = connection
+            local.version = version
+            local.by_id = {}
+            local.by_name = {}
+            local.by_code = {}
+        return local
+
+    def get(self, product_id):
+        try:
+            product_id = int(product_id)
+        except (TypeError, ValueError):
+            return None
+        local = self._entries()
+        product = local.by_id.get(product_id) if local is not None else None
+        if product is not None:
+            self.hits += 1
+            return product
+        self.misses += 1
+        product = as_rows(db_pool.execute(PRODUCT_SELECT + " WHERE id = ?", (product_id,)), Product).fetchone()
+        if product is not None and local is not None:
+            local.by_id[product_id] = product
+        return product
+
+    def get_by_name(self, name):
+        # Names are not unique; the oldest product with the name wins
+        local = self._entries()
+        product_id = local.by_name.get(name) if local is not None else None
+        if product_id is not None and product_id in local.by_id:
+            self.hits += 1
+            return local.by_id[product_id]
+        self.misses += 1
+        product = as_rows(db_pool.execute(PRODUCT_SELECT + " WHERE product_name = ? ORDER BY id LIMIT 1", (name,)),
+                          Product).fetchone()
+        if product is not None and local is not None:
+            local.by_id[product.id] = product
+            local.by_name[name] = product.id
+        return product
+
+    def get_by_code(self, code):
+        # A scanned barcode, or a SKU typed in; barcodes win over SKUs
+        local = self._entries()
+        product_id = local.by_code.get(code) if local is not None else None
+        if product_id is not None and product_id in local.by_id:
+            self.hits += 1
+            return local.by_id[product_id]
+        self.misses += 1
+        product = as_rows(db_pool.execute(PRODUCT_SELECT + " WHERE barcode = ?1 OR sku = ?1 ORDER BY barcode = ?1 DESC "
+                                          "LIMIT 1", (code,)), Product).fetchone()
+        if product is not None and local is not None:
+            local.by_id[product.id] = product
+            local.by_code[code] = product.id
+        return product
+
+    def invalidate(self, *product_ids):
+        # Drops the given products and the name and code indexes; no ids
+        # drops everything
+        local = self._local
+        if getattr(local, "connection", None) is None:
+            return
+        if not product_ids:
+            local.by_id.clear()
+        for product_id in product_ids:
+            local.by_id.pop(int(product_id), None)
+        local.by_name.clear()
+        local.by_code.clear()
+
+
+product_cache = ProductCache()
+
+
+def db_save_product(name, quantity, price, threshold):
+    with db_pool.transaction() as cursor:
+        cursor.execute("INSERT INTO inventory (product_name, quantity, price, threshold) VALUES (?, ?, ?, ?)",
+                       (name, quantity, price, threshold))
+        product_id = cursor.lastrowid
+        _record_movements(cursor, [(product_id, "opening", quantity, quantity, None, None)])
+        product_cache.invalidate(product_id)
+        return product_id
+
+
+def db_fetch_inventory():
+    return as_rows(db_pool.execute(PRODUCT_SELECT), Product).fetchall()
+
+
+def db_fetch_inventory_page(after_id=None, limit=200, reverse=False):
+    # Keyset pagination: every page is an index range scan on the primary key,
+    # however deep into the catalogue it starts. reverse pages before after_id.
+    if reverse:
+        rows = as_rows(db_pool.execute(PRODUCT_SELECT + " WHERE id < ? ORDER BY id DESC LIMIT ?",
+                                       (after_id, limit)), Product).fetchall()
+        rows.reverse()
+        return rows
+    return as_rows(db_pool.execute(PRODUCT_SELECT + " WHERE id > ? ORDER BY id LIMIT ?",
+                                   (after_id or 0, limit)), Product).fetchall()
+
+
+def db_update_product(item_id, name, quantity, price, threshold):
+    # A changed quantity is booked as an adjustment; db_receive_stock and
+    # db_adjust_stock record deliveries and stock counts more precisely.
+    with db_pool.transaction() as cursor:
+        row = cursor.execute("SELECT quantity FROM inventory WHERE id = ?", (item_id,)).fetchone()
+        cursor.execute("""
+            UPDATE inventory
+            SET product_name = ?, quantity = ?, price = ?, threshold = ?
+            WHERE id = ?
+        """, (name, quantity, price, threshold, item_id))
+        if row and row[0] != quantity:
+            _record_movements(cursor, [(int(item_id), "adjustment", quantity - row[0], quantity, None, None)])
+        product_cache.invalidate(item_id)
+
+
+def db_delete_product(item_id):
+    with db_pool.transaction() as cursor:
+        row = cursor.execute("SELECT quantity FROM inventory WHERE id = ?", (item_id,)).fetchone()
+        cursor.execute("DELETE FROM inventory WHERE id = ?", (item_id,))
+        if row and row[0]:
+            _record_movements(cursor, [(int(item_id), "adjustment", -row[0], 0, None, "product deleted")])
+        product_cache.invalidate(item_id)
+
+
+def db_save_sale(product_id, quantity, total, payment_method):
+    with db_pool.transaction() as cursor:
+        cursor.execute("INSERT INTO sales (product_id, quantity, total, sale_date, payment_method) "
+                       "VALUES (?, ?, ?, ?, ?)",
+                       (product_id, quantity, total, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), payment_method))
+
+
+class ProductNotFoundError(LookupError):
+    pass
+
+
+class InsufficientStockError(Exception):
+    def __init__(self, product_id, available, requested):
+        super().__init__(f"Product {product_id}: {available} in stock, {requested} requested")
+        self.product_id = product_id
+        self.available = available
+        self.requested = requested
+
+
+def db_fetch_product(product_id):
+    return product_cache.get(product_id)
+
+
+def db_fetch_product_by_name(name):
+    return product_cache.get_by_name(name)
+
+
+def db_fetch_product_by_code(code):
+    # Scanner input: two unique index probes, never a table scan
+    code = str(code).strip()
+    return product_cache.get_by_code(code) if code else None
+
+
+# Words as FTS5's unicode61 tokenizer splits them (underscore separates too)
+SEARCH_TOKENS = re.compile(r"[^\W_]+")
+
+
+# Fallback prefix search for SQLite builds without FTS5. Every (word, id)
+# pair of the catalogue sits in one sorted list, so the words starting with a
+# prefix are a single bisect range -- what a trie walk would give, in two flat
+# lists rather than a node per character. The narrowest range among the
+# words typed drives the search; the other words are checked per product.
+class PrefixIndex:
+    def __init__(self, rows):
+        self.words = {}
+        pairs = []
+        for product_id, *fields in rows:
+            words = SEARCH_TOKENS.findall(" ".join(field for field in fields if field).lower())
+            self.words[product_id] = words
+            pairs.extend((word, product_id) for word in set(words))
+        pairs.sort()
+        self.keys = [word for word, product_id in pairs]
+        self.ids = [product_id for word, product_id in pairs]
+
+    def _range(self, prefix):
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + "\U0010ffff")
+
+    def search(self, tokens, limit=10):
+        ranges = {token: self._range(token) for token in tokens}
+        first = min(ranges, key=lambda token: ranges[token][1] - ranges[token][0])
+        rest = [token for token in tokens if token != first]
+        found, seen = [], set()
+        for i in range(*ranges[first]):
+            product_id = self.ids[i]
+            if product_id in seen:
+                continue
+            seen.add(product_id)
+            words = self.words[product_id]
+            if all(any(word.startswith(token) for word in words) for token in rest):
+                found.append(product_id)
+                if len(found) >= limit:
+                    break
+        return found
+
+
+_prefix_index = {}
+
+
+def _search_prefix_index(tokens, limit):
+    version = (db_pool.path, db_pool.execute("SELECT catalog_version FROM inventory_stats WHERE id = 1").fetchone()[0])
+    if _prefix_index.get("version") != version:
+        _prefix_index["index"] = PrefixIndex(db_pool.execute("SELECT id, product_name, sku FROM inventory"))
+        _prefix_index["version"] = version
+    return _prefix_index["index"].search(tokens, limit)
+
+
+def db_search_products(query, limit=10):
+    # Type-ahead for the Sales tab: an exact barcode, SKU or id first, then
+    # up to limit products, by id, whose name or SKU has a word starting
+    # with each word typed. FTS5 answers from its prefix index, so the cost
+    # follows the limit rather than the size of the catalogue.
+    query = str(query).strip()
+    tokens = SEARCH_TOKENS.findall(query.lower())
+    if not tokens:
+        return []
+    exact = db_fetch_product_by_code(query) or (product_cache.get(query) if query.isdigit() else None)
+    results = [exact] if exact is not None else []
+    if db_pool.execute("SELECT 1 FROM sqlite_master WHERE name = 'inventory_fts'").fetchone():
+        match = " ".join(f'"{token}"*' for token in tokens)
+        rows = as_rows(db_pool.execute(PRODUCT_SELECT + """
+            WHERE id IN (SELECT rowid FROM inventory_fts WHERE inventory_fts MATCH ? LIMIT ?) ORDER BY id
+        """, (match, limit + 1)), Product).fetchall()
+    else:
+        ids = _search_prefix_index(tokens, limit + 1)
+        placeholders = ",".join("?" * len(ids))
+        rows = as_rows(db_pool.execute(PRODUCT_SELECT + f" WHERE id IN ({placeholders}) ORDER BY id", ids),
+                       Product).fetchall() if ids else []
+    results.extend(row for row in rows if exact is None or row.id != exact.id)
+    return results[:limit]
+
+
+def db_sell(product_id, quantity, payment_method):
+    # A single-line checkout: the conditional decrement and the sale insert
+    # share one transaction, so two tills can never both sell the last unit.
+    receipt_id, total, remaining = db_checkout([(product_id, quantity)], payment_method)
+    return total, remaining[product_id]
+
+
+def db_checkout(lines, payment_method, sale_uuid=None, sale_date=None):
+    # Sell a whole basket in one transaction: one indexed lookup per chunk of
+    # product ids, then executemany for every decrement and sale row, all
+    # filed under a shared receipt id. A checkout whose sale_uuid was already
+    # recorded is not sold again; its existing receipt is returned.
+    quantities = {}
+    for product_id, quantity in lines:
+        if quantity <= 0:
+            raise ValueError("Sale quantity must be positive")
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    if not quantities:
+        raise ValueError("Cannot check out an empty basket")
+    sale_date = sale_date or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    product_ids = list(quantities)
+    with db_pool.transaction() as cursor:
+        if sale_uuid is not None:
+            receipt = cursor.execute("SELECT id, total FROM receipts WHERE uuid = ?", (sale_uuid,)).fetchone()
+            if receipt:
+                remaining = {}
+                for product_id in product_ids:
+                    row = cursor.execute("SELECT quantity FROM inventory WHERE id = ?", (product_id,)).fetchone()
+                    if row:
+                        remaining[product_id] = row[0]
+                return receipt[0], receipt[1], remaining
+        stock = {}
+        for i in range(0, len(product_ids), 500):
+            chunk = product_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for row in cursor.execute(f"SELECT id, price, quantity FROM inventory WHERE id IN ({placeholders})",
+                                      chunk):
+                stock[row[0]] = row
+        for product_id, quantity in quantities.items():
+            if product_id not in stock:
+                raise ProductNotFoundError(f"Product {product_id} not found")
+            if stock[product_id][2] < quantity:
+                raise InsufficientStockError(product_id, stock[product_id][2], quantity)
+        cursor.executemany("UPDATE inventory SET quantity = quantity - ? WHERE id = ? AND quantity >= ?",
+                           [(quantity, product_id, quantity) for product_id, quantity in quantities.items()])
+        product_cache.invalidate(*product_ids)
+        if cursor.rowcount != len(quantities):
+            # Cannot happen under BEGIN IMMEDIATE, but never write a partial basket.
+            raise sqlite3.IntegrityError("Stock changed during checkout")
+        totals = {product_id: quantity * stock[product_id][1] for product_id, quantity in quantities.items()}
+        total = sum(totals.values())
+        cursor.execute("INSERT INTO receipts (created_at, payment_method, total, item_count, uuid) "
+                       "VALUES (?, ?, ?, ?, ?)", (sale_date, payment_method, total, sum(quantities.values()), sale_uuid))
+        receipt_id = cursor.lastrowid
+        cursor.executemany("INSERT INTO sales (product_id, quantity, total, sale_date, payment_method, receipt_id) "
+                           "VALUES (?, ?, ?, ?, ?, ?)",
+                           [(product_id, quantity, totals[product_id], sale_date, payment_method, receipt_id)
+                            for product_id, quantity in quantities.items()])
+        _record_movements(cursor, [(product_id, "sale", -quantity, stock[product_id][2] - quantity, receipt_id, None)
+                                   for product_id, quantity in quantities.items()], sale_date)
+    remaining = {product_id: stock[product_id][2] - quantity for product_id, quantity in quantities.items()}
+    return receipt_id, total, remaining
+
+
+# In-memory basket of line items; nothing touches the database until checkout.
+class Cart:
+    def __init__(self):
+        self.lines = {}
+
+    def add(self, product_id, name, price, quantity):
+        if quantity <= 0:
+            raise ValueError("Sale quantity must be positive")
+        line = self.lines.get(product_id)
+        if line:
+            quantity += line[2]
+        self.lines[product_id] = (name, price, quantity)
+
+    def remove(self, product_id):
+        self.lines.pop(product_id, None)
+
+    def clear(self):
+        self.lines.clear()
+
+    def quantity_of(self, product_id):
+        line = self.lines.get(product_id)
+        return line[2] if line else 0
+
+    def items(self):
+        return [(product_id, quantity) for product_id, (name, price, quantity) in self.lines.items()]
+
+    def total(self):
+        return sum(price * quantity for name, price, quantity in self.lines.values())
+
+    def item_count(self):
+        return sum(quantity for name, price, quantity in self.lines.values())
+
+    def checkout(self, payment_method):
+        result = db_checkout(self.items(), payment_method)
+        self.clear()
+        return result
+
+    def __len__(self):
+        return len(self.lines)
+
+
+RECEIPT_SELECT = "SELECT id, created_at, payment_method, total, item_count FROM {schema}.receipts WHERE id = ?"
+# A checkout dates its receipt and its sale rows alike, so the lines are
+# found through idx_sales_sale_date and need no index of their own
+RECEIPT_LINES_SELECT = """
+    SELECT s.product_id, COALESCE(i.product_name, '#' || s.product_id), s.quantity, s.total
+    FROM {schema}.sales s LEFT JOIN main.inventory i ON s.product_id = i.id
+    WHERE s.sale_date = ? AND s.receipt_id = ? ORDER BY s.id
+"""
+
+
+def _fetch_receipt(schema, receipt_id):
+    header = db_pool.execute(RECEIPT_SELECT.format(schema=schema), (receipt_id,)).fetchone()
+    if header is None:
+        return None
+    lines = as_rows(db_pool.execute(RECEIPT_LINES_SELECT.format(schema=schema), (header[1], receipt_id)),
+                    ReceiptLine)
+    return Receipt(*header, lines.fetchall())
+
+
+def db_fetch_receipt(receipt_id):
+    # A receipt and its lines by receipt number, or None. The number is the
+    # receipts primary key; receipts of archived months are looked up in
+    # the archives, newest first, only when main does not have them.
+    receipt = _fetch_receipt("main", receipt_id)
+    if receipt is None:
+        archives = [schema for schema, start, stop in sales_sources() if schema != "main"]
+        for schema in reversed(archives):
+            receipt = _fetch_receipt(schema, receipt_id)
+            if receipt is not None:
+                break
+    return receipt
+
+
+# ---------------------- Stock Ledger ----------------------
+# Every stock change made here is also appended to stock_movements with the
+# balance it leaves: opening stock, deliveries (receipt), sales (reference is
+# the receipt id) and adjustments. The newest movement of a product is its
+# checkpoint, so reconciling it is one probe of idx_stock_movements_product
+# whatever its history. Writes that bypass these functions show up as a
+# difference between inventory.quantity and that balance.
+MOVEMENT_KINDS = ("opening", "receipt", "sale", "adjustment")
+MOVEMENT_SELECT = "SELECT id, product_id, kind, quantity, balance, moved_at, reference, note FROM stock_movements"
+RECONCILE_SELECT = """
+    SELECT i.id, i.quantity, m.balance, i.quantity - COALESCE(m.balance, 0), m.id, m.moved_at FROM inventory i
+    LEFT JOIN stock_movements m ON m.id = (SELECT MAX(id) FROM stock_movements WHERE product_id = i.id)
+"""
+
+
+def _record_movements(cursor, movements, moved_at=None):
+    # movements: (product_id, kind, quantity, balance, reference, note), with
+    # quantity signed and balance the stock on hand after the movement
+    moved_at = moved_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    cursor.executemany("INSERT INTO stock_movements (product_id, kind, quantity, balance, moved_at, reference, note) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                       [(product_id, kind, quantity, balance, moved_at, reference, note)
+                        for product_id, kind, quantity, balance, reference, note in movements])
+
+
+def _set_stock(product_id, kind, change, note):
+    # change(on_hand) -> new quantity; returns (on_hand, new quantity)
+    with db_pool.transaction() as cursor:
+        row = cursor.execute("SELECT quantity FROM inventory WHERE id = ?", (product_id,)).fetchone()
+        if row is None:
+            raise ProductNotFoundError(f"Product {product_id} not found")
+        balance = change(row[0])
+        if balance != row[0]:
+            cursor.execute("UPDATE inventory SET quantity = ? WHERE id = ?", (balance, product_id))
+            _record_movements(cursor, [(int(product_id), kind, balance - row[0], balance, None, note)])
+            product_cache.invalidate(product_id)
+        return row[0], balance
+
+
+def db_receive_stock(product_id, quantity, note=None):
+    # A delivery: adds quantity to the stock on hand and returns the new level
+    if quantity <= 0:
+        raise ValueError("Received quantity must be positive")
+    return _set_stock(product_id, "receipt", lambda on_hand: on_hand + quantity, note)[1]
+
+
+def db_adjust_stock(product_id, counted, note=None):
+    # A stock count: sets the stock on hand to what was counted and returns
+    # the difference booked (negative for shrinkage)
+    if counted < 0:
+        raise ValueError("Counted quantity cannot be negative")
+    on_hand, balance = _set_stock(product_id, "adjustment", lambda on_hand: counted, note)
+    return balance - on_hand
+
+
+def db_fetch_stock_movements(product_id, before_id=None, limit=50):
+    # A product's movements, newest first; pass the last id seen as
+    # before_id for the next page
+    if before_id is None:
+        cursor = db_pool.execute(MOVEMENT_SELECT + " WHERE product_id = ? ORDER BY id DESC LIMIT ?",
+                                 (product_id, limit))
+    else:
+        cursor = db_pool.execute(MOVEMENT_SELECT + " WHERE product_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                                 (product_id, before_id, limit))
+    return as_rows(cursor, StockMovement).fetchall()
+
+
+def db_reconcile_stock(product_id):
+    # The stock on hand against the ledger balance, or None for an unknown
+    # product
+    return as_rows(db_pool.execute(RECONCILE_SELECT + " WHERE i.id = ?", (product_id,)),
+                   StockReconciliation).fetchone()
+
+
+def db_reconcile_inventory(fix=False):
+    # Every product whose stock on hand differs from its ledger balance. With
+    # fix, the stock on hand is taken as right and an adjustment is booked
+    # for each difference, so the ledger agrees again.
+    with db_pool.transaction() as cursor:
+        rows = as_rows(cursor.execute(RECONCILE_SELECT + " WHERE m.balance IS NULL OR m.balance != i.quantity"),
+                       StockReconciliation).fetchall()
+        if fix and rows:
+            _record_movements(cursor, [(row.product_id, "adjustment", row.difference, row.on_hand, None, "reconciled")
+                                       for row in rows])
+    return rows
+
+
+def db_fetch_reorder_suggestions(days=28, lead_days=7, cover_days=14, limit=100, today=None):
+    # Products to order now: those below their threshold, or selling fast
+    # enough to reach it before an order placed today arrives (lead_days).
+    # The rate is the average sold per day over the `days` days before today,
+    # read from product_daily_sales, so only products under their threshold
+    # (idx_inventory_low_stock) or sold in that window are looked at. The
+    # suggested order brings stock up to the threshold plus cover_days of
+    # sales at that rate. Soonest to run out first.
+    today = today or date.today()
+    window = ((today - timedelta(days=days)).isoformat(), today.isoformat())
+    rows = db_pool.execute("""
+        WITH sold AS (
+            SELECT product_id, SUM(units) AS units FROM product_daily_sales WHERE day >= ? AND day < ?
+            GROUP BY product_id
+        )
+        SELECT i.id, i.product_name, i.quantity, i.threshold, COALESCE(sold.units, 0)
+        FROM inventory i LEFT JOIN sold ON sold.product_id = i.id WHERE i.quantity < i.threshold
+        UNION ALL
+        SELECT i.id, i.product_name, i.quantity, i.threshold, sold.units
+        FROM sold JOIN inventory i ON i.id = sold.product_id
+        WHERE i.quantity >= i.threshold AND (i.quantity - i.threshold) * ? < sold.units * ?
+    """, (*window, days, lead_days)).fetchall()
+    suggestions = []
+    for product_id, name, quantity, threshold, units in rows:
+        rate = units / days
+        target = threshold + rate * (lead_days + cover_days)
+        suggestions.append(ReorderSuggestion(product_id, name, quantity, threshold, rate,
+                                             max(quantity, 0) / rate if rate else None,
+                                             max(math.ceil(target) - quantity, 1)))
+    suggestions.sort(key=lambda row: (row.days_left is None, row.days_left or 0, row.id))
+    return suggestions[:limit]
+
+
+def day_range(start_date, end_date=None):
+    # sale_date is stored as "YYYY-MM-DD HH:MM:SS", so the inclusive day range
+    # [start, end] becomes the half-open text range [start, end + 1 day).
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date) if end_date else start
+    return start.isoformat(), (end + timedelta(days=1)).isoformat()
+
+
+# ---------------------- Sales Archive ----------------------
+# Closed months are moved out of sales into one archive file per year (see
+# poslite.archive). Reports over sales rows read the archives holding their
+# range and then main; anything served from the daily_totals rollup, like
+# summaries, charts and the dashboard, never needs them.
+ARCHIVE_ATTACH_LIMIT = 8  # stays under SQLite's default of 10 attached databases
+
+
+def archive_dir():
+    # pos_lite.db -> pos_lite_archive/, so each store keeps its own archives
+    return os.path.splitext(db_pool.path)[0] + "_archive"
+
+
+def attach_archive(file, create=False):
+    # Attaches an archive file to the calling thread's connection and returns
+    # its schema name. Archives stay attached for later reports; the oldest
+    # ones are detached first once ARCHIVE_ATTACH_LIMIT is reached.
+    connection = db_pool.connection()
+    schema = "archive_" + os.path.splitext(file)[0]
+    attached = [row[1] for row in connection.execute("PRAGMA database_list") if row[1].startswith("archive_")]
+    if schema in attached:
+        return schema
+    path = os.path.join(archive_dir(), file)
+    if not create and not os.path.exists(path):
+        raise FileNotFoundError(f"Sales archive {path} is missing")
+    for name in attached[:max(0, len(attached) - ARCHIVE_ATTACH_LIMIT + 1)]:
+        connection.execute(f"DETACH DATABASE {name}")
+    connection.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+    return schema
+
+
+def sales_sources(start=None, stop=None):
+    # Yields (schema, start, stop) for every sales table a [start, stop)
+    # query has to read: the archives holding archived months in the range,
+    # oldest first, then main with the range as given. Archive legs are
+    # clipped to the months the catalog lists, so rows an interrupted
+    # archive run left in a file are never counted twice.
+    files = db_pool.execute("""
+        SELECT file, MIN(period), MAX(period) FROM sales_archives
+        WHERE period >= ? AND period || '-01' < ? GROUP BY file ORDER BY MIN(period)
+    """, ((start or "")[:7], stop or "9999")).fetchall()
+    for file, first, last in files:
+        year, month = map(int, last.split("-"))
+        after_last = f"{year + month // 12:04d}-{month % 12 + 1:02d}-01"
+        yield attach_archive(file), max(start or "", first + "-01"), min(stop or "9999", after_last)
+    yield "main", start, stop
+
+
+def db_fetch_sales_report(start_date, end_date):
+    rows = []
+    for schema, start, stop in sales_sources(*day_range(start_date, end_date)):
+        rows += as_rows(db_pool.execute(SALE_SELECT_FROM.format(schema=schema) +
+                                        "WHERE s.sale_date >= ? AND s.sale_date < ?", (start, stop)), Sale).fetchall()
+    return rows
+
+
+def _sales_page(schema, start, stop, after, limit, reverse):
+    sale_select = SALE_SELECT_FROM.format(schema=schema)
+    if reverse:
+        after_date, after_id = after
+        rows = as_rows(db_pool.execute(sale_select + """
+            WHERE s.sale_date >= ? AND s.sale_date < ? AND s.sale_date <= ?
+                AND (s.sale_date < ? OR s.id < ?)
+            ORDER BY s.sale_date DESC, s.id DESC LIMIT ?
+        """, (start, stop, after_date, after_date, after_id, limit)), Sale).fetchall()
+        rows.reverse()
+        return rows
+    after_date, after_id = after or ("", 0)
+    return as_rows(db_pool.execute(sale_select + """
+        WHERE s.sale_date >= ? AND s.sale_date < ? AND (s.sale_date > ? OR s.id > ?)
+        ORDER BY s.sale_date, s.id LIMIT ?
+    """, (max(start, after_date), stop, after_date, after_id, limit)), Sale).fetchall()
+
+
+def db_fetch_sales_report_page(start_date, end_date, after=None, limit=200, reverse=False):
+    # Pages through a report in (sale_date, id) order, which is the order of
+    # idx_sales_sale_date; after is the (sale_date, id) key of the last row
+    # shown (or of the first row when paging backwards). Each sales table
+    # in the range gives at most one page and the pages are merged.
+    legs = [_sales_page(schema, start, stop, after, limit, reverse)
+            for schema, start, stop in sales_sources(*day_range(start_date, end_date))]
+    if len(legs) == 1:
+        return legs[0]
+    rows = sorted((row for leg in legs for row in leg), key=lambda row: (row.sale_date, row.id))
+    return rows[-limit:] if reverse else rows[:limit]
+
+
+def db_fetch_sales_summary(start_date, end_date):
+    # Read from the daily rollup, so the cost is one row per day in the range
+    start, stop = day_range(start_date, end_date)
+    count, units, total = db_pool.execute("""
+        SELECT COALESCE(SUM(sale_count), 0), COALESCE(SUM(units), 0), COALESCE(SUM(revenue), 0)
+        FROM daily_totals WHERE day >= ? AND day < ?
+    """, (start, stop)).fetchone()
+    return {"count": count, "units": units, "total": total}
+
+
+def db_fetch_recent_sales(limit=10):
+    return as_rows(db_pool.execute(SALE_SELECT + "ORDER BY s.id DESC LIMIT ?", (limit,)), Sale).fetchall()
+
+
+def db_fetch_sales_total(day):
+    result = db_pool.execute("SELECT SUM(revenue) FROM daily_totals WHERE day = ?", (day,)).fetchone()
+    return result[0] if result[0] is not None else 0.0
+
+
+def db_fetch_daily_totals(day):
+    rows = db_pool.execute("SELECT payment_method, revenue FROM daily_totals WHERE day = ?", (day,))
+    return dict(rows.fetchall())
+
+
+# Chart buckets over daily_totals.day; a week is labelled by its Monday.
+CHART_BUCKETS = {
+    "day": "day",
+    "week": "date(day, '-6 days', 'weekday 1')",
+    "month": "substr(day, 1, 7)",
+}
+
+
+def db_fetch_sales_by_period(start_date, end_date, bucket=None):
+    # Revenue per bucket straight from the daily rollup, so a chart costs one
+    # row per day in the range however many sales it covers. Without a bucket
+    # the size is picked to keep the chart to roughly 60 bars at most.
+    start, stop = day_range(start_date, end_date)
+    if bucket is None:
+        days = (date.fromisoformat(stop) - date.fromisoformat(start)).days
+        bucket = "day" if days <= 62 else "week" if days <= 366 else "month"
+    rows = as_rows(db_pool.execute(f"""
+        SELECT {CHART_BUCKETS[bucket]} AS period, SUM(revenue) FROM daily_totals
+        WHERE day >= ? AND day < ? GROUP BY period ORDER BY period
+    """, (start, stop)), PeriodTotal).fetchall()
+    return bucket, rows
+
+
+def db_fetch_inventory_levels(top=20):
+    # The `top` best-stocked products plus one (count, quantity) bucket for the
+    # rest, so the inventory chart stays readable with thousands of products.
+    # The products come off idx_inventory_quantity and the totals from
+    # inventory_stats, so neither reads the whole table.
+    rows = as_rows(db_pool.execute("SELECT product_name, quantity FROM inventory ORDER BY quantity DESC LIMIT ?",
+                                   (top,)), StockLevel).fetchall()
+    count, quantity = db_pool.execute("SELECT total_products, total_quantity FROM inventory_stats "
+                                      "WHERE id = 1").fetchone()
+    return rows, (count - len(rows), quantity - sum(row.quantity for row in rows))
+
+
+_dashboard_cache = threading.local()
+
+
+def db_fetch_dashboard_stats(day=None):
+    # Like ProductCache, each thread keeps its own copy tied to PRAGMA
+    # data_version on its own connection, which moves whenever any other
+    # connection commits (another thread or till, the service, a restore);
+    # commit_count covers this thread's own commits. While neither moves the
+    # cached counters are still exact and no query is needed at all.
+    day = day or date.today().strftime("%Y-%m-%d")
+    connection = db_pool.connection()
+    version = (day, connection.execute("PRAGMA data_version").fetchone()[0], db_pool.commit_count)
+    cache = _dashboard_cache
+    if connection.in_transaction or getattr(cache, "connection", None) is not connection or cache.version != version:
+        total_products, low_stock = db_pool.execute(
+            "SELECT total_products, low_stock FROM inventory_stats WHERE id = 1").fetchone()
+        stats = {"total_products": total_products, "low_stock": low_stock, "today_sales": db_fetch_sales_total(day)}
+        if connection.in_transaction:
+            return stats
+        cache.connection = connection
+        cache.version = version
+        cache.stats = stats
+    return dict(cache.stats)
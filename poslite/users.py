@@ -0,0 +1,190 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import namedtuple
+
+from . import store
+
+# ---------------------- Users and Sessions ----------------------
+# PBKDF2-HMAC-SHA256 cost; benchmarks/bench_password_hash.py shows what each
+# setting costs on a given till. Stored hashes with fewer iterations are
+# upgraded on the next successful login.
+PASSWORD_ITERATIONS = 200000
+SESSION_TTL = 12 * 3600
+THROTTLE_FREE_ATTEMPTS = 3
+THROTTLE_MAX_DELAY = 300
+# A username's failed logins are forgotten this long after its lockout ends,
+# and at most THROTTLE_MAX_ENTRIES usernames are tracked at once (the oldest
+# go first), so logins POSTed for made-up names cannot grow memory unbounded
+THROTTLE_FORGET = 900
+THROTTLE_MAX_ENTRIES = 10000
+ROLES = ("admin", "cashier")
+# Seeded on first run so the stock logins keep working until changed
+DEFAULT_USERS = (("admin", "admin", "admin"), ("cashier", "1234", "cashier"))
+
+
+User = namedtuple("User", ("username", "password_hash", "role"))
+
+
+class AuthError(Exception):
+    pass
+
+
+class LoginThrottled(AuthError):
+    def __init__(self, username, retry_after):
+        super().__init__(f"Too many failed logins for {username}; retry in {retry_after:.0f}s")
+        self.username = username
+        self.retry_after = retry_after
+
+
+def hash_password(password, iterations=PASSWORD_ITERATIONS, salt=None):
+    salt = salt or os.urandom(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password, stored):
+    algorithm, iterations, salt, digest = stored.split("$")
+    if algorithm != "pbkdf2_sha256":
+        raise ValueError(f"Unknown password hash {algorithm}")
+    candidate = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), int(iterations))
+    return hmac.compare_digest(candidate.hex(), digest)
+
+
+def _create_users(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL CHECK (role IN ('admin', 'cashier'))
+        )
+    """)
+    if cursor.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+        cursor.executemany("INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)",
+                           [(username, hash_password(password), role) for username, password, role in DEFAULT_USERS])
+
+
+def db_fetch_user(username):
+    return store.as_rows(store.db_pool.execute("SELECT username, password_hash, role FROM users WHERE username = ?",
+                                               (username,)), User).fetchone()
+
+
+def db_save_user(username, password, role="cashier"):
+    if role not in ROLES:
+        raise ValueError(f"Unknown role {role}")
+    with store.db_pool.transaction() as cursor:
+        cursor.execute("""
+            INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)
+            ON CONFLICT (username) DO UPDATE SET password_hash = excluded.password_hash, role = excluded.role
+        """, (username, hash_password(password), role))
+    auth.end_sessions(username)
+
+
+class Session:
+    def __init__(self, username, role, verifier, ttl=SESSION_TTL):
+        self.username = username
+        self.role = role
+        self.token = secrets.token_hex(16)
+        self.verifier = verifier
+        self.expires = time.monotonic() + ttl
+
+    @property
+    def valid(self):
+        return time.monotonic() < self.expires
+
+    @property
+    def is_admin(self):
+        return self.role == "admin"
+
+
+# Logins and the in-memory session cache. A user with a live session is
+# re-checked against a keyed HMAC of their password instead of PBKDF2, so
+# switching cashiers at the till is instant; sessions only live in this
+# process. Failed logins back off exponentially per username.
+class Authenticator:
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._key = os.urandom(32)
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._tokens = {}
+        self._failures = {}
+        self._dummy_hash = None
+
+    def login(self, username, password):
+        self._check_throttle(username)
+        verifier = hmac.new(self._key, password.encode(), "sha256").digest()
+        with self._lock:
+            session = self._sessions.get(username)
+        if session and session.valid and hmac.compare_digest(session.verifier, verifier):
+            self._failures.pop(username, None)
+            return session
+        user = db_fetch_user(username)
+        if user is None:
+            # Spend the same time as a real check so usernames cannot be probed
+            self._dummy_hash = self._dummy_hash or hash_password("")
+            verify_password(password, self._dummy_hash)
+        if user is None or not verify_password(password, user.password_hash):
+            self._record_failure(username)
+            raise AuthError(f"Invalid credentials for {username}")
+        if int(user.password_hash.split("$")[1]) < PASSWORD_ITERATIONS:
+            with store.db_pool.transaction() as cursor:
+                cursor.execute("UPDATE users SET password_hash = ? WHERE username = ?",
+                               (hash_password(password), username))
+        return self.start_session(username, user.role, verifier)
+
+    def start_session(self, username, role, verifier=b""):
+        session = Session(username, role, verifier, self.ttl)
+        with self._lock:
+            self._failures.pop(username, None)
+            self._sessions[username] = session
+            self._tokens[session.token] = session
+        return session
+
+    def session(self, token):
+        session = self._tokens.get(token)
+        if session and not session.valid:
+            with self._lock:
+                self._tokens.pop(token, None)
+            return None
+        return session
+
+    def end_sessions(self, username=None):
+        with self._lock:
+            if username is None:
+                self._sessions.clear()
+                self._tokens.clear()
+                return
+            self._sessions.pop(username, None)
+            for token, session in list(self._tokens.items()):
+                if session.username == username:
+                    del self._tokens[token]
+
+    def _check_throttle(self, username):
+        with self._lock:
+            failures, locked_until = self._failures.get(username, (0, 0))
+        retry_after = locked_until - time.monotonic()
+        if retry_after > 0:
+            raise LoginThrottled(username, retry_after)
+
+    def _record_failure(self, username):
+        now = time.monotonic()
+        with self._lock:
+            failures, locked_until = self._failures.pop(username, (0, 0))
+            if locked_until + THROTTLE_FORGET < now:
+                failures = 0
+            failures += 1
+            delay = 0
+            if failures >= THROTTLE_FREE_ATTEMPTS:
+                delay = min(2 ** (failures - THROTTLE_FREE_ATTEMPTS), THROTTLE_MAX_DELAY)
+            # Re-inserted, so the dict runs from least to most recently failed
+            self._failures[username] = (failures, now + delay)
+            while (len(self._failures) > THROTTLE_MAX_ENTRIES
+                   or next(iter(self._failures.values()))[1] + THROTTLE_FORGET < now):
+                del self._failures[next(iter(self._failures))]
+
+
+auth = Authenticator()
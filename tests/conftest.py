@@ -0,0 +1,28 @@
+# Shared fixtures: every test gets a fresh store in its own tmp_path, with
+# backups and the sale journal beside it, as main.py --db lays them out.
+#
+#   python -m pytest tests
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from poslite import backup, journal, store  # noqa: E402
+
+
+@pytest.fixture
+def pos_store(tmp_path, monkeypatch):
+    store.open_store(str(tmp_path / "pos_lite.db"))
+    store.initialize_db()
+    monkeypatch.setattr(backup, "BACKUP_DIR", str(tmp_path / "backups"))
+    monkeypatch.setattr(backup, "LEGACY_BACKUP", str(tmp_path / "pos_lite_backup.db"))
+    monkeypatch.setattr(journal, "JOURNAL_PATH", str(tmp_path / "pos_lite_journal.db"))
+    yield store.db_pool
+    store.db_pool.close_all()
+
+
+@pytest.fixture
+def products(pos_store):
+    # Ten products with plenty of stock; returns their ids
+    return [store.db_save_product(f"Product {i}", 1000, 1.0 + i, 5) for i in range(10)]
@@ -0,0 +1,33 @@
+import threading
+import time
+from datetime import date
+
+import pytest
+
+from poslite import store
+
+analytics = pytest.importorskip("poslite.analytics")
+
+
+def test_concurrent_reports_load_each_month_once(products, monkeypatch):
+    for day in ("2026-08-03", "2026-09-14", "2026-10-01"):
+        store.db_checkout([(products[0], 2), (products[1], 1)], "Cash", sale_date=f"{day} 11:00:00")
+    monkeypatch.setattr(analytics, "_months", {})
+    loads = []
+    load_month = analytics._load_month_from_store
+
+    def slow_load(month, labels):
+        loads.append(month)
+        time.sleep(0.05)
+        return load_month(month, labels)
+
+    monkeypatch.setattr(analytics, "_load_month_from_store", slow_load)
+    frames = []
+    threads = [threading.Thread(target=lambda: frames.append(
+        analytics.load_sales("2026-08-01", "2026-10-31", today=date(2026, 10, 18)))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(loads) == ["2026-08", "2026-09", "2026-10"]
+    assert len(frames) == 4
@@ -0,0 +1,93 @@
+import os
+import threading
+
+import pytest
+
+from poslite import backup, store
+
+
+def stock(product_id):
+    return store.db_pool.execute("SELECT quantity FROM inventory WHERE id = ?", (product_id,)).fetchone()[0]
+
+
+def test_full_and_delta_backups_restore_to_their_point(products):
+    store.db_sell(products[0], 1, "Cash")
+    full = backup.backup_db()
+    store.db_sell(products[0], 2, "Cash")
+    delta = backup.backup_db(incremental=True)
+    assert full.endswith(".db") and delta.endswith(".delta")
+    assert [base for when, path, base in backup.list_backups()] == [None, full]
+    store.db_sell(products[0], 4, "Cash")
+    assert stock(products[0]) == 993
+
+    assert backup.restore_db()
+    assert stock(products[0]) == 997
+    assert store.db_fetch_sales_summary("2000-01-01", "2999-12-31")["count"] == 2
+    assert backup.restore_db(at=backup.backup_time(full))
+    assert stock(products[0]) == 999
+    assert store.db_fetch_sales_summary("2000-01-01", "2999-12-31")["count"] == 1
+
+
+def test_restore_without_backups_fails(pos_store):
+    assert backup.restore_db() is False
+
+
+def test_backup_finishes_while_sales_keep_committing(products):
+    with store.db_pool.transaction() as cursor:
+        cursor.executemany("INSERT INTO inventory (product_name, quantity, price, threshold) VALUES (?, ?, ?, 0)",
+                           [(f"Filler {i} " + "x" * 100, 1, 1.0) for i in range(20000)])
+    stop = threading.Event()
+    sold = []
+
+    def till():
+        while not stop.is_set():
+            store.db_sell(products[1], 1, "Cash")
+            sold.append(1)
+
+    thread = threading.Thread(target=till)
+    thread.start()
+    try:
+        filename = backup.backup_db(pages=8)
+    finally:
+        stop.set()
+        thread.join()
+    assert filename is not None and sold
+
+
+def test_restore_leaves_other_threads_connections_usable(products):
+    backup.backup_db()
+    stop = threading.Event()
+    errors = []
+
+    def reader():
+        while not stop.is_set():
+            try:
+                for row in store.db_pool.execute("SELECT * FROM inventory"):
+                    pass
+                store.db_fetch_dashboard_stats()
+            except Exception as e:
+                errors.append(e)
+                return
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        for _ in range(5):
+            assert backup.restore_db()
+    finally:
+        stop.set()
+        thread.join()
+    assert errors == []
+
+
+def test_restore_reports_why_it_failed(products):
+    full = backup.backup_db()
+    delta = backup.backup_db(incremental=True)
+    os.remove(full)
+    with pytest.raises(backup.BackupError, match="Base backup .* is missing"):
+        backup.restore_db(delta)
+    with open(full, "wb") as f:
+        f.write(b"SQLite format 3\0" + b"\xff" * 4080)
+    with pytest.raises(backup.BackupError, match="Restoring .* failed"):
+        backup.restore_db(full)
+    assert stock(products[0]) == 1000
@@ -0,0 +1,60 @@
+from datetime import date
+
+import pytest
+
+from poslite import archive, store
+from poslite.consolidation import Consolidation
+
+
+@pytest.fixture
+def consolidation(pos_store, tmp_path):
+    consolidation = Consolidation(str(tmp_path / "consolidated.db"))
+    consolidation.add_branch("north", pos_store.path)
+    yield consolidation
+    consolidation.close()
+
+
+def sell(products, count, day="2026-10-01"):
+    for i in range(count):
+        store.db_checkout([(products[i % len(products)], 1)], "Cash", sale_date=f"{day} 10:00:{i:02d}")
+
+
+def test_sync_only_merges_sales_past_the_mark(products, consolidation):
+    sell(products, 5)
+    report = consolidation.sync_branch("north")
+    assert report["sales"] == 5 and not report["rewound"]
+    mark = consolidation.branch("north").last_sale_id
+    assert mark == report["last_sale_id"] == store.db_pool.execute("SELECT MAX(id) FROM sales").fetchone()[0]
+
+    assert consolidation.sync_branch("north")["sales"] == 0
+    sell(products, 3, "2026-10-02")
+    report = consolidation.sync_branch("north")
+    assert report["sales"] == 3 and report["last_sale_id"] == mark + 3
+    assert consolidation.pool.execute("SELECT COUNT(*) FROM branch_sales").fetchone()[0] == 8
+
+
+def test_sync_reads_months_archived_before_it_ran(products, consolidation):
+    sell(products, 4, "2024-05-01")
+    sell(products, 2)
+    archive.archive_sales(keep_months=12, today=date(2026, 10, 18), vacuum=False)
+    report = consolidation.sync_branch("north")
+    assert (report["archived_sales"], report["sales"], report["missing_archives"]) == (4, 2, [])
+    assert consolidation.sync_branch("north")["archived_sales"] == 0
+
+
+def test_sync_flags_a_branch_restored_behind_the_mark(products, consolidation):
+    sell(products, 3)
+    consolidation.sync_branch("north")
+    with store.db_pool.transaction() as cursor:
+        cursor.execute("UPDATE sqlite_sequence SET seq = 1 WHERE name = 'sales'")
+    assert consolidation.sync_branch("north")["rewound"]
+
+
+def test_summary_matches_the_branch(products, consolidation):
+    sell(products, 7)
+    consolidation.sync_branch("north")
+    summary = store.db_fetch_sales_summary("2026-10-01", "2026-10-01")
+    (total,) = consolidation.sales_summary("2026-10-01", "2026-10-01")
+    assert total.branch == "north"
+    assert (total.sale_count, total.units) == (summary["count"], summary["units"])
+    assert total.revenue == pytest.approx(summary["total"])
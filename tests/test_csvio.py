@@ -0,0 +1,47 @@
+from poslite import csvio, store
+
+
+def write_csv(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+def barcodes():
+    return dict(store.db_pool.execute("SELECT sku, barcode FROM inventory WHERE sku IS NOT NULL"))
+
+
+def test_barcode_clash_within_the_file_rejects_the_row(pos_store, tmp_path):
+    filename = write_csv(tmp_path / "products.csv", "sku,name,quantity,price,barcode\n"
+                                                    "A1,Apple,5,1.0,111\n"
+                                                    "B1,Banana,3,2.0,111\n"
+                                                    "C1,Cherry,1,1.5,222\n")
+    report = csvio.import_products_from_csv(filename)
+    assert (report["inserted"], report["updated"]) == (2, 0)
+    assert report["rejected"] == [(3, "barcode 111 already belongs to A1")]
+    assert barcodes() == {"A1": "111", "C1": "222"}
+
+
+def test_barcode_clash_with_the_store_rejects_the_row(pos_store, tmp_path):
+    csvio.import_products_from_csv(write_csv(tmp_path / "first.csv", "sku,name,price,barcode\nA1,Apple,1,111\n"))
+    store.db_pool.execute("UPDATE inventory SET sku = NULL WHERE sku = 'A1'")
+    report = csvio.import_products_from_csv(write_csv(tmp_path / "second.csv", "sku,name,price,barcode\n"
+                                                                              "B1,Banana,2,111\n"
+                                                                              "C1,Cherry,1,\n"))
+    assert report["inserted"] == 1
+    assert report["rejected"][0][0] == 2 and report["rejected"][0][1].startswith("barcode 111 already belongs to")
+
+
+def test_barcode_given_up_earlier_in_the_file_can_be_taken(pos_store, tmp_path):
+    csvio.import_products_from_csv(write_csv(tmp_path / "first.csv", "sku,name,price,barcode\n"
+                                                                     "A1,Apple,1,111\n"
+                                                                     "C1,Cherry,1,222\n"))
+    # Across batch boundaries too: A1 moves to 333, B1 takes 111, D1 still
+    # cannot take 222 or 333
+    report = csvio.import_products_from_csv(write_csv(tmp_path / "second.csv", "sku,name,price,barcode\n"
+                                                                              "A1,Apple,1,333\n"
+                                                                              "B1,Banana,2,111\n"
+                                                                              "D1,Date,1,222\n"
+                                                                              "E1,Elder,1,333\n"), batch_size=2)
+    assert (report["inserted"], report["updated"]) == (1, 1)
+    assert [line for line, reason in report["rejected"]] == [4, 5]
+    assert barcodes() == {"A1": "333", "B1": "111", "C1": "222"}
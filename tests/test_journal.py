@@ -0,0 +1,73 @@
+import sqlite3
+
+import pytest
+
+from poslite import journal, store
+from poslite.service import RemoteStore
+from poslite.users import AuthError
+
+
+@pytest.fixture
+def sale_journal(pos_store, tmp_path):
+    sale_journal = journal.SaleJournal(str(tmp_path / "journal.db"))
+    yield sale_journal
+    sale_journal.stop()
+
+
+def test_replaying_an_applied_entry_sells_it_once(products, sale_journal):
+    entry_uuid = sale_journal.record([(products[0], 3)], "Cash")
+    applied, failed, error = sale_journal.replay()
+    assert [entry[0] for entry in applied] == [entry_uuid] and not failed and error is None
+    # A crash between the store commit and the journal update leaves the
+    # entry pending; replaying it must hand back the same receipt
+    with sale_journal.pool.transaction() as cursor:
+        cursor.execute("UPDATE sale_journal SET status = 'pending'")
+    again, failed, error = sale_journal.replay()
+    assert again[0][1] == applied[0][1]
+    assert store.db_fetch_product(products[0]).quantity == 997
+    assert store.db_pool.execute("SELECT COUNT(*) FROM sales").fetchone()[0] == 1
+
+
+def test_permanent_failure_does_not_hold_back_later_sales(products, sale_journal, monkeypatch):
+    refused = sale_journal.record([(products[0], 1)], "Cash")
+    later = sale_journal.record([(products[1], 1)], "Cash")
+    checkout = store.db_checkout
+
+    def db_checkout(lines, payment_method, sale_uuid=None, sale_date=None):
+        if sale_uuid == refused:
+            raise PermissionError("Administrator role required")
+        return checkout(lines, payment_method, sale_uuid, sale_date)
+
+    monkeypatch.setattr(store, "db_checkout", db_checkout)
+    applied, failed, error = sale_journal.replay()
+    assert [entry[0] for entry in failed] == [refused]
+    assert [entry[0] for entry in applied] == [later]
+    assert error is None and sale_journal.pending_count() == 0
+    assert [entry[0] for entry in sale_journal.failed_entries()] == [refused]
+
+
+@pytest.mark.parametrize("error", [sqlite3.OperationalError("database is locked"), ConnectionError("unreachable"),
+                                   AuthError("Login required")])
+def test_transient_error_keeps_entries_pending_in_order(products, sale_journal, monkeypatch, error):
+    sale_journal.record([(products[0], 1)], "Cash")
+    sale_journal.record([(products[1], 1)], "Cash")
+
+    def db_checkout(*args):
+        raise error
+
+    monkeypatch.setattr(store, "db_checkout", db_checkout)
+    applied, failed, stopped = sale_journal.replay()
+    assert stopped is error and not applied and not failed
+    assert sale_journal.pending_count() == 2
+
+
+@pytest.mark.parametrize("payload, transient", [
+    ({"error": "IntegrityError", "message": "UNIQUE constraint failed"}, False),
+    ({"error": "PermissionError", "message": "Administrator role required"}, False),
+    ({"error": "ProductNotFoundError", "message": "Product 7 not found"}, False),
+    ({"error": "OperationalError", "message": "database is locked"}, True),
+    ({"error": "AuthError", "message": "Login required"}, True),
+])
+def test_server_errors_are_classified_for_replay(payload, transient):
+    error = RemoteStore("http://127.0.0.1:1")._error(payload)
+    assert isinstance(error, journal.TRANSIENT_ERRORS) == transient
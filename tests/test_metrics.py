@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from poslite import journal, store
+from poslite.metrics import Instrumentation
+
+IDLE = 0.5
+
+
+@pytest.fixture
+def timing(monkeypatch, tmp_path):
+    # Traces every connection opened from here on, like enable_instrumentation()
+    # but without rebinding the store functions for the tests that follow
+    instrumentation = Instrumentation()
+    instrumentation.slow_ms = IDLE * 1000 / 2
+    instrumentation.slow_log = str(tmp_path / "slow.log")
+    monkeypatch.setattr(store.ConnectionPool, "trace_callback", instrumentation.trace_statement)
+    monkeypatch.setattr(store.ConnectionPool, "statement_done", instrumentation.finish_statement)
+    return instrumentation
+
+
+def assert_no_idle_time(instrumentation):
+    metrics = instrumentation.snapshot()
+    assert metrics["sql: COMMIT"]["calls"] >= 2
+    assert all(metric["max_ms"] < IDLE * 1000 / 2 for metric in metrics.values()), metrics
+    with open(instrumentation.slow_log, "a+") as f:
+        f.seek(0)
+        assert f.read() == ""
+
+
+def test_idle_writer_thread_is_not_timed(pos_store, timing, tmp_path):
+    sale_journal = journal.SaleJournal(str(tmp_path / "journal.db"))
+    try:
+        sale_journal.record([(1, 1)], "Cash")
+        time.sleep(IDLE)
+        sale_journal.record([(1, 1)], "Cash")
+    finally:
+        sale_journal.stop()
+    assert_no_idle_time(timing)
+
+
+def test_idle_time_after_a_transaction_is_not_timed(timing, tmp_path):
+    pool = store.ConnectionPool(str(tmp_path / "scratch.db"))
+    try:
+        for _ in range(2):
+            with pool.transaction() as cursor:
+                cursor.execute("CREATE TABLE IF NOT EXISTS t (x)")
+                cursor.execute("INSERT INTO t VALUES (1)")
+            time.sleep(IDLE)
+    finally:
+        pool.close_all()
+    assert_no_idle_time(timing)
@@ -0,0 +1,109 @@
+import socket
+import threading
+
+import pytest
+
+from poslite import store
+from poslite.service import RemoteStore, make_server
+
+
+# A keep-alive HTTP server that plays a script: for each request it either
+# answers ("answer") or reads it and hangs up without a reply ("drop"), the
+# way a restarted or timed-out server loses a request on a reused connection.
+class ScriptedServer:
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = []
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{self.listener.getsockname()[1]}"
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while self.script:
+            try:
+                connection, address = self.listener.accept()
+            except OSError:
+                return
+            with connection:
+                reader = connection.makefile("rb")
+                while self.script:
+                    request_line = reader.readline()
+                    if not request_line:
+                        break
+                    length = 0
+                    for line in iter(reader.readline, b"\r\n"):
+                        name, _, value = line.decode().partition(":")
+                        if name.lower() == "content-length":
+                            length = int(value)
+                    reader.read(length)
+                    self.requests.append(request_line.split()[0].decode())
+                    if self.script.pop(0) == "drop":
+                        break
+                    connection.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                                       b"Content-Length: 4\r\n\r\ntrue")
+                reader.close()
+
+    def close(self):
+        # shutdown() wakes an accept() still waiting in the thread
+        try:
+            self.listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.listener.close()
+        self.thread.join()
+
+
+@pytest.fixture
+def server(request):
+    server = ScriptedServer(request.param)
+    yield server
+    server.close()
+
+
+@pytest.mark.parametrize("server", [["answer", "drop", "answer"]], indirect=True)
+def test_idempotent_request_is_resent_on_a_fresh_connection(server):
+    remote = RemoteStore(server.url, timeout=5)
+    assert remote.request("GET", "/inventory") is True
+    assert remote.request("GET", "/inventory") is True
+    assert server.requests == ["GET", "GET", "GET"]
+
+
+@pytest.mark.parametrize("server", [["answer", "drop", "answer"]], indirect=True)
+def test_write_that_may_have_landed_is_not_resent(server):
+    remote = RemoteStore(server.url, timeout=5)
+    assert remote.request("GET", "/inventory") is True
+    with pytest.raises(ConnectionError):
+        remote.request("POST", "/checkout", {"lines": [[1, 1]], "payment_method": "Cash"})
+    assert server.requests == ["GET", "POST"]
+    # The next call opens a new connection rather than reusing the dead one
+    assert remote.request("GET", "/inventory") is True
+    assert server.requests == ["GET", "POST", "GET"]
+
+
+def test_unreachable_server_is_reported():
+    with socket.create_server(("127.0.0.1", 0)) as listener:
+        port = listener.getsockname()[1]
+    remote = RemoteStore(f"http://127.0.0.1:{port}", timeout=5)
+    with pytest.raises(ConnectionError):
+        remote.request("POST", "/checkout", {})
+
+
+@pytest.fixture
+def live_server(pos_store):
+    server = make_server("127.0.0.1", 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    server.writer.stop()
+
+
+def test_remote_dashboard_is_for_the_day_asked(products, live_server):
+    store.db_checkout([(products[1], 2)], "Cash", sale_date="2026-10-01 09:00:00")
+    remote = RemoteStore(live_server, timeout=5)
+    remote.login("cashier", "1234")
+    assert remote.db_fetch_dashboard_stats("2026-10-01")["today_sales"] == pytest.approx(4.0)
+    assert remote.db_fetch_dashboard_stats("2026-10-02")["today_sales"] == 0
+    assert remote.db_fetch_dashboard_stats()["total_products"] == len(products)
@@ -0,0 +1,125 @@
+import threading
+from datetime import date
+
+import pytest
+
+from poslite import archive, store
+
+
+@pytest.fixture
+def sales(products):
+    # Five baskets of three lines over three days, so sale_dates tie across
+    # page boundaries; one day is in an archived year. Returns every sale's
+    # (sale_date, id) key in report order.
+    for day, time in [("2024-03-01", "09:00:00"), ("2026-10-01", "09:00:00"), ("2026-10-01", "09:00:00"),
+                      ("2026-10-02", "12:30:00"), ("2026-10-02", "12:30:00")]:
+        store.db_checkout([(product_id, 1) for product_id in products[:3]], "Cash", sale_date=f"{day} {time}")
+    archive.archive_sales(keep_months=12, today=date(2026, 10, 18), vacuum=False)
+    return [(row.sale_date, row.id) for row in store.db_fetch_sales_report_page("2024-01-01", "2026-12-31",
+                                                                                  limit=100)]
+
+
+def test_inventory_pages_forward_and_back(products):
+    first = store.db_fetch_inventory_page(limit=4)
+    second = store.db_fetch_inventory_page(first[-1].id, limit=4)
+    last = store.db_fetch_inventory_page(second[-1].id, limit=4)
+    assert [row.id for row in first + second + last] == products
+    assert store.db_fetch_inventory_page(last[-1].id, limit=4) == []
+    assert store.db_fetch_inventory_page(last[0].id, limit=4, reverse=True) == second
+    assert store.db_fetch_inventory_page(first[0].id, limit=4, reverse=True) == []
+
+
+def test_inventory_page_skips_deleted_boundary_row(products):
+    store.db_delete_product(products[4])
+    page = store.db_fetch_inventory_page(products[3], limit=2)
+    assert [row.id for row in page] == products[5:7]
+
+
+def test_sales_report_is_archived_then_live(sales):
+    assert len(sales) == 15 and sales == sorted(sales)
+    assert sales[0][0].startswith("2024-03-01")
+    assert store.db_pool.execute("SELECT COUNT(*) FROM main.sales").fetchone()[0] == 12
+
+
+@pytest.mark.parametrize("limit", [1, 2, 4, 7])
+def test_sales_report_pages_have_no_gaps_or_repeats(sales, limit):
+    forward, after = [], None
+    while True:
+        page = store.db_fetch_sales_report_page("2024-01-01", "2026-12-31", after=after, limit=limit)
+        if not page:
+            break
+        assert len(page) <= limit
+        forward += [(row.sale_date, row.id) for row in page]
+        after = forward[-1]
+    assert forward == sales
+
+    backward, before = [], sales[-1]
+    while True:
+        page = store.db_fetch_sales_report_page("2024-01-01", "2026-12-31", after=before, limit=limit, reverse=True)
+        if not page:
+            break
+        backward = [(row.sale_date, row.id) for row in page] + backward
+        before = backward[0]
+    assert backward == sales[:-1]
+
+
+def test_sales_report_page_keeps_to_its_dates(sales):
+    page = store.db_fetch_sales_report_page("2026-10-02", "2026-10-02", limit=100)
+    assert [(row.sale_date, row.id) for row in page] == sales[-6:]
+    assert store.db_fetch_sales_report_page("2026-10-02", "2026-10-02", after=sales[-1]) == []
+
+
+def test_dashboard_stats_follow_other_threads_commits(products):
+    day = date.today().strftime("%Y-%m-%d")
+    seen = []
+    cached, sold = threading.Event(), threading.Event()
+
+    def dashboard():
+        seen.append(store.db_fetch_dashboard_stats(day))
+        seen.append(store.db_fetch_dashboard_stats(day))
+        cached.set()
+        sold.wait()
+        seen.append(store.db_fetch_dashboard_stats(day))
+
+    thread = threading.Thread(target=dashboard)
+    thread.start()
+    cached.wait()
+    store.db_sell(products[2], 2, "Cash")
+    sold.set()
+    thread.join()
+    assert seen[0] == seen[1] and seen[0]["today_sales"] == 0
+    assert seen[2]["today_sales"] == pytest.approx(6.0)
+    assert store.db_fetch_dashboard_stats(day) == seen[2]
+
+
+def stock_on_hand():
+    return store.db_pool.execute("SELECT COUNT(*), COALESCE(SUM(quantity), 0) FROM inventory").fetchone()
+
+
+def test_inventory_levels_follow_stock_changes(products):
+    store.db_sell(products[0], 10, "Cash")
+    store.db_receive_stock(products[1], 25)
+    store.db_update_product(products[2], "Renamed", 3, 1.0, 5)
+    store.db_delete_product(products[3])
+    rows, (other_count, other_quantity) = store.db_fetch_inventory_levels(top=4)
+    count, quantity = stock_on_hand()
+    assert rows[0].quantity == 1025 and len(rows) == 4
+    assert (other_count, other_quantity) == (count - 4, quantity - sum(row.quantity for row in rows))
+
+
+def test_inventory_levels_do_not_scan_inventory(products):
+    plan = " ".join(row[3] for row in store.db_pool.execute(
+        "EXPLAIN QUERY PLAN SELECT product_name, quantity FROM inventory ORDER BY quantity DESC LIMIT 20"))
+    assert "idx_inventory_quantity" in plan and "TEMP B-TREE" not in plan
+
+
+def test_upgrade_backfills_stock_on_hand(products):
+    with store.db_pool.transaction() as cursor:
+        for trigger in ("trg_inventory_insert", "trg_inventory_delete", "trg_inventory_update"):
+            cursor.execute(f"DROP TRIGGER {trigger}")
+        cursor.execute("ALTER TABLE inventory_stats DROP COLUMN total_quantity")
+        cursor.execute("PRAGMA user_version = 6")
+    store.initialize_db()
+    store.db_sell(products[0], 5, "Cash")
+    rows, (other_count, other_quantity) = store.db_fetch_inventory_levels(top=2)
+    assert other_quantity + sum(row.quantity for row in rows) == stock_on_hand()[1] == 9995
@@ -0,0 +1,47 @@
+import pytest
+
+from poslite import users
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(users.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def auth(pos_store, monkeypatch):
+    # Cheap hashes: these tests are about the throttle, not PBKDF2
+    monkeypatch.setattr(users, "PASSWORD_ITERATIONS", 1000)
+    return users.Authenticator()
+
+
+def fail(auth, username):
+    with pytest.raises(users.AuthError):
+        auth.login(username, "wrong")
+
+
+def test_failed_logins_lock_the_name_out(auth, clock):
+    for _ in range(users.THROTTLE_FREE_ATTEMPTS):
+        fail(auth, "admin")
+    with pytest.raises(users.LoginThrottled):
+        auth.login("admin", "admin")
+    clock[0] += users.THROTTLE_MAX_DELAY
+    auth.login("admin", "admin")
+    assert "admin" not in auth._failures
+
+
+def test_failures_are_forgotten_once_the_lockout_has_long_expired(auth, clock):
+    for name in ("ghost1", "ghost2"):
+        fail(auth, name)
+    clock[0] += users.THROTTLE_FORGET + 1
+    fail(auth, "ghost3")
+    assert list(auth._failures) == ["ghost3"]
+
+
+def test_tracked_names_are_capped(auth, clock, monkeypatch):
+    monkeypatch.setattr(users, "THROTTLE_MAX_ENTRIES", 5)
+    for i in range(20):
+        fail(auth, f"ghost{i}")
+    assert list(auth._failures) == [f"ghost{i}" for i in range(15, 20)]